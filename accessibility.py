@@ -0,0 +1,361 @@
+#!python 3.13
+# Транспортная доступность по гексагонам: время в пути по дорогам до ближайшей точки продаж
+# и население, достижимое за N минут. Граф дорог OSMnx один раз переводится в CSR
+# (индексы int32, время в секундах float32, из параллельных ребер остается самое быстрое)
+# и кешируется в road_graphs/. Центры ячеек привязываются к узлам через KD-дерево,
+# кратчайшие пути считает scipy.sparse.csgraph.dijkstra: до точек продаж - одним вызовом
+# от всех точек сразу (min_only), достижимость - порциями узлов в пуле процессов.
+#
+# Пример:
+#     python accessibility.py Краснодар --res 9 --stores stores.csv --minutes 15 --out access.parquet
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import h3.api.numpy_int as h3_int  # H3 с идентификаторами uint64
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+
+from hex_index import cells_to_uint64
+from hex_table import HexTable
+
+# Папка с графами дорог по умолчанию
+ROAD_GRAPH_DIR = 'road_graphs'
+
+# Узлов-источников в одной порции расчета достижимости (матрица порции - узлы x все узлы графа)
+SOURCE_CHUNK = 64
+
+# Длина градуса широты в метрах
+METERS_PER_DEGREE = 111_320.0
+
+
+class RoadGraph:
+    """
+    Граф дорог в виде CSR: строки - узлы начала ребра, веса - время в пути в секундах.
+    """
+
+    def __init__(self, matrix, lat, lng, osmids=None):
+        """
+        Параметры:
+            matrix (scipy.sparse.csr_matrix): Время в пути по ребрам (N, N)
+            lat (np.ndarray): Широты узлов
+            lng (np.ndarray): Долготы узлов
+            osmids (np.ndarray): Идентификаторы узлов OSM
+        """
+        self.matrix = matrix
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        self.osmids = np.asarray(osmids if osmids is not None else np.arange(len(self.lat)), dtype=np.int64)
+        self._tree = None
+
+    def __len__(self):
+        return len(self.lat)
+
+    def projected(self, lat, lng):
+        """
+        Координаты в метрах в равнопромежуточной проекции с центром в середине графа.
+        Параметры:
+            lat (np.ndarray): Широты
+            lng (np.ndarray): Долготы
+        Возвращает:
+            np.ndarray: Точки (N, 2)
+        """
+        scale = np.cos(np.radians(np.mean(self.lat))) if len(self.lat) else 1.0
+        return np.column_stack([np.asarray(lng) * scale, np.asarray(lat)]) * METERS_PER_DEGREE
+
+    def snap(self, lat, lng):
+        """
+        Привязывает точки к ближайшим узлам графа.
+        Параметры:
+            lat (np.ndarray): Широты
+            lng (np.ndarray): Долготы
+        Возвращает:
+            np.ndarray: Номера узлов (int64)
+            np.ndarray: Расстояние до узла в метрах
+        """
+        if self._tree is None:
+            self._tree = cKDTree(self.projected(self.lat, self.lng))
+        distances, nodes = self._tree.query(self.projected(lat, lng))
+        return nodes.astype(np.int64), distances
+
+    def save(self, path):
+        """
+        Сохраняет граф в .npz.
+        Параметры:
+            path (str | Path): Путь к файлу
+        Возвращает:
+            Path: Путь к сохраненному файлу
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp.npz')
+        np.savez(
+            tmp_path, indptr=self.matrix.indptr, indices=self.matrix.indices, data=self.matrix.data,
+            lat=self.lat, lng=self.lng, osmids=self.osmids
+        )
+        tmp_path.replace(path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """
+        Читает граф из .npz.
+        Параметры:
+            path (str | Path): Путь к файлу
+        Возвращает:
+            RoadGraph: Граф
+        """
+        with np.load(path) as data:
+            size = len(data['lat'])
+            matrix = sp.csr_matrix((data['data'], data['indices'], data['indptr']), shape=(size, size))
+            return cls(matrix, data['lat'], data['lng'], data['osmids'])
+
+
+def graph_to_csr(G, weight='travel_time'):
+    """
+    Переводит граф OSMnx в CSR. Из параллельных ребер остается ребро с наименьшим весом.
+    Параметры:
+        G (networkx.MultiDiGraph): Граф OSMnx с атрибутами узлов x, y и весом ребер
+        weight (str): Атрибут веса ребра (travel_time - секунды, length - метры)
+    Возвращает:
+        RoadGraph: Граф
+    """
+    osmids = np.fromiter(G.nodes, dtype=np.int64, count=G.number_of_nodes())
+    lat = np.fromiter((data['y'] for _, data in G.nodes(data=True)), dtype=np.float64, count=len(osmids))
+    lng = np.fromiter((data['x'] for _, data in G.nodes(data=True)), dtype=np.float64, count=len(osmids))
+
+    edges = G.number_of_edges()
+    sources = np.fromiter((u for u, _, _ in G.edges(data=weight)), dtype=np.int64, count=edges)
+    targets = np.fromiter((v for _, v, _ in G.edges(data=weight)), dtype=np.int64, count=edges)
+    weights = np.fromiter((w for _, _, w in G.edges(data=weight)), dtype=np.float64, count=edges)
+
+    # Идентификаторы OSM -> номера строк
+    order = np.argsort(osmids)
+    rows = order[np.searchsorted(osmids, sources, sorter=order)]
+    columns = order[np.searchsorted(osmids, targets, sorter=order)]
+
+    # Самое быстрое из параллельных ребер: сортировка по (u, v, вес), первое в каждой группе
+    edge_order = np.lexsort((weights, columns, rows))
+    rows, columns, weights = rows[edge_order], columns[edge_order], weights[edge_order]
+    first = np.concatenate([[True], (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1])]) if edges else \
+        np.empty(0, dtype=bool)
+
+    # Нулевой вес в CSR означает отсутствие ребра, поэтому он заменяется минимальным положительным
+    weights = np.maximum(weights[first], np.finfo(np.float32).tiny).astype(np.float32)
+    matrix = sp.csr_matrix(
+        (weights, (rows[first].astype(np.int32), columns[first].astype(np.int32))), shape=(len(osmids), len(osmids))
+    )
+    return RoadGraph(matrix, lat, lng, osmids)
+
+
+def road_graph_path(city_name, network_type='drive', root=ROAD_GRAPH_DIR):
+    """
+    Путь к кешу графа дорог города.
+    Параметры:
+        city_name (str): Название города на русском языке
+        network_type (str): Тип сети OSMnx
+        root (str): Папка с графами
+    Возвращает:
+        Path: Путь к файлу .npz
+    """
+    return Path(root) / f'{city_name}_{network_type}.npz'
+
+
+def load_road_graph(city_name, city_gdf=None, network_type='drive', root=ROAD_GRAPH_DIR):
+    """
+    Загружает граф дорог из кеша или скачивает его через OSMnx и сохраняет в CSR.
+    Параметры:
+        city_name (str): Название города на русском языке
+        city_gdf (GeoDataFrame): Границы города (нужны, только если графа нет в кеше)
+        network_type (str): Тип сети OSMnx
+        root (str): Папка с графами
+    Возвращает:
+        RoadGraph | None: Граф или None, если его нет в кеше и границы не заданы
+    """
+    path = road_graph_path(city_name, network_type, root)
+    if path.exists():
+        return RoadGraph.load(path)
+
+    if city_gdf is None or city_gdf.empty:
+        print(f'{city_name}: графа дорог нет в кеше, нужны границы города')
+        return None
+
+    import osmnx as ox  # Загрузка данных OpenStreetMap
+
+    G = ox.graph_from_polygon(city_gdf.union_all(), network_type=network_type)
+    G = ox.add_edge_travel_times(ox.add_edge_speeds(G))
+
+    graph = graph_to_csr(G, 'travel_time')
+    graph.save(path)
+    return graph
+
+
+def cells_to_latlng(cells):
+    """
+    Центры ячеек.
+    Параметры:
+        cells (np.ndarray): H3 идентификаторы (uint64)
+    Возвращает:
+        np.ndarray: Широты
+        np.ndarray: Долготы
+    """
+    centers = np.array([h3_int.cell_to_latlng(cell) for cell in cells_to_uint64(cells).tolist()]).reshape(-1, 2)
+    return centers[:, 0], centers[:, 1]
+
+
+def nearest_travel_time(graph, nodes, target_nodes, limit=np.inf):
+    """
+    Время в пути от узлов до ближайшей цели: один вызов dijkstra от всех целей сразу
+    по обращенному графу (min_only), а не отдельный поиск от каждого узла.
+    Параметры:
+        graph (RoadGraph): Граф дорог
+        nodes (np.ndarray): Узлы, для которых нужно время
+        target_nodes (np.ndarray): Узлы целей (точек продаж)
+        limit (float): Наибольшее время поиска в секундах (дальше - inf)
+    Возвращает:
+        np.ndarray: Время в секундах (inf - цель недостижима)
+    """
+    if len(target_nodes) == 0:
+        return np.full(len(nodes), np.inf)
+
+    distances = dijkstra(
+        graph.matrix.T.tocsr(), directed=True, indices=np.unique(target_nodes), min_only=True, limit=limit
+    )
+    return distances[nodes]
+
+
+# Граф и веса узлов в процессе пула (передаются один раз через initializer)
+_worker_state = {}
+
+
+def _init_worker(matrix, node_weights):
+    _worker_state['matrix'] = matrix
+    _worker_state['weights'] = node_weights
+
+
+def _reachable_chunk(sources, limit):
+    distances = dijkstra(_worker_state['matrix'], directed=True, indices=sources, limit=limit)
+    return (distances <= limit) @ _worker_state['weights']
+
+
+def reachable_sum(graph, nodes, node_weights, limit, workers=None, chunk_size=SOURCE_CHUNK):
+    """
+    Сумма весов узлов, достижимых от каждого узла за limit секунд.
+    Поиск идет только от уникальных узлов, порциями в пуле процессов.
+    Параметры:
+        graph (RoadGraph): Граф дорог
+        nodes (np.ndarray): Узлы-источники
+        node_weights (np.ndarray): Вес каждого узла графа (например, население)
+        limit (float): Время в секундах
+        workers (int): Число процессов (по умолчанию все ядра, 1 - без пула)
+        chunk_size (int): Источников в порции
+    Возвращает:
+        np.ndarray: Сумма весов для каждого узла из nodes
+    """
+    sources, inverse = np.unique(nodes, return_inverse=True)
+    node_weights = np.asarray(node_weights, dtype=np.float64)
+    chunks = [sources[start:start + chunk_size] for start in range(0, len(sources), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(chunks) <= 1:
+        _init_worker(graph.matrix, node_weights)
+        sums = [_reachable_chunk(chunk, limit) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(graph.matrix, node_weights)) as pool:
+            sums = list(pool.map(_reachable_chunk, chunks, [limit] * len(chunks)))
+
+    totals = np.concatenate(sums) if sums else np.empty(0)
+    return totals[inverse]
+
+
+def hex_accessibility(hexagons, graph, store_lat, store_lng, population=None, minutes=15, workers=None):
+    """
+    Доступность для каждой ячейки покрытия: время до ближайшей точки продаж и достижимое население.
+    Центр ячейки и точки продаж привязываются к ближайшим узлам графа; время подхода к узлу не учитывается.
+    Параметры:
+        hexagons (np.ndarray): Ячейки покрытия (uint64)
+        graph (RoadGraph): Граф дорог
+        store_lat (np.ndarray): Широты точек продаж
+        store_lng (np.ndarray): Долготы точек продаж
+        population (np.ndarray): Население ячеек (той же длины, что и hexagons) или None
+        minutes (float): Порог времени для достижимого населения
+        workers (int): Число процессов для расчета достижимости
+    Возвращает:
+        HexTable: Столбцы travel_min (до ближайшей точки, inf - недостижима), snap_m (расстояние
+            от центра до узла) и, если задано население, population_<minutes>min
+    """
+    table = HexTable(hexagons)
+    lat, lng = cells_to_latlng(table.cells)
+    nodes, snap_distances = graph.snap(lat, lng)
+    store_nodes, _ = graph.snap(np.asarray(store_lat, dtype=np.float64), np.asarray(store_lng, dtype=np.float64))
+
+    table.add_column('travel_min', nearest_travel_time(graph, nodes, store_nodes) / 60)
+    table.add_column('snap_m', snap_distances)
+
+    if population is not None:
+        # Население ячеек переносится на их узлы: достижимость считается один раз на узел
+        population = np.asarray(population, dtype=np.float64)[np.argsort(cells_to_uint64(hexagons), kind='stable')]
+        node_population = np.bincount(nodes, weights=population, minlength=len(graph))
+        table.add_column(
+            f'population_{minutes:g}min', reachable_sum(graph, nodes, node_population, minutes * 60, workers)
+        )
+
+    return table
+
+
+def main():
+    import pandas as pd
+
+    from boundary_store import BoundaryStore
+    from hex_table import hex_table_path
+    from main import boundary_to_geojson, get_city_boundary, polyfill
+    from polyfill_cache import PolyfillCache
+
+    parser = argparse.ArgumentParser(description='Транспортная доступность по гексагонам города')
+    parser.add_argument('city', help='Название города на русском языке')
+    parser.add_argument('--res', type=int, default=9, help='Уровень детализации H3')
+    parser.add_argument('--stores', required=True, help='Точки продаж .csv/.parquet со столбцами lat, lng')
+    parser.add_argument('--population', help='Столбец населения в таблице hex_tables/<город>_<res>.parquet')
+    parser.add_argument('--minutes', type=float, default=15, help='Порог времени для достижимого населения')
+    parser.add_argument('--network-type', default='drive', help='Тип сети OSMnx')
+    parser.add_argument('--workers', type=int, default=None, help='Процессы для расчета достижимости')
+    parser.add_argument('--out', default='access.parquet', help='Файл результата .parquet или .csv')
+    parser.add_argument('--offline', action='store_true', help='Брать границы и граф только из кеша')
+    args = parser.parse_args()
+
+    city_gdf = get_city_boundary(args.city, store=BoundaryStore(), offline=args.offline)
+    if city_gdf.empty:
+        print(f'{args.city}: границы не найдены')
+        return
+
+    graph = load_road_graph(args.city, None if args.offline else city_gdf, args.network_type)
+    if graph is None:
+        return
+
+    hexagons = polyfill(boundary_to_geojson(city_gdf), res=args.res, cache=PolyfillCache())
+    stores = pd.read_parquet(args.stores) if args.stores.endswith('.parquet') else pd.read_csv(args.stores)
+
+    population = None
+    if args.population:
+        attributes = HexTable.load(hex_table_path(args.city, args.res), [args.population])
+        population = np.nan_to_num(HexTable(hexagons).join(attributes)[args.population])
+
+    table = hex_accessibility(
+        hexagons, graph, stores['lat'].to_numpy(), stores['lng'].to_numpy(), population, args.minutes, args.workers
+    )
+    frame = table.to_frame()
+    if args.out.endswith('.csv'):
+        frame.to_csv(args.out, index=False)
+    else:
+        frame.to_parquet(args.out, index=False)
+
+    print(f'{args.city}, res={args.res}: граф {len(graph)} узлов, {len(frame)} ячеек -> {args.out}')
+
+
+if __name__ == "__main__":
+    main()
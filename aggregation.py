@@ -0,0 +1,132 @@
+#!python 3.13
+# Потоковая агрегация событий абонентов (lat/lng) по ячейкам H3.
+# Файл читается порциями фиксированного размера, поэтому память не зависит от объема входных данных
+# и растет только с числом различных ячеек.
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from hex_index import cells_to_str, latlng_to_cells
+
+# Число строк, читаемых за один раз
+CHUNK_SIZE = 1_000_000
+
+
+class HexAccumulator:
+    """
+    Накопитель счетчиков и сумм по ячейкам H3.
+    Ключи хранятся отсортированным массивом uint64, значения - плотными столбцами,
+    поэтому на ячейку уходит 8 байт ключа + 8 байт на каждую метрику.
+    """
+
+    def __init__(self, value_columns=()):
+        """
+        Параметры:
+            value_columns (tuple): Названия суммируемых столбцов
+        """
+        self.value_columns = list(value_columns)
+        self.cells = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.sums = np.empty((len(self.value_columns), 0), dtype=np.float64)
+        self.rows = 0
+        self.dropped = 0  # Строки без координат или с координатами вне допустимого диапазона
+
+    def add(self, cells, values=None):
+        """
+        Добавляет порцию точек.
+        Параметры:
+            cells (np.ndarray): Ячейки точек (uint64)
+            values (np.ndarray): Значения формы (N, len(value_columns)) или None
+        """
+        if len(cells) == 0:
+            return
+        self.rows += len(cells)
+
+        # Группируем порцию
+        chunk_cells, inverse = np.unique(cells, return_inverse=True)
+        chunk_counts = np.bincount(inverse, minlength=len(chunk_cells))
+        chunk_sums = np.empty((len(self.value_columns), len(chunk_cells)), dtype=np.float64)
+        for j in range(len(self.value_columns)):
+            chunk_sums[j] = np.bincount(inverse, weights=values[:, j], minlength=len(chunk_cells))
+
+        # Сливаем с накопленными ключами: новые ячейки вставляются, существующие складываются
+        merged = np.union1d(self.cells, chunk_cells)
+        counts = np.zeros(len(merged), dtype=np.int64)
+        sums = np.zeros((len(self.value_columns), len(merged)), dtype=np.float64)
+
+        old_positions = np.searchsorted(merged, self.cells)
+        new_positions = np.searchsorted(merged, chunk_cells)
+        counts[old_positions] = self.counts
+        counts[new_positions] += chunk_counts
+        sums[:, old_positions] = self.sums
+        sums[:, new_positions] += chunk_sums
+
+        self.cells, self.counts, self.sums = merged, counts, sums
+
+    def to_frame(self):
+        """
+        Результат агрегации.
+        Возвращает:
+            pd.DataFrame: Столбцы cell (uint64), h3, count и sum_<столбец> для каждой метрики
+        """
+        frame = pd.DataFrame({'cell': self.cells, 'h3': cells_to_str(self.cells), 'count': self.counts})
+        for j, column in enumerate(self.value_columns):
+            frame[f'sum_{column}'] = self.sums[j]
+
+        return frame
+
+
+def iter_point_chunks(path, columns, chunk_size=CHUNK_SIZE):
+    """
+    Читает CSV или Parquet порциями.
+    Параметры:
+        path (str | Path): Путь к файлу .csv или .parquet
+        columns (list): Нужные столбцы
+        chunk_size (int): Число строк в порции
+    Возвращает:
+        generator: pd.DataFrame с не более чем chunk_size строками
+    """
+    path = Path(path)
+
+    if path.suffix == '.parquet':
+        import pyarrow.parquet as pq  # Чтение Parquet по батчам
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_size)
+
+
+def aggregate_points(path, res, lat_col='lat', lng_col='lng', value_cols=(), chunk_size=CHUNK_SIZE):
+    """
+    Агрегирует события из файла по ячейкам H3.
+    Параметры:
+        path (str | Path): Путь к файлу .csv или .parquet с координатами событий
+        res (int): Уровень детализации H3
+        lat_col (str): Столбец широты
+        lng_col (str): Столбец долготы
+        value_cols (tuple): Столбцы, которые суммируются по ячейкам
+        chunk_size (int): Число строк в порции
+    Возвращает:
+        HexAccumulator: Счетчики и суммы по ячейкам (dropped - число отброшенных строк)
+    """
+    accumulator = HexAccumulator(value_cols)
+
+    for chunk in iter_point_chunks(path, [lat_col, lng_col, *value_cols], chunk_size):
+        lat = chunk[lat_col].to_numpy(dtype=np.float64, na_value=np.nan)
+        lng = chunk[lng_col].to_numpy(dtype=np.float64, na_value=np.nan)
+        # Пропуски, бесконечности и координаты вне диапазона отбрасываются: на них latlng_to_cell
+        # бросает исключение и прервал бы разбор всего файла
+        valid = np.isfinite(lat) & np.isfinite(lng) & (np.abs(lat) <= 90) & (np.abs(lng) <= 180)
+        accumulator.dropped += int(len(valid) - np.count_nonzero(valid))
+
+        cells = latlng_to_cells(lat[valid], lng[valid], res)
+        values = chunk[list(value_cols)].to_numpy(dtype=np.float64, na_value=0.0)[valid] if value_cols else None
+        accumulator.add(cells, values)
+
+    if accumulator.dropped:
+        print(f'{path}: пропущено строк с некорректными координатами: {accumulator.dropped}')
+
+    return accumulator
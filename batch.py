@@ -0,0 +1,275 @@
+#!python 3.13
+# Пакетная сборка карт для списка городов и уровней детализации.
+# Загрузка границ идет в небольшом пуле потоков (ограничение нагрузки на Overpass/Nominatim),
+# заполнение, агрегация и отрисовка - в пуле процессов. Актуальные карты пропускаются.
+#
+# Пример:
+#     python batch.py Краснодар Сочи Ростов-на-Дону --res 8 9 10 --events events.parquet
+
+import argparse
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from pathlib import Path
+
+import folium  # Визуализация на карте
+import h3.api.numpy_int as h3_int  # H3 с идентификаторами uint64
+import numpy as np
+
+from aggregation import aggregate_points
+from boundary_store import BoundaryStore
+from hex_index import hex_index_contains
+from polyfill_cache import PolyfillCache
+from main import (
+    boundary_to_geojson, create_hexagons, get_city_boundary, polyfill, visualize_city_boundary, visualize_hex_metric
+)
+from tiles import save_tiled_map
+
+# Папка с картами по умолчанию
+MAPS_DIR = 'maps'
+
+
+def map_path(out_dir, city_name, res, tiled=False):
+    """
+    Путь к карте города.
+    Параметры:
+        out_dir (str): Папка с картами
+        city_name (str): Название города на русском языке
+        res (int): Уровень детализации H3
+        tiled (bool): Карта с тайлами (страница в своей папке)
+    Возвращает:
+        Path: Путь к HTML-файлу
+    """
+    if tiled:
+        return Path(out_dir) / f'{city_name}_{res}' / 'index.html'
+    return Path(out_dir) / f'{city_name}_{res}.html'
+
+
+def is_up_to_date(output, inputs):
+    """
+    Проверяет, что карта новее всех входных файлов.
+    Параметры:
+        output (Path): Путь к карте
+        inputs (list): Пути к входным файлам (None пропускаются)
+    Возвращает:
+        bool: True, если пересборка не нужна
+    """
+    if not output.exists():
+        return False
+
+    inputs = [Path(path) for path in inputs if path is not None]
+    if not all(path.exists() for path in inputs):
+        return False
+
+    return all(output.stat().st_mtime >= path.stat().st_mtime for path in inputs)
+
+
+def aggregate_events(events, res):
+    """
+    Агрегирует события по ячейкам. Выполняется в процессе пула.
+    Параметры:
+        events (str): Путь к файлу событий .csv или .parquet
+        res (int): Уровень детализации H3
+    Возвращает:
+        pd.DataFrame: Счетчики по ячейкам
+        np.ndarray: Центры ячеек (N, 2) в порядке (lat, lng)
+    """
+    metrics = aggregate_points(events, res).to_frame()
+    centers = np.array([h3_int.cell_to_latlng(cell) for cell in metrics['cell'].tolist()]).reshape(-1, 2)
+    return metrics, centers
+
+
+def city_metrics(aggregation, city_gdf):
+    """
+    Отбирает счетчики ячеек, центры которых лежат в границах города (то же условие, что у polyfill),
+    чтобы в процесс отрисовки уходила только часть таблицы одного города.
+    Параметры:
+        aggregation (tuple): Результат aggregate_events
+        city_gdf (GeoDataFrame): Границы города
+    Возвращает:
+        pd.DataFrame: Счетчики ячеек города
+    """
+    import shapely
+
+    metrics, centers = aggregation
+    boundary = city_gdf.union_all()
+    shapely.prepare(boundary)
+    return metrics[shapely.contains_xy(boundary, centers[:, 1], centers[:, 0])]
+
+
+def build_city_map(city_name, res, city_gdf, output, metrics=None, tiled=False):
+    """
+    Заполняет границы города гексагонами, добавляет метрики и сохраняет карту.
+    Выполняется в процессе пула.
+    Параметры:
+        city_name (str): Название города на русском языке
+        res (int): Уровень детализации H3
+        city_gdf (GeoDataFrame): Границы города
+        output (Path): Путь к карте
+        metrics (pd.DataFrame): Счетчики событий по ячейкам или None
+        tiled (bool): Выгрузить гексагоны тайлами рядом со страницей
+    Возвращает:
+        str: Город
+        int: Уровень детализации
+        int: Количество ячеек
+    """
+    city_map = visualize_city_boundary(city_gdf)
+    geoJson = boundary_to_geojson(city_gdf)
+
+    # Внутри процесса пула заполняем без вложенного пула
+    if tiled:
+        hexagons = polyfill(geoJson, res=res, workers=1, cache=PolyfillCache())
+    else:
+        hexagons, _ = create_hexagons(geoJson, city_map, res=res, workers=1, cache=PolyfillCache())
+
+    if metrics is not None:
+        city_metrics = metrics[hex_index_contains(hexagons, metrics['cell'].to_numpy())]
+        if not city_metrics.empty:
+            visualize_hex_metric(city_map, city_metrics, name='События')
+
+    if tiled:
+        save_tiled_map(city_map, hexagons, output.parent, output.name)
+        return city_name, res, len(hexagons)
+
+    folium.LayerControl().add_to(city_map)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_output = output.with_suffix('.tmp.html')
+    city_map.save(str(tmp_output))
+    tmp_output.replace(output)
+
+    return city_name, res, len(hexagons)
+
+
+def run_batch(cities, resolutions, events=None, out_dir=MAPS_DIR, net_workers=2, cpu_workers=None,
+              offline=False, force=False, store=None, tiled=False):
+    """
+    Собирает карты для всех пар (город, уровень детализации).
+    Параметры:
+        cities (list): Названия городов на русском языке
+        resolutions (list): Уровни детализации H3
+        events (str): Путь к файлу событий для агрегации или None
+        out_dir (str): Папка с картами
+        net_workers (int): Одновременные запросы границ к OSM
+        cpu_workers (int): Процессы для заполнения, агрегации и отрисовки
+        offline (bool): Брать границы только из хранилища и cache/
+        force (bool): Пересобрать даже актуальные карты
+        store (BoundaryStore): Хранилище границ
+        tiled (bool): Выгружать гексагоны тайлами (см. tiles.py)
+    Возвращает:
+        dict: Количество собранных, пропущенных и упавших карт
+    """
+    store = store or BoundaryStore()
+    cpu_workers = cpu_workers or os.cpu_count() or 1
+    summary = {'built': 0, 'skipped': 0, 'failed': 0}
+
+    # Пропускаем города, у которых все карты новее границ и файла событий
+    pending = {}
+    for city_name in cities:
+        boundary_path = store.path(city_name)
+        todo = [
+            res for res in resolutions
+            if force or boundary_path is None
+            or not is_up_to_date(map_path(out_dir, city_name, res, tiled), [boundary_path, events])
+        ]
+        summary['skipped'] += len(resolutions) - len(todo)
+        if todo:
+            pending[city_name] = todo
+
+    if not pending:
+        return summary
+
+    with ThreadPoolExecutor(max_workers=net_workers) as net_pool, \
+            ProcessPoolExecutor(max_workers=cpu_workers) as cpu_pool:
+
+        # Агрегация событий одна на уровень детализации, общая для всех городов
+        needed = sorted({res for todo in pending.values() for res in todo})
+        aggregations = {res: cpu_pool.submit(aggregate_events, events, res) for res in needed} if events else {}
+
+        boundaries = {
+            net_pool.submit(get_city_boundary, city_name, store=store, offline=offline): city_name
+            for city_name in pending
+        }
+
+        renders = {}
+        waiting = {res: [] for res in aggregations}  # Города с границами, ждущие агрегацию уровня
+
+        def submit(city_name, res, city_gdf):
+            metrics = city_metrics(aggregations[res].result(), city_gdf) if events else None
+            output = map_path(out_dir, city_name, res, tiled)
+            renders[cpu_pool.submit(build_city_map, city_name, res, city_gdf, output, metrics, tiled)] = output
+
+        def aggregation_failed(res):
+            print(f'Ошибка агрегации событий res={res}: {aggregations[res].exception()}')
+            summary['failed'] += len(waiting.pop(res, []))
+
+        # Границы и агрегации обрабатываются по мере готовности: отрисовка города стартует,
+        # как только готовы и его границы, и агрегация его уровня
+        remaining = {*boundaries, *aggregations.values()}
+        while remaining:
+            done, remaining = wait(remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in boundaries:
+                    city_name = boundaries[future]
+                    city_gdf = future.result()
+                    if city_gdf.empty:
+                        print(f'{city_name}: границы не найдены')
+                        summary['failed'] += len(pending[city_name])
+                        continue
+
+                    for res in pending[city_name]:
+                        if res in waiting:
+                            waiting[res].append((city_name, city_gdf))
+                        elif not events or aggregations[res].exception() is None:
+                            submit(city_name, res, city_gdf)
+                        else:
+                            summary['failed'] += 1  # Агрегация уровня уже упала
+                    continue
+
+                res = next(res for res, aggregation in aggregations.items() if aggregation is future)
+                if future.exception() is not None:
+                    aggregation_failed(res)
+                    continue
+                for city_name, city_gdf in waiting.pop(res):
+                    submit(city_name, res, city_gdf)
+
+        for future in as_completed(renders):
+            try:
+                city_name, res, cells = future.result()
+                print(f'{city_name}, res={res}: {cells} гексагонов -> {renders[future]}')
+                summary['built'] += 1
+            except Exception as e:
+                print(f'Ошибка сборки {renders[future]}: {e}')
+                summary['failed'] += 1
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Пакетная сборка H3-карт для списка городов')
+    parser.add_argument('cities', nargs='*', help='Названия городов на русском языке')
+    parser.add_argument('--cities-file', help='Файл со списком городов, по одному в строке')
+    parser.add_argument('--res', type=int, nargs='+', default=[8], help='Уровни детализации H3')
+    parser.add_argument('--events', help='Файл событий .csv/.parquet (столбцы lat, lng) для агрегации')
+    parser.add_argument('--out-dir', default=MAPS_DIR, help='Папка для карт')
+    parser.add_argument('--net-workers', type=int, default=2, help='Одновременные запросы к OSM')
+    parser.add_argument('--cpu-workers', type=int, default=None, help='Процессы для расчетов (по умолчанию все ядра)')
+    parser.add_argument('--offline', action='store_true', help='Не обращаться к сети, брать границы из хранилища и cache/')
+    parser.add_argument('--force', action='store_true', help='Пересобрать актуальные карты')
+    parser.add_argument('--tiled', action='store_true', help='Выгружать гексагоны тайлами вместо одного HTML')
+    args = parser.parse_args()
+
+    cities = list(args.cities)
+    if args.cities_file:
+        cities += [line.strip() for line in Path(args.cities_file).read_text(encoding='utf-8').splitlines() if line.strip()]
+    if not cities:
+        parser.error('не задан ни один город')
+
+    summary = run_batch(
+        cities, args.res, events=args.events, out_dir=args.out_dir, net_workers=args.net_workers,
+        cpu_workers=args.cpu_workers, offline=args.offline, force=args.force, tiled=args.tiled
+    )
+    print(f"Собрано: {summary['built']}, пропущено: {summary['skipped']}, ошибок: {summary['failed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,634 @@
+#!python 3.13
+# Замеры скорости этапов конвейера. Работает без сети: ответы Nominatim и Overpass берутся из cache/
+#
+#     python benchmark.py stages --res 6 11 --out bench_results/run.json
+#     python benchmark.py compare bench_results/old.json bench_results/new.json
+#     python benchmark.py render
+#     python benchmark.py compact
+#     python benchmark.py coldstart
+#     python benchmark.py simplify
+#     python benchmark.py stream
+#     python benchmark.py parse
+#     python benchmark.py service
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import folium  # Визуализация на карте
+import numpy as np
+import shapely
+
+from boundary_store import BoundaryStore
+from hex_index import compact
+from profiling import PeakRSS
+from osmnx_compat import replay_downloads
+from main import (
+    boundary_to_geojson, create_hexagons, geojson_to_polygons, get_city_boundary, polyfill, polygons_to_shapely,
+    render_hexagons_geojson, render_hexagons_ids, render_hexagons_polylines, simplify_tolerance, visualize_city_boundary
+)
+
+# Папка с результатами замеров по умолчанию
+BENCH_DIR = 'bench_results'
+
+# Библиотеки, которых не должно быть в hexonly.py
+HEAVY_MODULES = ('geopandas', 'pandas', 'osmnx', 'folium', 'shapely', 'pyarrow', 'networkx')
+
+
+@contextmanager
+def replay_osm_cache(cache_dir='cache'):
+    """
+    Подменяет обращения OSMnx к Nominatim и Overpass ответами, сохраненными в cache_dir.
+    Разбор ответов и фильтрация в get_city_boundary выполняются как при обычном запуске.
+    Параметры:
+        cache_dir (str): Папка с кешем OSMnx
+    """
+    nominatim, overpass = [], []
+    for path in sorted(Path(cache_dir).glob('*.json')):
+        response = json.loads(path.read_text(encoding='utf-8'))
+        if isinstance(response, dict) and 'elements' in response:
+            overpass.append(response)
+        elif isinstance(response, list):
+            nominatim.append(response)
+
+    with replay_downloads(nominatim[0] if nominatim else [], overpass):
+        yield
+
+
+def measure(stage, func, *args, res=None, **kwargs):
+    """
+    Выполняет этап и замеряет время и пиковую память.
+    Параметры:
+        stage (str): Название этапа
+        func (callable): Функция этапа
+        res (int): Уровень детализации H3 (для записи в результат)
+    Возвращает:
+        dict: Замер этапа
+        object: Результат функции
+    """
+    with PeakRSS() as rss:
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = func(*args, **kwargs)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    record = {'stage': stage, 'res': res, 'wall_sec': wall, 'cpu_sec': cpu, 'peak_rss_mb': rss.peak / 1024 ** 2}
+    print(f"{stage:26s} res={res if res is not None else '-':>2} {wall:8.3f} s  {record['peak_rss_mb']:8.1f} MB")
+    return record, result
+
+
+def time_render(render, hexagons, location):
+    """
+    Замеряет построение слоя гексагонов и рендеринг HTML.
+    Параметры:
+        render (callable): Функция отрисовки (hexagons, layer) -> слой
+        hexagons (list): Список H3 идентификаторов
+        location (list): Центр карты
+    Возвращает:
+        float: Время в секундах
+        int: Размер HTML в байтах
+    """
+    start = time.perf_counter()
+    base_map = folium.Map(location=location, zoom_start=12, tiles='CartoDB positron')
+    layer_hexagon = folium.FeatureGroup(name='Гексагоны', show=True).add_to(base_map)
+    render(hexagons, layer_hexagon)
+    html = base_map.get_root().render()
+    return time.perf_counter() - start, len(html.encode('utf-8'))
+
+
+def bench_render(city_name='Краснодар', resolutions=(7, 8, 9, 10)):
+    """
+    Сравнивает отрисовку PolyLine на каждую ячейку, одним GeoJSON-слоем и слоем идентификаторов (h3-js).
+    Параметры:
+        city_name (str): Название города на русском языке
+        resolutions (tuple): Уровни детализации H3
+    Возвращает:
+        list: Результаты замеров по каждому уровню
+    """
+    city_gdf = get_city_boundary(city_name, store=BoundaryStore(), offline=True)
+    geoJson = boundary_to_geojson(city_gdf)
+    centroid = city_gdf.union_all().centroid
+    location = [centroid.y, centroid.x]
+
+    results = []
+    for res in resolutions:
+        hexagons = polyfill(geoJson, res=res)
+        loop_time, loop_size = time_render(render_hexagons_polylines, hexagons, location)
+        batch_time, batch_size = time_render(render_hexagons_geojson, hexagons, location)
+        ids_time, ids_size = time_render(render_hexagons_ids, hexagons, location)
+        results.append({
+            'res': res,
+            'cells': len(hexagons),
+            'polyline_cells_per_sec': len(hexagons) / loop_time,
+            'geojson_cells_per_sec': len(hexagons) / batch_time,
+            'polyline_html_bytes': loop_size,
+            'geojson_html_bytes': batch_size,
+            'ids_cells_per_sec': len(hexagons) / ids_time,
+            'ids_html_bytes': ids_size,
+        })
+        print(
+            f"res={res:2d} cells={len(hexagons):7d} "
+            f"polyline={len(hexagons) / loop_time:9.0f} cells/s ({loop_size / 1e6:6.1f} MB) "
+            f"geojson={len(hexagons) / batch_time:9.0f} cells/s ({batch_size / 1e6:6.1f} MB) "
+            f"x{loop_time / batch_time:.1f} "
+            f"ids={len(hexagons) / ids_time:9.0f} cells/s ({ids_size / 1e6:6.2f} MB, x{batch_size / ids_size:.0f} меньше geojson)"
+        )
+
+    return results
+
+
+def bench_compact(city_name='Краснодар', res=10):
+    """
+    Сравнивает плоское покрытие уровня res (как в main_2.py) со сжатым смешанным покрытием.
+    Параметры:
+        city_name (str): Название города на русском языке
+        res (int): Уровень детализации H3
+    Возвращает:
+        dict: Число ячеек, размер HTML и время отрисовки для обоих режимов
+    """
+    city_gdf = get_city_boundary(city_name, store=BoundaryStore(), offline=True)
+    geoJson = boundary_to_geojson(city_gdf)
+    centroid = city_gdf.union_all().centroid
+    location = [centroid.y, centroid.x]
+
+    flat = polyfill(geoJson, res=res)
+    compacted = compact(flat)
+    flat_time, flat_size = time_render(render_hexagons_geojson, flat, location)
+    compact_time, compact_size = time_render(render_hexagons_geojson, compacted, location)
+
+    result = {
+        'res': res,
+        'flat_cells': len(flat),
+        'compact_cells': len(compacted),
+        'flat_html_bytes': flat_size,
+        'compact_html_bytes': compact_size,
+        'flat_render_sec': flat_time,
+        'compact_render_sec': compact_time,
+    }
+    print(
+        f"res={res} cells {len(flat)} -> {len(compacted)} (x{len(flat) / len(compacted):.1f}), "
+        f"HTML {flat_size / 1e6:.1f} -> {compact_size / 1e6:.1f} MB (x{flat_size / compact_size:.1f}), "
+        f"render {flat_time:.2f} -> {compact_time:.2f} s (x{flat_time / compact_time:.1f})"
+    )
+
+    return result
+
+
+def bench_simplify(city_name='Краснодар', resolutions=range(7, 12), runs=3):
+    """
+    Сравнивает заполнение по исходной границе и по упрощенной (polyfill_simplified).
+    Параметры:
+        city_name (str): Название города на русском языке
+        resolutions (range): Уровни детализации H3
+        runs (int): Повторы замера (берется лучшее время)
+    Возвращает:
+        list: Время, число вершин и расхождения наборов ячеек по уровням
+    """
+    city_gdf = get_city_boundary(city_name, store=BoundaryStore(), offline=True)
+    geoJson = boundary_to_geojson(city_gdf)
+    boundary = polygons_to_shapely(geojson_to_polygons(geoJson))
+
+    def best_time(simplify):
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            hexagons = polyfill(geoJson, res=res, workers=1, simplify=simplify)
+            timings.append(time.perf_counter() - started)
+        return hexagons, min(timings)
+
+    rows = []
+    for res in resolutions:
+        simplified = shapely.simplify(boundary, simplify_tolerance(res), preserve_topology=True)
+        exact, exact_time = best_time(False)
+        fast, fast_time = best_time(True)
+        missing, extra = np.setdiff1d(exact, fast), np.setdiff1d(fast, exact)
+
+        rows.append({
+            'res': res,
+            'cells': len(exact),
+            'vertices': shapely.get_num_coordinates(boundary),
+            'simplified_vertices': shapely.get_num_coordinates(simplified),
+            'exact_sec': round(exact_time, 6),
+            'simplified_sec': round(fast_time, 6),
+            'missing': [hex(cell) for cell in missing.tolist()],
+            'extra': [hex(cell) for cell in extra.tolist()],
+        })
+        print(
+            f"res={res:>2} cells {len(exact):>7}, вершин {rows[-1]['vertices']} -> {rows[-1]['simplified_vertices']}, "
+            f"{exact_time:.3f} -> {fast_time:.3f} s (x{exact_time / fast_time:.2f}), "
+            f"расхождений {len(missing) + len(extra)}"
+        )
+        for cell in rows[-1]['missing']:
+            print(f'    нет ячейки {cell}')
+        for cell in rows[-1]['extra']:
+            print(f'    лишняя ячейка {cell}')
+
+    return rows
+
+
+# Сохранение карты в отдельном процессе: folium.Map.save или потоковая запись (stream_map.py)
+SAVE_SCRIPT = '''
+import json, sys, time
+from boundary_store import BoundaryStore
+from main import boundary_to_geojson, create_hexagons, get_city_boundary, polyfill, visualize_city_boundary
+from polyfill_cache import PolyfillCache
+from profiling import PeakRSS
+from stream_map import save_streaming_map
+import folium
+
+city_name, res, mode, path = sys.argv[1], int(sys.argv[2]), sys.argv[3], sys.argv[4]
+city_gdf = get_city_boundary(city_name, store=BoundaryStore(), offline=True)
+geoJson = boundary_to_geojson(city_gdf)
+hexagons = polyfill(geoJson, res=res, cache=PolyfillCache())
+before = PeakRSS.current()
+started = time.perf_counter()
+with PeakRSS() as rss:
+    if mode == 'stream':
+        save_streaming_map(city_gdf, hexagons, path)
+    else:
+        city_map = visualize_city_boundary(city_gdf)
+        create_hexagons(geoJson, city_map, res=res, cache=PolyfillCache())
+        folium.LayerControl().add_to(city_map)
+        city_map.save(path)
+print(json.dumps({'sec': time.perf_counter() - started, 'peak_mb': (rss.peak - before) / 1024 ** 2}))
+'''
+
+
+def bench_stream(city_name='Краснодар', resolutions=(8, 9, 10, 11)):
+    """
+    Сравнивает пиковую память и время сохранения карты через folium и потоковой записью.
+    Каждый замер - в новом процессе, чтобы пик памяти не зависел от предыдущих.
+    Параметры:
+        city_name (str): Название города на русском языке
+        resolutions (tuple): Уровни детализации H3
+    Возвращает:
+        list: Прирост RSS во время сохранения, время и размер файла по уровням
+    """
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for res in resolutions:
+            row = {'res': res}
+            for mode in ('folium', 'stream'):
+                path = Path(tmp_dir) / f'{mode}_{res}.html'
+                output = subprocess.run(
+                    [sys.executable, '-c', SAVE_SCRIPT, city_name, str(res), mode, str(path)],
+                    capture_output=True, text=True, check=True
+                ).stdout
+                measured = json.loads(output.strip().splitlines()[-1])
+                row[f'{mode}_sec'] = round(measured['sec'], 3)
+                row[f'{mode}_peak_mb'] = round(measured['peak_mb'], 1)
+                row['html_mb'] = round(path.stat().st_size / 1024 ** 2, 1)
+            rows.append(row)
+            print(
+                f"res={res:>2} HTML {row['html_mb']:.1f} MB: память +{row['folium_peak_mb']:.1f} -> "
+                f"+{row['stream_peak_mb']:.1f} MB, время {row['folium_sec']:.2f} -> {row['stream_sec']:.2f} s"
+            )
+
+    return rows
+
+
+# Границы из cache/ в отдельном процессе: json.loads всего ответа или потоковый разбор (overpass_stream.py)
+PARSE_SCRIPT = '''
+import json, sys, time
+from pathlib import Path
+from boundary_store import filter_city_boundary, load_cached_boundary
+from osmnx_compat import features_from_responses
+from profiling import PeakRSS
+
+city_name, mode, cache_dir = sys.argv[1], sys.argv[2], sys.argv[3]
+before = PeakRSS.current()
+started = time.perf_counter()
+with PeakRSS() as rss:
+    if mode == 'stream':
+        gdf = load_cached_boundary(city_name, cache_dir=cache_dir)
+    else:
+        for path in sorted(Path(cache_dir).glob('*.json')):
+            response = json.loads(path.read_text(encoding='utf-8'))
+            if not isinstance(response, dict) or 'elements' not in response:
+                continue
+            gdf = features_from_responses([response], {'boundary': 'administrative'})
+            gdf = filter_city_boundary(gdf, city_name)
+            if not gdf.empty:
+                break
+print(json.dumps({'sec': time.perf_counter() - started, 'peak_mb': (rss.peak - before) / 1024 ** 2, 'rows': len(gdf)}))
+'''
+
+
+def bench_parse(city_name='Краснодар', cache_dir='cache'):
+    """
+    Сравнивает пиковую память и время восстановления границ из ответов Overpass:
+    json.loads и OSMnx по всему ответу против потокового разбора с фильтром по тегам.
+    Параметры:
+        city_name (str): Название города на русском языке
+        cache_dir (str): Папка с кешем OSMnx
+    Возвращает:
+        dict: Время и прирост RSS для обоих способов
+    """
+    row = {'cache_mb': round(sum(path.stat().st_size for path in Path(cache_dir).glob('*.json')) / 1024 ** 2, 1)}
+    for mode in ('json', 'stream'):
+        output = subprocess.run(
+            [sys.executable, '-c', PARSE_SCRIPT, city_name, mode, cache_dir],
+            capture_output=True, text=True, check=True
+        ).stdout
+        measured = json.loads(output.strip().splitlines()[-1])
+        row[f'{mode}_sec'] = round(measured['sec'], 3)
+        row[f'{mode}_peak_mb'] = round(measured['peak_mb'], 1)
+        row[f'{mode}_rows'] = measured['rows']
+
+    print(
+        f"{city_name}, cache/ {row['cache_mb']:.1f} MB: память +{row['json_peak_mb']:.1f} -> "
+        f"+{row['stream_peak_mb']:.1f} MB, время {row['json_sec']:.2f} -> {row['stream_sec']:.2f} s"
+    )
+    return row
+
+
+def bench_service(city_name='Краснодар', resolutions=(8, 9), threads=16, requests_per_thread=200):
+    """
+    Нагрузочный замер service.py: одинаковые холодные запросы (должны объединиться в одно построение),
+    затем задержки ответов из кеша при одновременных запросах по постоянным соединениям.
+    Параметры:
+        city_name (str): Название города на русском языке (граница уже в хранилище)
+        resolutions (tuple): Уровни детализации H3
+        threads (int): Одновременные клиенты
+        requests_per_thread (int): Запросов на клиента
+    Возвращает:
+        dict: Число построений, p50/p99 задержки в миллисекундах и запросы в секунду
+    """
+    import http.client
+    import random
+    import socket
+    from concurrent.futures import ThreadPoolExecutor
+    from urllib.parse import quote
+
+    # Сервер в отдельном процессе, чтобы клиенты не делили с ним GIL
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen([sys.executable, 'service.py', '--port', str(port), '--offline'], stdout=subprocess.DEVNULL)
+
+    paths = [
+        f'/cities/{quote(city_name)}/{res}/hexagons?format={fmt}'
+        for res in resolutions for fmt in ('geojson', 'bin', 'ids')
+    ] + [f'/cities/{quote(city_name)}/boundary']
+
+    def fetch(connection, path):
+        started = time.perf_counter()
+        connection.request('GET', path)
+        response = connection.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise RuntimeError(f'{path}: HTTP {response.status}')
+        return time.perf_counter() - started, body
+
+    def client(count, path=None):
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        try:
+            return [fetch(connection, path or random.choice(paths))[0] for _ in range(count)]
+        finally:
+            connection.close()
+
+    def stats():
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        try:
+            return json.loads(fetch(connection, '/stats')[1])
+        finally:
+            connection.close()
+
+    try:
+        for _ in range(100):
+            try:
+                stats()
+                break
+            except OSError:
+                time.sleep(0.1)
+
+        # Холодный запрос одного ресурса от всех клиентов сразу
+        with ThreadPoolExecutor(threads) as pool:
+            cold = [latency for result in pool.map(client, [1] * threads, [paths[0]] * threads) for latency in result]
+        builds_cold = stats()['builds']
+
+        for path in paths:
+            client(1, path)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            latencies = [latency for result in pool.map(client, [requests_per_thread] * threads) for latency in result]
+        elapsed = time.perf_counter() - started
+        cache = stats()['cache']
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = sorted(latencies)
+    result = {
+        'cold_requests': threads,
+        'cold_builds': builds_cold,
+        'cold_max_ms': round(max(cold) * 1000, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 3),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 3),
+        'requests_per_sec': round(len(latencies) / elapsed),
+        'cache': cache,
+    }
+    print(
+        f"{threads} одинаковых холодных запросов -> построений: {builds_cold} ({result['cold_max_ms']} ms); "
+        f"из кеша: p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, {result['requests_per_sec']} запросов/s"
+    )
+    return result
+
+
+def bench_stages(city_name='Краснодар', resolutions=range(6, 12), out=None):
+    """
+    Замеряет этапы main.py (get_city_boundary, visualize_city_boundary, create_hexagons, Map.save)
+    на ответах OSM из cache/ и сохраняет результаты в JSON.
+    Параметры:
+        city_name (str): Название города на русском языке
+        resolutions (range): Уровни детализации H3
+        out (str): Путь к файлу результатов (по умолчанию bench_results/<время>.json)
+    Возвращает:
+        dict: Результаты замеров с описанием окружения
+    """
+    records = []
+
+    with replay_osm_cache():
+        record, city_gdf = measure('get_city_boundary', get_city_boundary, city_name)
+        records.append(record)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = BoundaryStore(root=tmp_dir)
+        store.put(city_name, '6', city_gdf)
+        record, _ = measure('get_city_boundary[store]', get_city_boundary, city_name, store=store)
+        records.append(record)
+
+        geoJson = boundary_to_geojson(city_gdf)
+        for res in resolutions:
+            record, city_map = measure('visualize_city_boundary', visualize_city_boundary, city_gdf, res=res)
+            records.append(record)
+
+            record, (hexagons, _) = measure('create_hexagons', create_hexagons, geoJson, city_map, res=res)
+            record['cells'] = len(hexagons)
+            records.append(record)
+
+            html_path = Path(tmp_dir) / f'map_{res}.html'
+            record, _ = measure('Map.save', city_map.save, str(html_path), res=res)
+            record['cells'] = len(hexagons)
+            record['html_bytes'] = html_path.stat().st_size
+            records.append(record)
+            html_path.unlink()
+
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'revision': revision,
+        'city': city_name,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'records': records,
+    }
+
+    out = Path(out) if out else Path(BENCH_DIR) / f"{datetime.now():%Y%m%d_%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f'Результаты сохранены в {out}')
+
+    return report
+
+
+def bench_cold_start(city_name='Краснодар', res=8, runs=5):
+    """
+    Замеряет холодный старт hexonly.py (новый интерпретатор на каждый запуск) по сохраненной границе
+    и проверяет, что тяжелые библиотеки не импортируются.
+    Параметры:
+        city_name (str): Название города на русском языке (граница уже в хранилище)
+        res (int): Уровень детализации H3
+        runs (int): Число запусков
+    Возвращает:
+        dict: Медиана и минимум времени запуска, импортированные тяжелые библиотеки
+    """
+    check = (
+        'import sys, hexonly; '
+        f'print(",".join(name for name in {HEAVY_MODULES!r} if name in sys.modules))'
+    )
+    loaded = subprocess.run([sys.executable, '-c', check], capture_output=True, text=True, check=True).stdout.strip()
+
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, 'hexonly.py', city_name, '--res', str(res)], capture_output=True, check=True
+        )
+        times.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import geopandas, osmnx, folium'], check=True)
+    heavy_import = time.perf_counter() - started
+
+    result = {
+        'median_sec': statistics.median(times),
+        'min_sec': min(times),
+        'heavy_import_sec': heavy_import,
+        'heavy_modules': loaded.split(',') if loaded else [],
+    }
+    print(
+        f"hexonly.py {city_name} --res {res}: медиана {result['median_sec']:.3f} s, минимум {result['min_sec']:.3f} s "
+        f"(только импорт geopandas/osmnx/folium - {heavy_import:.3f} s), тяжелые модули: {result['heavy_modules'] or 'нет'}"
+    )
+    return result
+
+
+def compare_results(old_path, new_path):
+    """
+    Сравнивает два файла результатов bench_stages по времени и памяти каждого этапа.
+    Параметры:
+        old_path (str): Базовый прогон
+        new_path (str): Новый прогон
+    Возвращает:
+        list: Строки сравнения (этап, уровень, отношения нового к старому)
+    """
+    load = lambda path: {
+        (record['stage'], record['res']): record
+        for record in json.loads(Path(path).read_text(encoding='utf-8'))['records']
+    }
+    old, new = load(old_path), load(new_path)
+
+    rows = []
+    for key in sorted(old.keys() & new.keys(), key=lambda key: (key[0], key[1] if key[1] is not None else -1)):
+        time_ratio = new[key]['wall_sec'] / old[key]['wall_sec'] if old[key]['wall_sec'] else float('nan')
+        memory_ratio = new[key]['peak_rss_mb'] / old[key]['peak_rss_mb'] if old[key]['peak_rss_mb'] else float('nan')
+        rows.append({'stage': key[0], 'res': key[1], 'time_ratio': time_ratio, 'memory_ratio': memory_ratio})
+        print(f"{key[0]:26s} res={key[1] if key[1] is not None else '-':>2} время x{time_ratio:.2f}  память x{memory_ratio:.2f}")
+
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Замеры скорости этапов построения H3-карт')
+    commands = parser.add_subparsers(dest='command')
+
+    stages = commands.add_parser('stages', help='Этапы main.py по уровням детализации')
+    stages.add_argument('--city', default='Краснодар')
+    stages.add_argument('--res', type=int, nargs=2, default=[6, 11], metavar=('MIN', 'MAX'))
+    stages.add_argument('--out', help='Файл результатов JSON')
+
+    compare = commands.add_parser('compare', help='Сравнение двух прогонов stages')
+    compare.add_argument('old')
+    compare.add_argument('new')
+
+    commands.add_parser('render', help='PolyLine на ячейку, один GeoJSON-слой и слой идентификаторов')
+    commands.add_parser('compact', help='Плоское покрытие против сжатого')
+
+    cold_start = commands.add_parser('coldstart', help='Холодный старт hexonly.py')
+    cold_start.add_argument('--city', default='Краснодар')
+    cold_start.add_argument('--res', type=int, default=8)
+
+    simplify = commands.add_parser('simplify', help='Заполнение по исходной границе против упрощенной')
+    simplify.add_argument('--city', default='Краснодар')
+    simplify.add_argument('--res', type=int, nargs=2, default=[7, 11], metavar=('MIN', 'MAX'))
+
+    stream = commands.add_parser('stream', help='Сохранение карты через folium против потоковой записи')
+    stream.add_argument('--city', default='Краснодар')
+    stream.add_argument('--res', type=int, nargs='+', default=[8, 9, 10, 11])
+
+    parse = commands.add_parser('parse', help='Разбор ответов Overpass целиком против потокового')
+    parse.add_argument('--city', default='Краснодар')
+    parse.add_argument('--cache-dir', default='cache')
+
+    service = commands.add_parser('service', help='Задержки service.py под одновременной нагрузкой')
+    service.add_argument('--city', default='Краснодар')
+    service.add_argument('--threads', type=int, default=16)
+
+    args = parser.parse_args()
+    if args.command == 'compare':
+        compare_results(args.old, args.new)
+    elif args.command == 'render':
+        bench_render()
+    elif args.command == 'compact':
+        bench_compact()
+    elif args.command == 'coldstart':
+        bench_cold_start(args.city, args.res)
+    elif args.command == 'service':
+        bench_service(args.city, threads=args.threads)
+    elif args.command == 'stream':
+        bench_stream(args.city, args.res)
+    elif args.command == 'parse':
+        bench_parse(args.city, args.cache_dir)
+    elif args.command == 'simplify':
+        bench_simplify(args.city, range(args.res[0], args.res[1] + 1))
+    else:
+        # Без подкоманды - замер этапов с параметрами по умолчанию
+        min_res, max_res = getattr(args, 'res', [6, 11])
+        bench_stages(getattr(args, 'city', 'Краснодар'), range(min_res, max_res + 1), getattr(args, 'out', None))
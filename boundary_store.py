@@ -0,0 +1,322 @@
+#!python 3.13
+# Локальное хранилище границ городов: отфильтрованный GeoDataFrame в GeoParquet (WKB),
+# адресуемый по содержимому, с возможностью работы без сети из ответов Overpass в cache/.
+# Рядом с каждой записью лежат кольца полигона в .npz, которые читаются одним NumPy,
+# поэтому geopandas, osmnx и shapely импортируются только в функциях, которым они нужны.
+
+import hashlib
+import json
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# Папка хранилища по умолчанию
+BOUNDARY_DIR = 'boundaries'
+
+
+def filter_city_boundary(gdf, city_name, admin_level='6'):
+    """
+    Оставляет административную границу города нужного уровня.
+    Параметры:
+        gdf (GeoDataFrame): Административные границы из OSM
+        city_name (str): Название города на русском языке
+        admin_level (str): Уровень административного деления OSM
+    Возвращает:
+        GeoDataFrame: Границы города (может быть пустым)
+    """
+    import geopandas as gpd  # Работа с геоданными
+
+    if gdf.empty or 'name' not in gdf or 'admin_level' not in gdf:
+        return gpd.GeoDataFrame()
+
+    filtered = gdf[
+        (gdf['name'].str.contains(city_name, regex=False, na=False)) & # Название города - подстрока, как в boundary_matcher
+        (gdf['admin_level'] == admin_level)  # Уровень для городов федерального значения
+    ]
+
+    return filtered.reset_index()
+
+
+def load_cached_boundary(city_name, admin_level='6', cache_dir='cache'):
+    """
+    Восстанавливает границы города из сохраненных ответов Overpass без обращения к сети.
+    Параметры:
+        city_name (str): Название города на русском языке
+        admin_level (str): Уровень административного деления OSM
+        cache_dir (str): Папка с кешем OSMnx
+    Возвращает:
+        GeoDataFrame: Геоданные с границами города (пустой, если в кеше их нет)
+    """
+    import geopandas as gpd  # Работа с геоданными
+
+    from osmnx_compat import features_from_responses
+    from overpass_stream import boundary_matcher, stream_response
+
+    for path in sorted(Path(cache_dir).glob('*.json')):
+        # Файл разбирается потоком: в памяти остаются только границы города и их линии и узлы
+        response = stream_response(path, boundary_matcher(city_name, admin_level))
+        if not response.get('elements'):
+            continue  # Ответы Nominatim и ответы без границы города пропускаем
+
+        gdf = features_from_responses([response], {'boundary': 'administrative'})
+        filtered = filter_city_boundary(gdf, city_name, admin_level)
+        if not filtered.empty:
+            return filtered
+
+    return gpd.GeoDataFrame()
+
+
+def boundary_to_geojson(city_gpf):
+    """
+    Преобразует границы города в GeoJSON с координатами в порядке (lat, lng) для H3.
+    Сохраняются все части MultiPolygon и внутренние кольца (анклавы).
+    Параметры:
+        city_gpf (GeoDataFrame): Геоданные с границами города
+    Возвращает:
+        dict: GeoJSON с полигоном или мультиполигоном
+    """
+    from shapely.geometry import mapping  # Работа с геометрией
+
+    geoJson = mapping(city_gpf.union_all())
+
+    # вместо [(X1, Y1), (X2, Y2), ...], переставляем столбцы с координатами и получаем [(Y1, X1), (Y2, X2), ...]
+    swap = lambda ring: np.array(ring)[:, ::-1].tolist()
+
+    if geoJson['type'] == 'Polygon':
+        coordinates = [swap(ring) for ring in geoJson['coordinates']]
+    elif geoJson['type'] == 'MultiPolygon':
+        coordinates = [[swap(ring) for ring in polygon] for polygon in geoJson['coordinates']]
+    else:
+        raise ValueError(f"Unsupported boundary geometry: {geoJson['type']}")
+
+    return {'type': geoJson['type'], 'coordinates': coordinates}
+
+
+def save_rings(path, geoJson):
+    """
+    Сохраняет кольца GeoJSON плоскими массивами NumPy.
+    Параметры:
+        path (Path): Путь к файлу .npz
+        geoJson (dict): Polygon/MultiPolygon в порядке (lat, lng) из boundary_to_geojson
+    """
+    polygons = [geoJson['coordinates']] if geoJson['type'] == 'Polygon' else geoJson['coordinates']
+    rings = [ring for polygon in polygons for ring in polygon]
+
+    tmp_path = path.with_suffix('.tmp.npz')
+    np.savez(
+        tmp_path,
+        type=np.array(geoJson['type']),
+        coords=np.concatenate([np.asarray(ring, dtype=np.float64) for ring in rings]),
+        ring_offsets=np.cumsum([0] + [len(ring) for ring in rings]),
+        polygon_offsets=np.cumsum([0] + [len(polygon) for polygon in polygons]),
+    )
+    tmp_path.replace(path)
+
+
+def load_rings(path):
+    """
+    Восстанавливает GeoJSON из файла save_rings (координаты совпадают побитово).
+    Параметры:
+        path (Path): Путь к файлу .npz
+    Возвращает:
+        dict: GeoJSON с полигоном или мультиполигоном в порядке (lat, lng)
+    """
+    with np.load(path) as data:
+        coords = data['coords'].tolist()
+        ring_offsets = data['ring_offsets'].tolist()
+        polygon_offsets = data['polygon_offsets'].tolist()
+        geometry_type = str(data['type'])
+
+    rings = [coords[start:end] for start, end in zip(ring_offsets[:-1], ring_offsets[1:])]
+    polygons = [rings[start:end] for start, end in zip(polygon_offsets[:-1], polygon_offsets[1:])]
+
+    return {'type': geometry_type, 'coordinates': polygons[0] if geometry_type == 'Polygon' else polygons}
+
+
+def parquet_crs(metadata):
+    """
+    Код CRS геометрии из метаданных GeoParquet без разбора PROJJSON.
+    Параметры:
+        metadata (dict): Метаданные схемы Parquet (ключи и значения - bytes)
+    Возвращает:
+        str: CRS вида 'EPSG:4326' (по спецификации GeoParquet без CRS - долгота и широта WGS 84)
+    """
+    geo = json.loads((metadata or {}).get(b'geo', b'{}'))
+    crs = geo.get('columns', {}).get('geometry', {}).get('crs') or {}
+    crs_id = crs.get('id') if isinstance(crs, dict) else None
+    if crs_id:
+        return f"{crs_id['authority']}:{crs_id['code']}"
+
+    return 'EPSG:4326'
+
+
+class BoundaryStore:
+    """
+    Хранилище границ городов по ключу (название города, admin_level).
+    Данные лежат в objects/<sha1 содержимого>.parquet, кольца для H3 - в objects/<sha1>.rings.npz,
+    ключи - в index.json, поэтому одинаковые границы под разными ключами хранятся один раз.
+    """
+
+    def __init__(self, root=BOUNDARY_DIR, cache_dir='cache'):
+        """
+        Параметры:
+            root (str): Папка хранилища
+            cache_dir (str): Папка с кешем OSMnx для работы без сети
+        """
+        self.root = Path(root)
+        self.cache_dir = cache_dir
+        self.objects = self.root / 'objects'
+        self.index_path = self.root / 'index.json'
+        self.index = json.loads(self.index_path.read_text(encoding='utf-8')) if self.index_path.exists() else {}
+        self.hits = 0
+        self.misses = 0
+        self.cache_imports = 0
+        self.lock = threading.Lock()  # Запись индекса из нескольких потоков пакетной обработки
+
+    @staticmethod
+    def key(city_name, admin_level='6'):
+        """
+        Ключ записи в индексе.
+        Параметры:
+            city_name (str): Название города на русском языке
+            admin_level (str): Уровень административного деления OSM
+        Возвращает:
+            str: Ключ вида 'Краснодар|6'
+        """
+        return f'{city_name}|{admin_level}'
+
+    def path(self, city_name, admin_level='6'):
+        """
+        Путь к файлу GeoParquet для ключа.
+        Параметры:
+            city_name (str): Название города на русском языке
+            admin_level (str): Уровень административного деления OSM
+        Возвращает:
+            Path | None: Путь к файлу или None, если ключа нет в индексе
+        """
+        digest = self.index.get(self.key(city_name, admin_level))
+        return self.objects / f'{digest}.parquet' if digest else None
+
+    def get(self, city_name, admin_level='6'):
+        """
+        Загружает границы из хранилища.
+        Параметры:
+            city_name (str): Название города на русском языке
+            admin_level (str): Уровень административного деления OSM
+        Возвращает:
+            GeoDataFrame | None: Границы города или None при промахе
+        """
+        path = self.path(city_name, admin_level)
+        if path is None or not path.exists():
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        import geopandas as gpd  # Работа с геоданными
+        import pyarrow.parquet as pq  # Чтение GeoParquet
+        import shapely
+
+        # Читаем таблицу напрямую и собираем геометрию из WKB: gpd.read_parquet
+        # тратит основное время на разбор CRS из метаданных GeoParquet
+        table = pq.read_table(path)
+        df = table.to_pandas()
+        return gpd.GeoDataFrame(
+            df.drop(columns='geometry'),
+            geometry=shapely.from_wkb(df['geometry'].values),
+            crs=parquet_crs(table.schema.metadata)
+        )
+
+    def get_geojson(self, city_name, admin_level='6'):
+        """
+        Загружает кольца границ для H3 без geopandas и shapely.
+        Для записей, сохраненных без колец, они один раз строятся из GeoParquet.
+        Параметры:
+            city_name (str): Название города на русском языке
+            admin_level (str): Уровень административного деления OSM
+        Возвращает:
+            dict | None: GeoJSON в порядке (lat, lng) как из boundary_to_geojson или None при промахе
+        """
+        path = self.path(city_name, admin_level)
+        if path is None or not path.exists():
+            self.misses += 1
+            return None
+
+        rings_path = path.with_suffix('.rings.npz')
+        if not rings_path.exists():
+            gdf = self.get(city_name, admin_level)
+            save_rings(rings_path, boundary_to_geojson(gdf))
+            return load_rings(rings_path)
+
+        self.hits += 1
+        return load_rings(rings_path)
+
+    def put(self, city_name, admin_level, gdf):
+        """
+        Сохраняет границы в хранилище.
+        Параметры:
+            city_name (str): Название города на русском языке
+            admin_level (str): Уровень административного деления OSM
+            gdf (GeoDataFrame): Отфильтрованные границы города
+        Возвращает:
+            Path: Путь к сохраненному файлу
+        """
+        self.objects.mkdir(parents=True, exist_ok=True)
+
+        # Адрес - хеш геометрии в WKB и атрибутов
+        digest = hashlib.sha1()
+        for geometry in gdf.geometry:
+            digest.update(geometry.wkb)
+        digest.update(gdf.drop(columns=gdf.geometry.name).to_json().encode('utf-8'))
+        digest = digest.hexdigest()
+
+        path = self.objects / f'{digest}.parquet'
+        if not path.exists():
+            tmp_path = path.with_suffix('.tmp')
+            gdf.to_parquet(tmp_path)
+            tmp_path.replace(path)
+            save_rings(path.with_suffix('.rings.npz'), boundary_to_geojson(gdf))
+
+        with self.lock:
+            # Перечитываем индекс, чтобы не затереть записи других процессов
+            if self.index_path.exists():
+                self.index.update(json.loads(self.index_path.read_text(encoding='utf-8')))
+            self.index[self.key(city_name, admin_level)] = digest
+
+            tmp_path = self.index_path.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps(self.index, ensure_ascii=False, indent=2), encoding='utf-8')
+            tmp_path.replace(self.index_path)
+
+        return path
+
+    def import_cached(self, city_name, admin_level='6'):
+        """
+        Переносит границы из ответов Overpass в cache/ в хранилище без обращения к сети.
+        Параметры:
+            city_name (str): Название города на русском языке
+            admin_level (str): Уровень административного деления OSM
+        Возвращает:
+            GeoDataFrame: Границы города (пустой, если в кеше их нет)
+        """
+        gdf = load_cached_boundary(city_name, admin_level, self.cache_dir)
+        if not gdf.empty:
+            self.cache_imports += 1
+            self.put(city_name, admin_level, gdf)
+
+        return gdf
+
+    def stats(self):
+        """
+        Статистика обращений к хранилищу.
+        Возвращает:
+            dict: Попадания, промахи, импорты из cache/ и доля попаданий
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'cache_imports': self.cache_imports,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self.index),
+        }
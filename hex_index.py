@@ -0,0 +1,281 @@
+#!python 3.13
+# Компактное представление наборов H3-ячеек: массивы NumPy uint64 вместо списков строк
+# и отсортированные индексы .npy, которые открываются через memory-map без разбора
+
+from pathlib import Path
+
+import h3  # Работа с H3-геоидами
+import h3.api.numpy_int as h3_int  # H3 с идентификаторами uint64
+import numpy as np
+
+# Папка с индексами гексагонов по умолчанию
+HEX_INDEX_DIR = 'hex_index'
+
+
+def cells_to_uint64(cells):
+    """
+    Приводит набор H3-ячеек к массиву uint64.
+    Параметры:
+        cells (list | np.ndarray): H3 идентификаторы строками или целыми числами
+    Возвращает:
+        np.ndarray: Массив uint64
+    """
+    if isinstance(cells, np.ndarray) and cells.dtype == np.uint64:
+        return cells
+
+    cells = list(cells)
+    if cells and isinstance(cells[0], str):
+        return np.fromiter((h3.str_to_int(cell) for cell in cells), dtype=np.uint64, count=len(cells))
+
+    return np.asarray(cells, dtype=np.uint64)
+
+
+def cells_to_str(cells):
+    """
+    Переводит массив uint64 в список строковых H3 идентификаторов (для подписей и JSON).
+    Параметры:
+        cells (np.ndarray): Массив uint64
+    Возвращает:
+        list: Список H3 идентификаторов строками
+    """
+    return [format(cell, 'x') for cell in np.asarray(cells, dtype=np.uint64).tolist()]
+
+
+def latlng_to_cells(lat, lng, res):
+    """
+    Переводит массивы координат в ячейки H3 одним вызовом.
+    При установленном h3ronpy (необязательная зависимость, pip install h3ronpy) перевод идет
+    векторно на Rust; без него - цикл по h3.api.numpy_int (около 2 мкс на точку, без создания строк).
+    Параметры:
+        lat (np.ndarray): Широты
+        lng (np.ndarray): Долготы
+        res (int): Уровень детализации H3
+    Возвращает:
+        np.ndarray: Массив uint64
+    """
+    lat = np.ascontiguousarray(lat, dtype=np.float64)
+    lng = np.ascontiguousarray(lng, dtype=np.float64)
+
+    try:
+        from h3ronpy.vector import coordinates_to_cells  # Векторный перевод координат в ячейки
+    except ImportError:
+        coordinates_to_cells = None
+
+    if coordinates_to_cells is not None:
+        return np.asarray(coordinates_to_cells(lat, lng, res), dtype=np.uint64)
+
+    return np.fromiter(
+        (h3_int.latlng_to_cell(y, x, res) for y, x in zip(lat.tolist(), lng.tolist())),
+        dtype=np.uint64,
+        count=len(lat)
+    )
+
+
+def cells_resolution(cells):
+    """
+    Векторно извлекает уровень детализации из битов H3 идентификаторов.
+    Параметры:
+        cells (np.ndarray): Массив uint64
+    Возвращает:
+        np.ndarray: Уровни детализации (uint8)
+    """
+    return ((np.asarray(cells, dtype=np.uint64) >> np.uint64(52)) & np.uint64(0xF)).astype(np.uint8)
+
+
+def cells_to_parent(cells, res):
+    """
+    Векторно находит родительские ячейки уровня res через битовые операции над индексом H3:
+    в поле уровня записывается res, а цифры более мелких уровней заполняются значением 7.
+    Параметры:
+        cells (np.ndarray): H3 идентификаторы уровня не меньше res (uint64)
+        res (int): Уровень детализации родителя
+    Возвращает:
+        np.ndarray: Родительские ячейки (uint64), по одной на каждую входную
+    """
+    cells = cells_to_uint64(cells)
+    if len(cells) and cells_resolution(cells).min() < res:
+        raise ValueError(f'Cells must have resolution >= {res}')
+
+    digits_mask = np.uint64((1 << (3 * (15 - res))) - 1)
+    res_mask = np.uint64(0xF << 52)
+    return (cells & ~res_mask) | np.uint64(res << 52) | digits_mask
+
+
+def cells_to_center_child(cells, res):
+    """
+    Векторно находит центральных потомков уровня res: цифры уровней между уровнем ячейки
+    и res обнуляются. Центр центрального потомка совпадает с центром ячейки.
+    Параметры:
+        cells (np.ndarray): H3 идентификаторы уровня не больше res (uint64)
+        res (int): Уровень детализации потомка
+    Возвращает:
+        np.ndarray: Центральные потомки (uint64), по одному на каждую входную
+    """
+    cells = cells_to_uint64(cells)
+    resolutions = cells_resolution(cells).astype(np.uint64)
+    if len(cells) and resolutions.max() > res:
+        raise ValueError(f'Cells must have resolution <= {res}')
+
+    one = np.uint64(1)
+    digits_mask = ((one << (np.uint64(3) * (np.uint64(15) - resolutions))) - one) & \
+        ~np.uint64((1 << (3 * (15 - res))) - 1)
+    res_mask = np.uint64(0xF << 52)
+    return (cells & ~res_mask & ~digits_mask) | np.uint64(res << 52)
+
+
+def compact(cells):
+    """
+    Сжимает покрытие: полные семерки дочерних ячеек заменяются родителем.
+    Мелкие ячейки остаются только вдоль границы полигона.
+    Параметры:
+        cells (np.ndarray): H3 идентификаторы одного уровня (uint64)
+    Возвращает:
+        np.ndarray: Отсортированное покрытие смешанных уровней (uint64)
+    """
+    return np.sort(h3_int.compact_cells(cells_to_uint64(cells)))
+
+
+def iter_uncompact(cells, res, chunk_size=100_000):
+    """
+    Лениво разворачивает сжатое покрытие до уровня res порциями примерно по chunk_size ячеек.
+    Параметры:
+        cells (np.ndarray): Покрытие смешанных уровней (uint64)
+        res (int): Целевой уровень детализации H3
+        chunk_size (int): Примерный размер порции
+    Возвращает:
+        generator: Массивы uint64 ячеек уровня res
+    """
+    cells = cells_to_uint64(cells)
+
+    # Каждая ячейка уровня r разворачивается в 7^(res - r) потомков
+    children = np.power(7, res - cells_resolution(cells).astype(np.int64))
+    bounds = np.searchsorted(np.cumsum(children), np.arange(chunk_size, children.sum(), chunk_size), side='right')
+
+    for part in np.split(cells, np.unique(bounds)):
+        if len(part):
+            yield h3_int.uncompact_cells(part, res)
+
+
+def uncompact(cells, res):
+    """
+    Разворачивает сжатое покрытие до уровня res целиком.
+    Параметры:
+        cells (np.ndarray): Покрытие смешанных уровней (uint64)
+        res (int): Целевой уровень детализации H3
+    Возвращает:
+        np.ndarray: Отсортированные ячейки уровня res (uint64)
+    """
+    chunks = list(iter_uncompact(cells, res))
+    return np.sort(np.concatenate(chunks)) if chunks else np.empty(0, dtype=np.uint64)
+
+
+def hex_index_path(city_name, res, root=HEX_INDEX_DIR):
+    """
+    Путь к индексу гексагонов города.
+    Параметры:
+        city_name (str): Название города на русском языке
+        res (int): Уровень детализации H3
+        root (str): Папка с индексами
+    Возвращает:
+        Path: Путь к файлу .npy
+    """
+    return Path(root) / f'{city_name}_{res}.npy'
+
+
+def save_hex_index(path, cells):
+    """
+    Сохраняет набор ячеек как отсортированный массив uint64 без дублей.
+    Параметры:
+        path (str | Path): Путь к файлу .npy
+        cells (list | np.ndarray): H3 идентификаторы
+    Возвращает:
+        Path: Путь к сохраненному файлу
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = path.with_suffix('.tmp.npy')
+    np.save(tmp_path, np.unique(cells_to_uint64(cells)))
+    tmp_path.replace(path)
+
+    return path
+
+
+def load_hex_index(path, mmap=True):
+    """
+    Открывает индекс гексагонов.
+    Параметры:
+        path (str | Path): Путь к файлу .npy
+        mmap (bool): Отобразить файл в память вместо чтения целиком
+    Возвращает:
+        np.ndarray: Отсортированный массив uint64
+    """
+    return np.load(path, mmap_mode='r' if mmap else None)
+
+
+def hex_index_contains(index, cells):
+    """
+    Проверяет принадлежность ячеек индексу бинарным поиском.
+    Параметры:
+        index (np.ndarray): Отсортированный массив uint64 (в т.ч. memory-map)
+        cells (list | np.ndarray): Проверяемые H3 идентификаторы
+    Возвращает:
+        np.ndarray: Маска bool той же длины, что и cells
+    """
+    cells = cells_to_uint64(cells)
+    if len(index) == 0:
+        return np.zeros(len(cells), dtype=bool)
+
+    positions = np.searchsorted(index, cells)
+    positions[positions == len(index)] = 0  # Ячейки больше максимума заведомо отсутствуют
+    return np.asarray(index[positions]) == cells
+
+
+def encode_cells(cells):
+    """
+    Кодирует отсортированный набор ячеек разностями соседних идентификаторов в varint (LEB128).
+    Соседние по порядку ячейки одного уровня отличаются младшими разрядами, поэтому
+    на ячейку уходит 2-4 байта вместо 8.
+    Параметры:
+        cells (np.ndarray): Отсортированные H3 идентификаторы без повторов (uint64)
+    Возвращает:
+        bytes: Закодированный набор (первая разность - сам первый идентификатор)
+    """
+    cells = cells_to_uint64(cells)
+    deltas = np.diff(cells, prepend=np.uint64(0))
+
+    # 7 бит на байт, старший бит - признак продолжения; uint64 занимает до 10 байт
+    shifts = np.arange(10, dtype=np.uint64) * np.uint64(7)
+    groups = (deltas[:, None] >> shifts[None, :]) & np.uint64(0x7f)
+
+    # Число байт: 1 плюс число ненулевых старших групп
+    lengths = 1 + ((deltas[:, None] >> shifts[None, 1:]) > 0).sum(axis=1)
+
+    positions = np.arange(10)[None, :]
+    groups[positions < lengths[:, None] - 1] |= np.uint64(0x80)
+    return groups[positions < lengths[:, None]].astype(np.uint8).tobytes()
+
+
+def decode_cells(data):
+    """
+    Восстанавливает набор ячеек из encode_cells.
+    Параметры:
+        data (bytes): Закодированный набор
+    Возвращает:
+        np.ndarray: Отсортированные H3 идентификаторы (uint64)
+    """
+    data = np.frombuffer(data, dtype=np.uint8)
+    if len(data) == 0:
+        return np.empty(0, dtype=np.uint64)
+
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+
+    # Номер байта внутри своего числа задает сдвиг его 7 бит
+    owners = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shifts = (np.arange(len(data)) - starts[owners]).astype(np.uint64) * np.uint64(7)
+    parts = (data.astype(np.uint64) & np.uint64(0x7f)) << shifts
+
+    deltas = np.zeros(len(ends), dtype=np.uint64)
+    np.bitwise_or.at(deltas, owners, parts)
+    return np.cumsum(deltas, dtype=np.uint64)
@@ -0,0 +1,306 @@
+#!python 3.13
+# Столбцовое хранилище атрибутов ячеек H3: отсортированный ключ uint64 и плотные столбцы NumPy.
+# Таблица строится по покрытию из create_hexagons/polyfill и сохраняется в Parquet, поэтому
+# новая метрика для города - это слияние отсортированных массивов и дозапись столбца,
+# а не повторный запуск всего конвейера. Соединение двух таблиц - searchsorted по ключам.
+#
+# Пример:
+#     table = HexTable(hexagons)
+#     table.add_column('events', counts, cells=event_cells, fill=0)
+#     table.save(hex_table_path('Краснодар', 9))
+#     HexTable.load(hex_table_path('Краснодар', 9)).top_k('events', 10)
+
+from pathlib import Path
+
+import numpy as np
+
+from hex_index import cells_resolution, cells_to_str, cells_to_uint64
+
+# Папка с таблицами атрибутов по умолчанию
+HEX_TABLE_DIR = 'hex_tables'
+
+# Названия, занятые ключом в Parquet (cell) и в to_frame (cell, h3)
+RESERVED_COLUMNS = ('cell', 'h3')
+
+
+def hex_table_path(city_name, res, root=HEX_TABLE_DIR):
+    """
+    Путь к таблице атрибутов города.
+    Параметры:
+        city_name (str): Название города на русском языке
+        res (int): Уровень детализации H3
+        root (str): Папка с таблицами
+    Возвращает:
+        Path: Путь к файлу .parquet
+    """
+    return Path(root) / f'{city_name}_{res}.parquet'
+
+
+def check_column_name(name):
+    """
+    Проверяет, что название столбца не совпадает со столбцами ключа.
+    Параметры:
+        name (str): Название столбца
+    """
+    if name in RESERVED_COLUMNS:
+        raise ValueError(f'Column name {name!r} is reserved for the cell key')
+
+
+def align(cells, keys, values, fill=np.nan):
+    """
+    Раскладывает значения по ключам keys в порядок отсортированных ячеек cells.
+    Параметры:
+        cells (np.ndarray): Отсортированные ячейки таблицы (uint64)
+        keys (np.ndarray): Ячейки значений (uint64, без повторов, порядок любой)
+        values (np.ndarray): Значения той же длины, что и keys
+        fill: Значение для ячеек, которых нет среди keys
+    Возвращает:
+        np.ndarray: Столбец длины len(cells)
+    """
+    values = np.asarray(values)
+    dtype = np.result_type(values.dtype, np.min_scalar_type(fill)) if values.dtype.kind != 'O' else object
+    column = np.full(len(cells), fill, dtype=dtype)
+    if len(cells) == 0 or len(keys) == 0:
+        return column
+
+    positions = np.searchsorted(cells, keys)
+    positions[positions == len(cells)] = 0
+    found = cells[positions] == keys
+    column[positions[found]] = values[found]
+    return column
+
+
+class HexTable:
+    """
+    Таблица атрибутов ячеек: ключ - отсортированный массив uint64 без повторов,
+    столбцы - массивы NumPy той же длины в том же порядке.
+    """
+
+    def __init__(self, cells, columns=None):
+        """
+        Параметры:
+            cells (list | np.ndarray): H3 идентификаторы (строки или uint64, порядок любой)
+            columns (dict): {название: массив той же длины, что и cells}; названия cell и h3 заняты ключом
+        """
+        cells = cells_to_uint64(cells)
+        columns = {name: np.asarray(values) for name, values in (columns or {}).items()}
+
+        if np.any(cells[1:] < cells[:-1]):
+            order = np.argsort(cells, kind='stable')
+            cells = cells[order]
+            columns = {name: values[order] for name, values in columns.items()}
+        if len(cells) > 1 and np.any(cells[1:] == cells[:-1]):
+            raise ValueError('Hex table cells must be unique')
+
+        for name, values in columns.items():
+            check_column_name(name)
+            if len(values) != len(cells):
+                raise ValueError(f'Column {name} has {len(values)} rows, expected {len(cells)}')
+
+        self.cells = cells
+        self.columns = columns
+
+    @classmethod
+    def from_frame(cls, frame, cell_column='cell'):
+        """
+        Строит таблицу из DataFrame (например, extract_features или HexAccumulator.to_frame).
+        Параметры:
+            frame (pd.DataFrame): Таблица со столбцом ячеек (uint64 или строки H3)
+            cell_column (str): Столбец ячеек
+        Возвращает:
+            HexTable: Таблица без столбцов cell и h3
+        """
+        skip = {cell_column, 'cell', 'h3'}
+        return cls(
+            frame[cell_column].to_numpy(),
+            {name: frame[name].to_numpy() for name in frame.columns if name not in skip}
+        )
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    @property
+    def names(self):
+        return list(self.columns)
+
+    def resolution(self):
+        """
+        Уровень детализации ячеек таблицы.
+        Возвращает:
+            int | None: Уровень или None для пустой таблицы и смешанных уровней
+        """
+        resolutions = np.unique(cells_resolution(self.cells))
+        return int(resolutions[0]) if len(resolutions) == 1 else None
+
+    def add_column(self, name, values, cells=None, fill=np.nan):
+        """
+        Добавляет (или заменяет) столбец.
+        Параметры:
+            name (str): Название столбца
+            values (np.ndarray): Значения
+            cells (np.ndarray): Ячейки значений (None - значения уже в порядке таблицы);
+                значения вне таблицы отбрасываются
+            fill: Значение для ячеек таблицы без значения
+        Возвращает:
+            HexTable: Та же таблица
+        """
+        check_column_name(name)
+        if cells is None:
+            values = np.asarray(values)
+            if len(values) != len(self.cells):
+                raise ValueError(f'Column {name} has {len(values)} rows, expected {len(self.cells)}')
+            self.columns[name] = values
+        else:
+            self.columns[name] = align(self.cells, cells_to_uint64(cells), values, fill)
+
+        return self
+
+    def drop(self, *names):
+        """
+        Удаляет столбцы.
+        Параметры:
+            names (str): Названия столбцов
+        Возвращает:
+            HexTable: Та же таблица
+        """
+        for name in names:
+            del self.columns[name]
+        return self
+
+    def join(self, other, how='left', suffix='_right', fill=np.nan):
+        """
+        Соединяет с другой таблицей по ячейкам.
+        Параметры:
+            other (HexTable): Правая таблица
+            how (str): 'left' - ячейки этой таблицы, 'inner' - общие, 'outer' - все
+            suffix (str): Суффикс для столбцов правой таблицы, совпадающих по названию
+                (None - совпадающие названия недопустимы)
+            fill: Значение для отсутствующих ячеек
+        Возвращает:
+            HexTable: Новая таблица
+        """
+        if how == 'left':
+            cells = self.cells
+        elif how == 'inner':
+            cells = np.intersect1d(self.cells, other.cells, assume_unique=True)
+        elif how == 'outer':
+            cells = np.union1d(self.cells, other.cells)
+        else:
+            raise ValueError(f'Unknown join type: {how}')
+
+        columns = {}
+        for name, values in self.columns.items():
+            columns[name] = values if how == 'left' else align(cells, self.cells, values, fill)
+        for name, values in other.columns.items():
+            if name in self.columns and suffix is not None:
+                name = f'{name}{suffix}'
+            # Столбец правой таблицы не должен молча затереть столбец левой (в т.ч. после суффикса)
+            if name in columns:
+                raise ValueError(f'Duplicate column in join: {name}')
+            columns[name] = align(cells, other.cells, values, fill)
+
+        return HexTable(cells, columns)
+
+    def filter(self, mask):
+        """
+        Отбирает строки по маске.
+        Параметры:
+            mask (np.ndarray | callable): Маска bool или функция таблицы, которая ее возвращает
+                (например, lambda table: table['shops_count'] > 0)
+        Возвращает:
+            HexTable: Новая таблица
+        """
+        mask = np.asarray(mask(self) if callable(mask) else mask, dtype=bool)
+        return HexTable(self.cells[mask], {name: values[mask] for name, values in self.columns.items()})
+
+    def select(self, cells):
+        """
+        Строки для заданных ячеек (отсутствующие в таблице пропускаются).
+        Параметры:
+            cells (np.ndarray): H3 идентификаторы
+        Возвращает:
+            HexTable: Новая таблица
+        """
+        cells = np.unique(cells_to_uint64(cells))
+        positions = np.searchsorted(self.cells, cells)
+        inside = positions < len(self.cells)
+        positions, cells = positions[inside], cells[inside]
+        positions = positions[self.cells[positions] == cells]
+        return HexTable(self.cells[positions], {name: values[positions] for name, values in self.columns.items()})
+
+    def top_k(self, name, k=10, largest=True):
+        """
+        k ячеек с наибольшими (наименьшими) значениями столбца; NaN не учитываются.
+        Параметры:
+            name (str): Название столбца
+            k (int): Количество ячеек
+            largest (bool): Наибольшие значения (False - наименьшие)
+        Возвращает:
+            HexTable: Новая таблица в порядке убывания (возрастания) значений
+        """
+        values = self.columns[name].astype(np.float64)
+        rows = np.flatnonzero(~np.isnan(values))
+        keys = -values[rows] if largest else values[rows]
+        if k < len(rows):
+            rows = rows[np.argpartition(keys, k - 1)[:k]]
+            keys = -values[rows] if largest else values[rows]
+        rows = rows[np.argsort(keys, kind='stable')]
+
+        # Конструктор сортирует по ячейкам, поэтому порядок по значению задается здесь напрямую
+        table = HexTable.__new__(HexTable)
+        table.cells = self.cells[rows]
+        table.columns = {column: values[rows] for column, values in self.columns.items()}
+        return table
+
+    def to_frame(self):
+        """
+        Таблица в виде DataFrame.
+        Возвращает:
+            pd.DataFrame: Столбцы cell (uint64), h3 и столбцы таблицы
+        """
+        import pandas as pd
+
+        return pd.DataFrame({'cell': self.cells, 'h3': cells_to_str(self.cells), **self.columns})
+
+    def save(self, path):
+        """
+        Сохраняет таблицу в Parquet (ключ - столбец cell uint64).
+        Параметры:
+            path (str | Path): Путь к файлу .parquet
+        Возвращает:
+            Path: Путь к сохраненному файлу
+        """
+        import pyarrow as pa  # Работа с Parquet
+        import pyarrow.parquet as pq  # Работа с Parquet
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        table = pa.table({'cell': self.cells, **self.columns})
+        tmp_path = path.with_suffix('.tmp.parquet')
+        pq.write_table(table, tmp_path)
+        tmp_path.replace(path)
+
+        return path
+
+    @classmethod
+    def load(cls, path, columns=None):
+        """
+        Читает таблицу из Parquet.
+        Параметры:
+            path (str | Path): Путь к файлу .parquet
+            columns (list): Нужные столбцы (None - все); ключ читается всегда
+        Возвращает:
+            HexTable: Таблица
+        """
+        import pyarrow.parquet as pq  # Работа с Parquet
+
+        table = pq.read_table(path, columns=None if columns is None else ['cell', *columns])
+        data = {name: table.column(name).to_numpy() for name in table.column_names}
+        return cls(data.pop('cell'), data)
@@ -0,0 +1,73 @@
+#!python 3.13
+# Быстрый запуск без карты: граница из хранилища -> индекс гексагонов hex_index/<город>_<res>.npy.
+# Импортируются только h3 и NumPy (кольца границы читаются из .npz рядом с GeoParquet),
+# поэтому скрипт подходит для коротких пакетных задач. Граница должна быть сохранена заранее
+# (main.py, batch.py или batch.py --offline).
+#
+# Пример:
+#     python hexonly.py Краснодар --res 8 9 10
+
+import argparse
+import sys
+import time
+
+from boundary_store import BoundaryStore
+from hex_index import hex_index_path, save_hex_index
+from main import polyfill
+from polyfill_cache import PolyfillCache
+
+
+def build_hex_index(city_name, res, admin_level='6', store=None, cache=None, workers=1):
+    """
+    Заполняет сохраненную границу города ячейками H3 и записывает индекс.
+    Параметры:
+        city_name (str): Название города на русском языке
+        res (int): Уровень детализации H3
+        admin_level (str): Уровень административного деления OSM
+        store (BoundaryStore): Хранилище границ
+        cache (PolyfillCache): Кеш заполнения на диске (None - без кеша)
+        workers (int): Число процессов (больше 1 - с разрезанием на тайлы, импортирует shapely)
+    Возвращает:
+        Path | None: Путь к индексу или None, если границы нет в хранилище
+        int: Количество ячеек
+    """
+    store = store or BoundaryStore()
+    geoJson = store.get_geojson(city_name, admin_level)
+    if geoJson is None:
+        return None, 0
+
+    # Упрощение границы требует shapely, а здесь важнее быстрый старт
+    hexagons = polyfill(geoJson, res=res, workers=workers, cache=cache, simplify=False)
+    return save_hex_index(hex_index_path(city_name, res), hexagons), len(hexagons)
+
+
+def main():
+    started = time.perf_counter()
+
+    parser = argparse.ArgumentParser(description='Индекс H3-гексагонов по сохраненной границе города')
+    parser.add_argument('cities', nargs='+', help='Названия городов на русском языке')
+    parser.add_argument('--res', type=int, nargs='+', default=[8], help='Уровни детализации H3')
+    parser.add_argument('--admin-level', default='6', help='Уровень административного деления OSM')
+    parser.add_argument('--workers', type=int, default=1, help='Процессы для заполнения крупных полигонов')
+    parser.add_argument('--no-cache', action='store_true', help='Не использовать кеш заполнения')
+    args = parser.parse_args()
+
+    store = BoundaryStore()
+    cache = None if args.no_cache else PolyfillCache()
+
+    missing = 0
+    for city_name in args.cities:
+        for res in args.res:
+            path, cells = build_hex_index(city_name, res, args.admin_level, store, cache, args.workers)
+            if path is None:
+                print(f'{city_name}: границы нет в хранилище, сначала запустите main.py или batch.py')
+                missing += 1
+                break
+            print(f'{city_name}, res={res}: {cells} гексагонов -> {path}')
+
+    print(f'Готово за {time.perf_counter() - started:.3f} s')
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+#!python 3.13
+# Слой гексагонов, в который встроены только идентификаторы ячеек, а не координаты контуров.
+# Идентификаторы кодируются разностями в varint (hex_index.encode_cells) и base64, значения
+# свойств - массивами float64; контуры строит в браузере h3-js (cellToBoundary).
+# Локальная копия h3-js ищется в vendor/h3-js.umd.js и встраивается в страницу целиком.
+# Без нее страница подключает h3-js с CDN (unpkg.com) и без доступа к нему гексагоны не строятся,
+# поэтому при создании первого слоя без локальной копии печатается предупреждение:
+#     curl -o vendor/h3-js.umd.js https://unpkg.com/h3-js@4.1.0/dist/h3-js.umd.js
+
+import base64
+from pathlib import Path
+
+import numpy as np
+from branca.element import Element, Figure, JavascriptLink, MacroElement
+from jinja2 import Template
+
+from hex_index import cells_to_uint64, encode_cells
+
+# Локальная копия h3-js (UMD-сборка, объявляет глобальный h3)
+H3_JS_PATH = Path(__file__).parent / 'vendor' / 'h3-js.umd.js'
+
+# h3-js с CDN, если локальной копии нет
+H3_JS_URL = 'https://unpkg.com/h3-js@4.1.0/dist/h3-js.umd.js'
+
+# Предупреждение о CDN печатается один раз за процесс
+_cdn_warned = False
+
+
+def warn_cdn():
+    """
+    Печатает предупреждение, если локальной копии h3-js нет и страница будет зависеть от CDN.
+    Возвращает:
+        bool: True, если локальная копия есть
+    """
+    global _cdn_warned
+
+    if H3_JS_PATH.exists():
+        return True
+
+    if not _cdn_warned:
+        _cdn_warned = True
+        print(f'Нет {H3_JS_PATH}: страница с encoding=\'ids\' подключит h3-js с {H3_JS_URL} '
+              f'и без доступа к нему не покажет гексагоны. Локальная копия: curl -o {H3_JS_PATH} {H3_JS_URL}')
+    return False
+
+
+def encode_layer(hexagons, properties=None):
+    """
+    Кодирует ячейки и их свойства для встраивания в страницу.
+    Параметры:
+        hexagons (np.ndarray): H3 идентификаторы (uint64)
+        properties (dict): Свойства ячеек {название: числовой массив той же длины}
+    Возвращает:
+        str: Ячейки в порядке возрастания (encode_cells, base64)
+        dict: {название: значения float64 little-endian в том же порядке, base64}
+    """
+    hexagons = cells_to_uint64(hexagons)
+    order = np.argsort(hexagons, kind='stable')
+
+    cells = base64.b64encode(encode_cells(hexagons[order])).decode('ascii')
+    values = {
+        name: base64.b64encode(np.asarray(column, dtype='<f8')[order].tobytes()).decode('ascii')
+        for name, column in (properties or {}).items()
+    }
+    return cells, values
+
+
+class H3IdLayer(MacroElement):
+    """
+    Слой Leaflet с гексагонами по закодированным идентификаторам ячеек.
+    Добавляется в folium.FeatureGroup, как слой render_hexagons_geojson.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            function decode(text) {
+                return Uint8Array.from(atob(text), function(c) { return c.charCodeAt(0); });
+            }
+
+            // Разности varint: младшие 49 бит считаются в Number, старшие - в BigInt
+            var bytes = decode({{ this.cells|tojson }});
+            var cells = [];
+            var current = BigInt(0), low = 0, high = null, shift = 0;
+            for (var i = 0; i < bytes.length; i++) {
+                var part = bytes[i] & 0x7f;
+                if (shift < 49) {
+                    low += part * Math.pow(2, shift);
+                } else {
+                    high = (high === null ? BigInt(low) : high) + (BigInt(part) << BigInt(shift));
+                }
+                if (bytes[i] & 0x80) { shift += 7; continue; }
+                current += high === null ? BigInt(low) : high;
+                cells.push(current.toString(16));
+                low = 0; high = null; shift = 0;
+            }
+
+            var values = {{ this.values|tojson }};
+            var names = Object.keys(values);
+            var columns = names.map(function(name) { return new Float64Array(decode(values[name]).buffer); });
+
+            var features = cells.map(function(cell, i) {
+                var properties = {h3: cell};
+                names.forEach(function(name, j) { properties[name] = columns[j][i]; });
+                return {
+                    type: 'Feature',
+                    id: cell,
+                    geometry: {type: 'Polygon', coordinates: [h3.cellToBoundary(cell, true)]},
+                    properties: properties
+                };
+            });
+
+            L.geoJSON({type: 'FeatureCollection', features: features}, {style: {{ this.style|tojson }}})
+                .bindTooltip(function(item) {
+                    var properties = item.feature.properties;
+                    return ['H3: ' + properties.h3].concat(names.map(function(name) {
+                        return name + ': ' + properties[name];
+                    })).join('<br>');
+                }, {sticky: true})
+                .addTo({{ this._parent.get_name() }});
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, hexagons, properties=None, style=None):
+        """
+        Параметры:
+            hexagons (np.ndarray): H3 идентификаторы (uint64)
+            properties (dict): Свойства ячеек для подсказки {название: числовой массив той же длины}
+            style (dict): Стиль гексагонов Leaflet
+        """
+        super().__init__()
+        self._name = 'H3IdLayer'
+        self.cells, self.values = encode_layer(hexagons, properties)
+        self.style = style or {'color': 'grey', 'weight': 3, 'fill': False}
+        warn_cdn()
+
+    def render(self, **kwargs):
+        figure = self.get_root()
+        assert isinstance(figure, Figure), 'You cannot render this Element if it is not in a Figure.'
+
+        # Один экземпляр h3-js на страницу, даже если слоев несколько
+        if warn_cdn():
+            script = H3_JS_PATH.read_text(encoding='utf-8')
+            figure.header.add_child(Element(f'<script>{script}</script>'), name='h3_js')
+        else:
+            figure.header.add_child(JavascriptLink(H3_JS_URL), name='h3_js')
+
+        super().render(**kwargs)
@@ -0,0 +1,470 @@
+#!python 3.13
+# Инкрементальное обновление при новом снимке OSM. Новый ответ Overpass сравнивается с сохраненным
+# по (тип, id) и версии элемента (без out meta - по содержимому), изменения узлов переносятся
+# на линии и отношения, в которые они входят. Геометрии строятся только для изменившихся элементов
+# (старые и новые версии), признаки затронутых ячеек пересчитываются разностью вкладов:
+# признаки аддитивны, поэтому новая таблица = старая - вклад старых версий + вклад новых.
+# Покрытие пересчитывается только в области, где старая и новая граница расходятся,
+# а тайлы перезаписываются только для родительских ячеек с изменившимся покрытием.
+#
+# Пример:
+#     python incremental.py Краснодар --res 9 --snapshot overpass.json --tiles maps/Краснодар_tiles
+
+import argparse
+import json
+from collections import defaultdict
+from pathlib import Path
+
+import h3  # Работа с H3-геоидами
+import h3.api.numpy_int as h3_int  # H3 с идентификаторами uint64
+import numpy as np
+
+from hex_index import cells_to_uint64, hex_index_contains, latlng_to_cells
+from hex_table import HexTable
+from main import geojson_to_polygons, polygons_to_shapely
+from poi_features import FEATURE_TAGS, extract_features, merge_tags
+
+# Папка с сохраненными снимками Overpass по умолчанию
+SNAPSHOT_DIR = 'snapshots'
+
+
+def snapshot_path(city_name, res, root=SNAPSHOT_DIR):
+    """
+    Путь к снимку объектов OSM, по которому построена таблица признаков города уровня res.
+    Параметры:
+        city_name (str): Название города на русском языке
+        res (int): Уровень детализации таблицы
+        root (str): Папка со снимками
+    Возвращает:
+        Path: Путь к файлу .json
+    """
+    return Path(root) / f'{city_name}_{res}.json'
+
+
+def boundary_snapshot_path(city_name, res, root=SNAPSHOT_DIR):
+    """
+    Путь к границе города, по которой построено покрытие таблицы уровня res.
+    Параметры:
+        city_name (str): Название города на русском языке
+        res (int): Уровень детализации таблицы
+        root (str): Папка со снимками
+    Возвращает:
+        Path: Путь к файлу .json
+    """
+    return Path(root) / f'{city_name}_{res}_boundary.json'
+
+
+def snapshot_timestamp(response):
+    """
+    Момент состояния базы OSM, на который получен ответ Overpass.
+    Параметры:
+        response (dict): Ответ Overpass JSON
+    Возвращает:
+        str | None: Время в формате ISO 8601 (osm3s.timestamp_osm_base)
+    """
+    return response.get('osm3s', {}).get('timestamp_osm_base')
+
+
+def index_elements(response):
+    """
+    Индексирует элементы ответа Overpass.
+    Параметры:
+        response (dict): Ответ Overpass JSON
+    Возвращает:
+        dict: {(тип, id): элемент}
+    """
+    return {(element['type'], element['id']): element for element in response.get('elements', [])}
+
+
+def element_children(element):
+    """
+    Элементы, из которых строится геометрия элемента.
+    Параметры:
+        element (dict): Элемент Overpass JSON
+    Возвращает:
+        list: Ключи (тип, id) узлов линии или участников отношения
+    """
+    if element['type'] == 'way':
+        return [('node', node) for node in element.get('nodes', [])]
+    if element['type'] == 'relation':
+        return [(member['type'], member['ref']) for member in element.get('members', [])]
+    return []
+
+
+def diff_snapshots(old_index, new_index):
+    """
+    Сравнивает два снимка по (тип, id) и версии. Если версий нет (запрос без out meta),
+    элементы сравниваются по содержимому.
+    Параметры:
+        old_index (dict): Старый снимок index_elements
+        new_index (dict): Новый снимок index_elements
+    Возвращает:
+        dict: {'added', 'removed', 'modified': множества ключей (тип, id)}
+    """
+    modified = set()
+    for key in old_index.keys() & new_index.keys():
+        old, new = old_index[key], new_index[key]
+        if 'version' in old and 'version' in new:
+            if old['version'] != new['version']:
+                modified.add(key)
+        elif old != new:
+            modified.add(key)
+
+    return {
+        'added': new_index.keys() - old_index.keys(),
+        'removed': old_index.keys() - new_index.keys(),
+        'modified': modified,
+    }
+
+
+def affected_elements(old_index, new_index, diff):
+    """
+    Изменившиеся элементы вместе с линиями и отношениями, геометрия которых зависит от них
+    (сдвинутый узел меняет контур здания, не меняя версию самого здания).
+    Параметры:
+        old_index (dict): Старый снимок index_elements
+        new_index (dict): Новый снимок index_elements
+        diff (dict): Результат diff_snapshots
+    Возвращает:
+        set: Ключи (тип, id)
+    """
+    parents = defaultdict(set)
+    for index in (old_index, new_index):
+        for key, element in index.items():
+            for child in element_children(element):
+                parents[child].add(key)
+
+    affected = set()
+    stack = [*diff['added'], *diff['removed'], *diff['modified']]
+    while stack:
+        key = stack.pop()
+        if key in affected:
+            continue
+        affected.add(key)
+        stack.extend(parents.get(key, ()))
+
+    return affected
+
+
+def subset_response(index, keys):
+    """
+    Ответ Overpass только с заданными элементами и элементами, нужными для их геометрии.
+    Параметры:
+        index (dict): Снимок index_elements
+        keys (iterable): Ключи (тип, id); отсутствующие в снимке пропускаются
+    Возвращает:
+        dict: Ответ Overpass JSON
+    """
+    selected = {}
+    stack = [key for key in keys if key in index]
+    while stack:
+        key = stack.pop()
+        if key in selected:
+            continue
+        selected[key] = index[key]
+        stack.extend(child for child in element_children(index[key]) if child in index)
+
+    return {'elements': list(selected.values())}
+
+
+def elements_in_bbox(index, bbox):
+    """
+    Элементы, рамка которых пересекает заданную (узлы, линии и отношения первого уровня).
+    Параметры:
+        index (dict): Снимок index_elements
+        bbox (tuple): Рамка (юг, запад, север, восток)
+    Возвращает:
+        list: Ключи (тип, id)
+    """
+    south, west, north, east = bbox
+    boxes = {}
+    for kind in ('node', 'way', 'relation'):
+        for key, element in index.items():
+            if element['type'] != kind:
+                continue
+            if kind == 'node':
+                boxes[key] = (element['lat'], element['lon'], element['lat'], element['lon'])
+                continue
+            parts = [boxes[child] for child in element_children(element) if child in boxes]
+            if parts:
+                parts = np.asarray(parts)
+                boxes[key] = (*parts[:, :2].min(axis=0), *parts[:, 2:].max(axis=0))
+
+    return [
+        key for key, box in boxes.items()
+        if box[0] <= north and box[2] >= south and box[1] <= east and box[3] >= west
+    ]
+
+
+def snapshot_features(response, tag_sets=FEATURE_TAGS):
+    """
+    Объекты OSM снимка, как в load_cached_features (без отбора по полигону: объекты вне покрытия
+    отбрасывает extract_features).
+    Параметры:
+        response (dict): Ответ Overpass JSON
+        tag_sets (dict): {признак: теги OSMnx}
+    Возвращает:
+        GeoDataFrame: Объекты OSM (пустой, если подходящих нет)
+    """
+    from shapely.geometry import Polygon  # Работа с геометрией
+
+    from overpass_async import response_to_gdf
+
+    # OSMnx переписывает словари элементов при разборе, а снимок еще нужен для сравнения и сохранения
+    response = {'elements': [dict(element) for element in response.get('elements', [])]}
+    return response_to_gdf(response, Polygon(), merge_tags(tag_sets))
+
+
+def feature_cells(features, res):
+    """
+    Ячейки, в которые объекты могут дать вклад в extract_features: для точек и линий - ячейка
+    репрезентативной точки, для полигонов - все ячейки, рамка которых пересекает полигон.
+    Параметры:
+        features (GeoDataFrame): Объекты OSM
+        res (int): Уровень детализации H3
+    Возвращает:
+        np.ndarray: Отсортированные ячейки (uint64)
+    """
+    import shapely
+
+    if len(features) == 0:
+        return np.empty(0, dtype=np.uint64)
+
+    geometries = features.geometry.to_numpy()
+    is_polygon = np.isin(shapely.get_type_id(geometries), [3, 6])  # Polygon, MultiPolygon
+
+    points = shapely.get_coordinates(shapely.point_on_surface(geometries[~is_polygon]))
+    cells = [latlng_to_cells(points[:, 1], points[:, 0], res)]
+    for geometry in geometries[is_polygon]:
+        cells.append(h3_int.h3shape_to_cells_experimental(
+            h3.geo_to_h3shape(geometry), res, contain='bbox_overlap'
+        ).astype(np.uint64))
+
+    return np.unique(np.concatenate(cells))
+
+
+def update_coverage(hexagons, old_geoJson, new_geoJson, res):
+    """
+    Пересчитывает покрытие только там, где старая и новая граница расходятся.
+    Ячейка входит в покрытие, если ее центр внутри границы (как в polyfill), поэтому
+    проверяются лишь ячейки, задевающие симметрическую разность границ.
+    Параметры:
+        hexagons (np.ndarray): Отсортированное покрытие старой границы (uint64)
+        old_geoJson (dict): Старая граница в порядке (lat, lng)
+        new_geoJson (dict): Новая граница в порядке (lat, lng)
+        res (int): Уровень детализации H3
+    Возвращает:
+        np.ndarray: Новое покрытие (uint64, отсортировано)
+        np.ndarray: Добавленные ячейки
+        np.ndarray: Удаленные ячейки
+    """
+    import shapely
+
+    hexagons = cells_to_uint64(hexagons)
+    empty = np.empty(0, dtype=np.uint64)
+    old = polygons_to_shapely(geojson_to_polygons(old_geoJson))
+    new = polygons_to_shapely(geojson_to_polygons(new_geoJson))
+
+    try:
+        parts = shapely.get_parts(shapely.symmetric_difference(old, new))
+    except shapely.errors.GEOSException:
+        # Самопересечения в границе OSM ломают разность - покрытие заполняется заново
+        from main import polyfill
+
+        new_hexagons = polyfill(new_geoJson, res)
+        added = new_hexagons[~hex_index_contains(hexagons, new_hexagons)]
+        return new_hexagons, added, hexagons[~hex_index_contains(new_hexagons, hexagons)]
+
+    parts = parts[shapely.get_type_id(parts) == 3]  # Только Polygon, без вырожденных остатков
+    if len(parts) == 0:
+        return hexagons, empty, empty
+
+    candidates = np.unique(np.concatenate([
+        h3_int.h3shape_to_cells_experimental(h3.geo_to_h3shape(part), res, contain='overlap').astype(np.uint64)
+        for part in parts
+    ]))
+    centers = np.array([h3_int.cell_to_latlng(cell) for cell in candidates.tolist()]).reshape(-1, 2)
+
+    shapely.prepare(new)
+    inside = shapely.contains_xy(new, centers[:, 1], centers[:, 0])
+    current = hex_index_contains(hexagons, candidates)
+
+    added, removed = candidates[inside & ~current], candidates[~inside & current]
+    hexagons = np.union1d(hexagons[~hex_index_contains(removed, hexagons)], added)
+    return hexagons, added, removed
+
+
+def features_delta(old_index, new_index, keys, cells, tag_sets=FEATURE_TAGS):
+    """
+    Изменение признаков ячеек от изменившихся элементов: вклад новых версий минус вклад старых.
+    Параметры:
+        old_index (dict): Старый снимок index_elements
+        new_index (dict): Новый снимок index_elements
+        keys (set): Изменившиеся элементы affected_elements
+        cells (np.ndarray): Отсортированные ячейки покрытия (uint64)
+        tag_sets (dict): {признак: теги OSMnx}
+    Возвращает:
+        pd.DataFrame: Затронутые ячейки (cell, h3) и разности признаков
+    """
+    res = int(h3_int.get_resolution(cells[0])) if len(cells) else 0
+    old_features = snapshot_features(subset_response(old_index, keys), tag_sets)
+    new_features = snapshot_features(subset_response(new_index, keys), tag_sets)
+
+    affected = np.union1d(feature_cells(old_features, res), feature_cells(new_features, res))
+    affected = affected[hex_index_contains(cells, affected)]
+
+    frame = extract_features(new_features, affected, tag_sets)
+    old_frame = extract_features(old_features, affected, tag_sets)
+    names = [name for name in frame.columns if name not in ('cell', 'h3')]
+    frame[names] -= old_frame[names]
+    return frame
+
+
+def incremental_update(table, old_response, new_response, old_geoJson=None, new_geoJson=None,
+                       tag_sets=FEATURE_TAGS):
+    """
+    Обновляет таблицу признаков (extract_features) под новый снимок и новую границу.
+    Параметры:
+        table (HexTable): Таблица признаков по старому снимку (ячейки - покрытие города)
+        old_response (dict): Старый ответ Overpass JSON
+        new_response (dict): Новый ответ Overpass JSON
+        old_geoJson (dict): Граница, по которой построено покрытие (None - граница не менялась)
+        new_geoJson (dict): Новая граница
+        tag_sets (dict): {признак: теги OSMnx}
+    Возвращает:
+        HexTable: Новая таблица
+        dict: Изменения: elements - число пересчитанных элементов, cells - ячейки с пересчитанными
+            признаками, added/removed - ячейки, добавленные в покрытие и удаленные из него
+    """
+    old_index, new_index = index_elements(old_response), index_elements(new_response)
+    res = table.resolution()
+    empty = np.empty(0, dtype=np.uint64)
+    added, removed = empty, empty
+
+    if old_geoJson is not None and new_geoJson is not None and old_geoJson != new_geoJson:
+        hexagons, added, removed = update_coverage(table.cells, old_geoJson, new_geoJson, res)
+        table = table.filter(~hex_index_contains(removed, table.cells))
+
+        if len(added):
+            # Новые ячейки считаются целиком по новому снимку, но только по объектам в их рамке
+            latlng = np.array([h3_int.cell_to_latlng(cell) for cell in added.tolist()])
+            margin = 2 * h3.average_hexagon_edge_length(res, unit='km') / 111.32
+            bbox = (*(latlng.min(axis=0) - margin), *(latlng.max(axis=0) + margin))
+            nearby = snapshot_features(subset_response(new_index, elements_in_bbox(new_index, bbox)), tag_sets)
+            extra = HexTable.from_frame(extract_features(nearby, added, tag_sets))
+            columns = {
+                name: np.concatenate([values, extra[name] if name in extra else np.full(len(extra), np.nan)])
+                for name, values in table.columns.items()
+            }
+            table = HexTable(np.concatenate([table.cells, extra.cells]), columns)
+
+    keys = affected_elements(old_index, new_index, diff_snapshots(old_index, new_index))
+    # Добавленные ячейки уже посчитаны по новому снимку целиком
+    cells = table.cells[~hex_index_contains(added, table.cells)]
+    delta = features_delta(old_index, new_index, keys, cells, tag_sets)
+
+    positions = np.searchsorted(table.cells, delta['cell'].to_numpy())
+    for name in delta.columns:
+        if name in ('cell', 'h3') or name not in table:
+            continue
+        values = table[name].astype(np.float64)
+        values[positions] += delta[name].to_numpy()
+        # Погрешность вычитания долей не должна давать отрицательных количеств
+        values[positions] = np.maximum(values[positions], 0)
+        table.add_column(name, values)
+
+    changes = {'elements': len(keys), 'cells': delta['cell'].to_numpy(), 'added': added, 'removed': removed}
+    return table, changes
+
+
+def write_json(path, data):
+    """
+    Записывает JSON через временный файл.
+    Параметры:
+        path (Path): Путь к файлу
+        data: Данные
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp.json')
+    tmp_path.write_text(json.dumps(data, ensure_ascii=False, separators=(',', ':')), encoding='utf-8')
+    tmp_path.replace(path)
+
+
+def main():
+    import asyncio
+
+    from boundary_store import BoundaryStore
+    from hex_table import hex_table_path
+    from main import boundary_to_geojson, get_city_boundary, polyfill
+    from overpass_async import OverpassClient, polygon_bbox
+    from polyfill_cache import PolyfillCache
+    from tiles import export_tiles, update_tiles
+
+    parser = argparse.ArgumentParser(description='Инкрементальное обновление признаков OSM по новому снимку')
+    parser.add_argument('city', help='Название города на русском языке')
+    parser.add_argument('--res', type=int, default=9, help='Уровень детализации H3')
+    parser.add_argument('--snapshot', help='Новый ответ Overpass JSON (по умолчанию - запрос к Overpass)')
+    parser.add_argument('--tiles', help='Папка тайлов tiles.py для обновления')
+    parser.add_argument('--offline', action='store_true', help='Брать границы только из хранилища')
+    args = parser.parse_args()
+
+    city_gdf = get_city_boundary(args.city, store=BoundaryStore(), offline=args.offline)
+    if city_gdf.empty:
+        print(f'{args.city}: границы не найдены')
+        return
+    geoJson = boundary_to_geojson(city_gdf)
+
+    if args.snapshot:
+        new_response = json.loads(Path(args.snapshot).read_text(encoding='utf-8'))
+    elif args.offline:
+        print(f'{args.city}: без сети нужен снимок --snapshot')
+        return
+    else:
+        client = OverpassClient()
+        try:
+            bbox = polygon_bbox(city_gdf.union_all())
+            new_response = asyncio.run(client.fetch_bbox(bbox, merge_tags(FEATURE_TAGS)))
+        finally:
+            client.close()
+
+    table_path = hex_table_path(args.city, args.res)
+    old_path, boundary_path = snapshot_path(args.city, args.res), boundary_snapshot_path(args.city, args.res)
+
+    if table_path.exists() and old_path.exists() and boundary_path.exists():
+        old_response = json.loads(old_path.read_text(encoding='utf-8'))
+        if snapshot_timestamp(old_response) == snapshot_timestamp(new_response) and old_response == new_response:
+            print(f'{args.city}: снимок {snapshot_timestamp(new_response)} не изменился')
+            return
+
+        old_geoJson = json.loads(boundary_path.read_text(encoding='utf-8'))
+        table, changes = incremental_update(
+            HexTable.load(table_path), old_response, new_response, old_geoJson, geoJson
+        )
+        if args.tiles:
+            update_tiles(table.cells, np.concatenate([changes['added'], changes['removed']]), args.tiles)
+
+        print(
+            f"{args.city}, res={args.res}: {snapshot_timestamp(old_response)} -> {snapshot_timestamp(new_response)}, "
+            f"{changes['elements']} элементов, {len(changes['cells'])} ячеек пересчитано, "
+            f"+{len(changes['added'])}/-{len(changes['removed'])} ячеек покрытия"
+        )
+    else:
+        hexagons = polyfill(geoJson, res=args.res, cache=PolyfillCache())
+        table = HexTable.from_frame(extract_features(snapshot_features(new_response), hexagons))
+        if table_path.exists():
+            # Остальные столбцы существующей таблицы (население и т.п.) сохраняются
+            existing = HexTable.load(table_path)
+            for name in existing.names:
+                if name not in table:
+                    table.add_column(name, existing[name], cells=existing.cells)
+        if args.tiles:
+            export_tiles(table.cells, args.tiles)
+        print(f'{args.city}, res={args.res}: полный расчет по снимку {snapshot_timestamp(new_response)}')
+
+    table.save(table_path)
+    write_json(old_path, new_response)
+    write_json(boundary_path, geoJson)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,60 @@
 #!python 3.13 
 # python3.13 (Linux) виртуальная среда venv, если python3.11.5 (MacOS) виртуальная среда conda activate //anaconda3/envs/condageoenv
 
-import geopandas as gpd  # Работа с геоданными
-import pandas as pd
+# Тяжелые библиотеки (geopandas, osmnx, folium, shapely) импортируются внутри функций этапов,
+# поэтому заполнение по сохраненной границе (hexonly.py) запускается только с h3 и NumPy
+
 import numpy as np
-import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 import h3  # Работа с H3-геоидами
-import folium  # Визуализация на карте
-import osmnx as ox  # Загрузка данных OpenStreetMap
-from shapely import wkt
-from folium.plugins import HeatMap
-from shapely.geometry import Polygon  # Работа с геометрией
+import h3.api.numpy_int as h3_int  # H3 с идентификаторами uint64
+
+from boundary_store import BoundaryStore, boundary_to_geojson, filter_city_boundary, load_cached_boundary
+from hex_index import (
+    cells_resolution, cells_to_str, cells_to_uint64, compact, hex_index_contains, hex_index_path, latlng_to_cells,
+    save_hex_index
+)
+from polyfill_cache import PolyfillCache, geometry_hash
+from profiling import RUN_REPORT, RunProfiler
 
 # Настройки OSMnx для кеширования запросов
 # ox.settings.use_cache = True
 # ox.settings.log_console = True
 
-def get_city_boundary(city_name):
+# Примерное число ячеек в одном тайле при параллельном заполнении полигона
+TILE_CELLS = 50_000
+
+# Допуск упрощения границы перед заполнением в долях среднего ребра ячейки
+SIMPLIFY_RATIO = 0.25
+
+def get_city_boundary(city_name, admin_level='6', store=None, offline=False):
     """
     Получает административные границы города из OSM.
     Параметры:
         city_name (str): Название города на русском языке
+        admin_level (str): Уровень административного деления OSM
+        store (BoundaryStore): Локальное хранилище границ (None - без хранилища)
+        offline (bool): Не обращаться к сети, брать границы из хранилища или cache/
     Возвращает:
         GeoDataFrame: Геоданные с границами города
     """
+    import geopandas as gpd  # Работа с геоданными
+    import osmnx as ox  # Загрузка данных OpenStreetMap
+
     try:
+        # Сначала ищем в локальном хранилище
+        if store is not None:
+            cached = store.get(city_name, admin_level)
+            if cached is not None:
+                return cached
+
+        if offline:
+            # Восстанавливаем из сохраненных ответов Overpass
+            if store is not None:
+                return store.import_cached(city_name, admin_level)
+            return load_cached_boundary(city_name, admin_level)
+
         # Загружаем данные административных границ
         gdf = ox.features_from_place(
             f'{city_name}, Россия',
@@ -32,13 +62,12 @@ def get_city_boundary(city_name):
         )
 
         # Фильтруем городской округ
-        filtered = gdf[
-            (gdf['name'].str.contains(city_name, na=False)) & # Проверяем наличие названия города
-            (gdf['admin_level'] == '6')  # Уровень для городов федерального значения
-        ]
+        filtered = filter_city_boundary(gdf, city_name, admin_level)
 
         if not filtered.empty: # Если данные не пустые
-            return filtered.reset_index() # Возвращаем GeoDataFrame 
+            if store is not None:
+                store.put(city_name, admin_level, filtered)
+            return filtered # Возвращаем GeoDataFrame 
 
         # Геокодирование
         # return ox.geocode_to_gdf(f'{city_name}, Россия', which_result=1) 
@@ -57,6 +86,8 @@ def visualize_city_boundary(city_gpf):
     Возвращает:
         folium.Map: Карта с отрисованными границами
     """
+    import folium  # Визуализация на карте
+
     if city_gpf.empty:
         print("Нет данных для визуализации")
         return folium.Map(location=[55.751244, 37.618423], zoom_start=10)  # Москва по умолчанию
@@ -93,41 +124,363 @@ def visualize_city_boundary(city_gpf):
     return map_city
 
 
-def create_hexagons(geoJson, base_map):
+def geojson_to_polygons(geoJson):
     """
-    Генерация H3-гексагона внутри заданного полигона и визуализация их на карте.
+    Раскладывает Polygon/MultiPolygon на список полигонов с замкнутыми кольцами.
     Параметры:
-        geoJson (dict): GeoJSON с полигоном
+        geoJson (dict): GeoJSON с полигоном или мультиполигоном в порядке (lat, lng)
     Возвращает:
-        folium.Map: Карта с визуализированными гексагонами
-        hexagons (list): Список H3 идентификаторов
+        list: Полигоны в виде [внешнее кольцо, *внутренние кольца]
     """
-    # Проверяем, является ли geoJson корректным полигоном
-    if geoJson['type'] != 'Polygon':
-        raise ValueError("GeoJSON must be of type 'Polygon'")
+    if geoJson['type'] == 'Polygon':
+        polygons = [geoJson['coordinates']]
+    elif geoJson['type'] == 'MultiPolygon':
+        polygons = geoJson['coordinates']
+    else:
+        raise ValueError("GeoJSON must be of type 'Polygon' or 'MultiPolygon'")
+
+    closed = []
+    for rings in polygons:
+        # Убедимся, что каждое кольцо замкнуто
+        closed.append([
+            list(ring) if list(ring[0]) == list(ring[-1]) else list(ring) + [ring[0]]
+            for ring in rings
+        ])
+
+    return closed
+
 
-    # Извлекаем координаты полигона
-    coordinates = geoJson['coordinates'][0]
+def estimate_cell_count(rings, res):
+    """
+    Оценивает число ячеек H3 внутри полигона по его площади.
+    Параметры:
+        rings (list): [внешнее кольцо, *внутренние кольца] в порядке (lat, lng)
+        res (int): Уровень детализации H3
+    Возвращает:
+        float: Ожидаемое количество ячеек
+    """
+    from shapely.geometry import Polygon  # Работа с геометрией
 
-    # Убедимся, что полигон замкнут
-    if coordinates[0] != coordinates[-1]:
-        coordinates.append(coordinates[0])
+    polygon = Polygon(rings[0], rings[1:])
+    lat = polygon.centroid.x
+    # Градусы в км²: 111.32 км на градус широты, долгота сжимается по cos(lat)
+    area_km2 = polygon.area * 111.32 ** 2 * np.cos(np.radians(lat))
+    return area_km2 / h3.average_hexagon_area(res, unit='km^2')
 
-    # Создаем объект LatLngPoly
-    lat_lng_poly = h3.LatLngPoly(coordinates)
 
-    # Генерация H3-гексагона
-    hexagons = h3.h3shape_to_cells(lat_lng_poly, res=8)  # Уровень детализации 10
+def split_polygon(rings, res, tile_cells=TILE_CELLS):
+    """
+    Разрезает полигон на прямоугольные тайлы примерно по tile_cells ячеек в каждом.
+    Параметры:
+        rings (list): [внешнее кольцо, *внутренние кольца] в порядке (lat, lng)
+        res (int): Уровень детализации H3
+        tile_cells (int): Целевое число ячеек на тайл
+    Возвращает:
+        list: Полигоны тайлов в виде [внешнее кольцо, *внутренние кольца]
+    """
+    from shapely import clip_by_rect
+    from shapely.geometry import Polygon  # Работа с геометрией
 
-    # Визуализируем гексагоны
+    tiles_count = int(np.ceil(estimate_cell_count(rings, res) / tile_cells))
+    if tiles_count <= 1:
+        return [rings]
+
+    polygon = Polygon(rings[0], rings[1:])
+    min_lat, min_lng, max_lat, max_lng = polygon.bounds
+
+    # Сетка nx * ny, близкая к квадратной в пересчете на градусы
+    side = int(np.ceil(np.sqrt(tiles_count)))
+    lat_edges = np.linspace(min_lat, max_lat, side + 1)
+    lng_edges = np.linspace(min_lng, max_lng, side + 1)
+
+    tiles = []
+    for i in range(side):
+        for j in range(side):
+            piece = clip_by_rect(polygon, lat_edges[i], lng_edges[j], lat_edges[i + 1], lng_edges[j + 1])
+            for part in getattr(piece, 'geoms', [piece]):
+                if part.geom_type == 'Polygon' and not part.is_empty:
+                    tiles.append(
+                        [list(part.exterior.coords)] + [list(hole.coords) for hole in part.interiors]
+                    )
+
+    return tiles
+
+
+def polygons_to_shapely(polygons):
+    """
+    Собирает полигоны H3 в MultiPolygon shapely в порядке (lng, lat).
+    Параметры:
+        polygons (list): Полигоны в виде [внешнее кольцо, *внутренние кольца] в порядке (lat, lng)
+    Возвращает:
+        shapely.MultiPolygon: Граница в координатах (lng, lat)
+    """
+    import shapely
+    from shapely.geometry import Polygon  # Работа с геометрией
+
+    return shapely.multipolygons([
+        Polygon(np.asarray(rings[0])[:, ::-1], [np.asarray(ring)[:, ::-1] for ring in rings[1:]])
+        for rings in polygons
+    ])
+
+
+def simplify_tolerance(res, ratio=SIMPLIFY_RATIO):
+    """
+    Допуск упрощения границы для уровня детализации.
+    Параметры:
+        res (int): Уровень детализации H3
+        ratio (float): Доля среднего ребра ячейки
+    Возвращает:
+        float: Допуск в градусах
+    """
+    return ratio * h3.average_hexagon_edge_length(res, unit='km') / 111.32
+
+
+def polyfill_simplified(polygons, res, ratio=SIMPLIFY_RATIO):
+    """
+    Заполняет полигоны по упрощенной границе с тем же результатом, что и по исходной.
+    Упрощение с сохранением топологии сдвигает границу не больше чем на допуск, поэтому
+    центр ячейки дальше допуска от упрощенной границы лежит по ту же сторону и от исходной.
+    Центры ближе допуска (полоса вдоль границы) проверяются точно по исходной границе.
+    Параметры:
+        polygons (list): Полигоны в виде [внешнее кольцо, *внутренние кольца] в порядке (lat, lng)
+        res (int): Уровень детализации H3
+        ratio (float): Допуск упрощения в долях среднего ребра ячейки
+    Возвращает:
+        np.ndarray: Отсортированные H3 идентификаторы (uint64)
+    """
+    import shapely
+
+    boundary = polygons_to_shapely(polygons)
+    tolerance = simplify_tolerance(res, ratio)
+    simplified = shapely.simplify(boundary, tolerance, preserve_topology=True)
+
+    if shapely.get_num_coordinates(simplified) == shapely.get_num_coordinates(boundary):
+        # Упрощать нечего - заполняем исходную границу
+        return np.unique(h3_int.h3shape_to_cells(
+            h3.LatLngMultiPoly(*[h3.LatLngPoly(rings[0], *rings[1:]) for rings in polygons]), res=res
+        ))
+
+    hexagons = np.unique(h3_int.h3shape_to_cells(h3.geo_to_h3shape(simplified), res=res))
+
+    # Кандидаты в полосу - ячейки точек упрощенной границы (чаще половины ребра) и их соседи
+    step = h3.average_hexagon_edge_length(res, unit='km') / 2 / 111.32
+    edge = shapely.boundary(simplified)
+    points = shapely.get_coordinates(shapely.segmentize(edge, step))
+    crossed = np.unique(latlng_to_cells(points[:, 1], points[:, 0], res))
+    candidates = np.unique(np.concatenate([h3_int.grid_disk(cell, 1) for cell in crossed.tolist()]))
+
+    centers = np.array([h3_int.cell_to_latlng(cell) for cell in candidates.tolist()]).reshape(-1, 2)
+    shapely.prepare(edge)
+    # Запас 1.1 на погрешность вычислений с плавающей точкой
+    near = shapely.dwithin(edge, shapely.points(centers[:, 1], centers[:, 0]), 1.1 * tolerance)
+    band = candidates[near]
+
+    shapely.prepare(boundary)
+    inside = shapely.contains_xy(boundary, centers[near, 1], centers[near, 0])
+
+    hexagons = hexagons[~hex_index_contains(band, hexagons)]
+    return np.union1d(hexagons, band[inside])
+
+
+def polyfill_polygon(rings, res, simplify=True):
+    """
+    Заполняет ячейками H3 один полигон с дырами. Вызывается в процессах пула.
+    Параметры:
+        rings (list): [внешнее кольцо, *внутренние кольца] в порядке (lat, lng)
+        res (int): Уровень детализации H3
+        simplify (bool): Заполнять через упрощенную границу (см. polyfill_simplified)
+    Возвращает:
+        np.ndarray: H3 идентификаторы (uint64)
+    """
+    if simplify:
+        return polyfill_simplified([rings], res)
+    return h3_int.h3shape_to_cells(h3.LatLngPoly(rings[0], *rings[1:]), res=res)
+
+
+def polyfill(geoJson, res, workers=None, cache=None, simplify=True):
+    """
+    Заполняет Polygon/MultiPolygon ячейками H3. Крупные части режутся на тайлы,
+    которые обрабатываются в пуле процессов, результат очищается от дублей.
+    Параметры:
+        geoJson (dict): GeoJSON с полигоном или мультиполигоном в порядке (lat, lng)
+        res (int): Уровень детализации H3
+        workers (int): Число процессов (по умолчанию все ядра, 1 - без пула)
+        cache (PolyfillCache): Кеш заполнения на диске (None - без кеша)
+        simplify (bool): Заполнять через упрощенную границу с проверкой полосы вдоль нее
+            (результат тот же, но нужен shapely; см. polyfill_simplified)
+    Возвращает:
+        np.ndarray: Отсортированные H3 идентификаторы (uint64)
+    """
+    polygons = geojson_to_polygons(geoJson)
+
+    if cache is not None:
+        geom_hash = geometry_hash(polygons)
+        hexagons = cache.get(geom_hash, res)
+        if hexagons is None:
+            hexagons = polyfill(geoJson, res, workers=workers, simplify=simplify)
+            cache.put(geom_hash, res, hexagons)
+        return hexagons
+
+    workers = workers or os.cpu_count() or 1
+
+    # Без пула тайлы не нужны (и shapely не импортируется)
+    tiles = [tile for rings in polygons for tile in split_polygon(rings, res)] if workers > 1 else []
+
+    if workers == 1 or len(tiles) == 1:
+        if simplify:
+            return polyfill_simplified(polygons, res)
+        hexagons = h3_int.h3shape_to_cells(
+            h3.LatLngMultiPoly(*[h3.LatLngPoly(rings[0], *rings[1:]) for rings in polygons]), res=res
+        )
+        return np.unique(hexagons)
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(tiles))) as pool:
+        chunks = list(pool.map(polyfill_polygon, tiles, [res] * len(tiles), [simplify] * len(tiles)))
+
+    # Центр ячейки на общей границе тайлов может попасть в оба тайла
+    return np.unique(np.concatenate(chunks))
+
+
+def cells_to_boundary_array(hexagons):
+    """
+    Вычисляет границы всех гексагонов за один проход в предвыделенный массив NumPy.
+    Параметры:
+        hexagons (np.ndarray): H3 идентификаторы (uint64)
+    Возвращает:
+        np.ndarray: Массив (N, 11, 2) с координатами (lat, lng) замкнутых контуров
+        np.ndarray: Количество вершин каждого контура (без замыкающей точки)
+    """
+    # Гексагон имеет 6 вершин, пентагон 5, ячейки на гранях икосаэдра - до 10
+    boundaries = np.empty((len(hexagons), 11, 2), dtype=np.float64)
+    sizes = np.empty(len(hexagons), dtype=np.int8)
+
+    for i, hex_id in enumerate(hexagons.tolist()):
+        boundary = h3_int.cell_to_boundary(hex_id)
+        size = len(boundary)
+        boundaries[i, :size] = boundary
+        boundaries[i, size:] = boundary[0]  # Замыкаем контур
+        sizes[i] = size
+
+    return boundaries, sizes
+
+
+def hexagons_to_geojson(hexagons, properties=None):
+    """
+    Собирает все гексагоны в один GeoJSON FeatureCollection.
+    Параметры:
+        hexagons (np.ndarray): H3 идентификаторы (uint64)
+        properties (dict): Дополнительные свойства ячеек {название: массив той же длины}
+    Возвращает:
+        dict: FeatureCollection с полигоном и свойствами для каждой ячейки
+    """
+    hexagons = cells_to_uint64(hexagons)
+    boundaries, sizes = cells_to_boundary_array(hexagons)
+
+    # GeoJSON хранит координаты в порядке (lng, lat), переставляем столбцы сразу для всех ячеек
+    rings = np.round(boundaries[:, :, ::-1], 7).tolist()
+
+    hex_ids = cells_to_str(hexagons)
+    resolutions = cells_resolution(hexagons).tolist()
+    extra = {name: np.asarray(values).tolist() for name, values in (properties or {}).items()}
+
+    features = []
+    for i, (hex_id, res, ring, size) in enumerate(zip(hex_ids, resolutions, rings, sizes.tolist())):
+        feature_properties = {'h3': hex_id, 'res': res}
+        for name, values in extra.items():
+            feature_properties[name] = values[i]
+
+        features.append({
+            'type': 'Feature',
+            'id': hex_id,
+            'geometry': {'type': 'Polygon', 'coordinates': [ring[:size + 1]]},
+            'properties': feature_properties
+        })
+
+    return {'type': 'FeatureCollection', 'features': features}
 
-    # Создаем слой гексагонов
-    layer_hexagon = folium.FeatureGroup(name=f'Гексагоны', show=True)
-    layer_hexagon.add_to(base_map)
 
-    for hex_id in hexagons:
+def hexagons_to_polygons(hexagons):
+    """
+    Строит полигоны shapely для ячеек одним векторным вызовом.
+    Параметры:
+        hexagons (np.ndarray): H3 идентификаторы (uint64)
+    Возвращает:
+        np.ndarray: Массив shapely.Polygon в координатах (lng, lat)
+    """
+    import shapely
+
+    boundaries, _ = cells_to_boundary_array(hexagons)
+    # Контуры дополнены первой вершиной до 11 точек, повторы не меняют площадь
+    return shapely.polygons(np.ascontiguousarray(boundaries[:, :, ::-1]))
+
+
+def polyfill_exact(geoJson, res, workers=None, cache=None):
+    """
+    Точное покрытие: все ячейки, пересекающие полигон, с долей площади каждой ячейки внутри него.
+    Внутренние ячейки берутся из обычного заполнения по центрам (в т.ч. из кеша) и получают долю 1
+    без расчета геометрии. Кандидаты на край - ячейки, через которые проходит граница, и их соседи;
+    пересечение в shapely считается векторно только для них, поэтому затраты сверх заполнения
+    растут с длиной границы, а не с площадью.
+    Параметры:
+        geoJson (dict): GeoJSON с полигоном или мультиполигоном в порядке (lat, lng)
+        res (int): Уровень детализации H3
+        workers (int): Число процессов для заполнения по центрам
+        cache (PolyfillCache): Кеш заполнения по центрам (None - без кеша)
+    Возвращает:
+        np.ndarray: Отсортированные H3 идентификаторы (uint64)
+        np.ndarray: Доля площади ячейки внутри полигона (0, 1]
+        np.ndarray: Маска краевых ячеек - пересекаемых границей (bool)
+    """
+    import shapely
+
+    polygons = geojson_to_polygons(geoJson)
+    centers = polyfill(geoJson, res=res, workers=workers, cache=cache)
+
+    # Граница в порядке (lng, lat), как у полигонов ячеек
+    boundary = polygons_to_shapely(polygons)
+
+    # Точки на границе чаще половины ребра ячейки: каждая пересекаемая ячейка - среди
+    # ячеек этих точек или их соседей
+    step = h3.average_hexagon_edge_length(res, unit='km') / 2 / 111.32
+    points = shapely.get_coordinates(shapely.segmentize(shapely.boundary(boundary), step))
+    crossed = np.unique(latlng_to_cells(points[:, 1], points[:, 0], res))
+    candidates = np.unique(np.concatenate([h3_int.grid_disk(cell, 1) for cell in crossed.tolist()]))
+
+    candidate_polygons = hexagons_to_polygons(candidates)
+    shapely.prepare(boundary)
+    fractions = np.clip(
+        shapely.area(shapely.intersection(candidate_polygons, boundary)) / shapely.area(candidate_polygons), 0.0, 1.0
+    )
+
+    # Ячейки, которые только касаются границы, отбрасываются
+    inside = fractions > 0
+    candidates, fractions = candidates[inside], fractions[inside]
+    interior = centers[~hex_index_contains(candidates, centers)]
+
+    hexagons = np.concatenate([interior, candidates])
+    fractions = np.concatenate([np.ones(len(interior)), fractions])
+    order = np.argsort(hexagons)
+
+    return hexagons[order], fractions[order], fractions[order] < 1.0
+
+
+def render_hexagons_polylines(hexagons, layer_hexagon):
+    """
+    Отрисовывает гексагоны отдельными folium.PolyLine (по одному объекту на ячейку).
+    Медленный путь, оставлен для сравнения в benchmark.py.
+    Параметры:
+        hexagons (np.ndarray): H3 идентификаторы (uint64)
+        layer_hexagon (folium.FeatureGroup): Слой для добавления линий
+    Возвращает:
+        folium.PolyLine: Последняя добавленная линия
+    """
+    import folium  # Визуализация на карте
+
+    map_hexagon = None
+
+    for hex_id in cells_to_uint64(hexagons).tolist():
         # Получаем LatLngPoly для данного H3 идентификатора
-        polygon = h3.cells_to_h3shape([hex_id], tight=True)
+        polygon = h3_int.cells_to_h3shape([hex_id], tight=True)
 
         # Извлекаем координаты из объекта LatLngPoly
         outlines = polygon.outer if hasattr(polygon, 'outer') else []
@@ -138,40 +491,216 @@ def create_hexagons(geoJson, base_map):
         # Добавляем на карту
         map_hexagon = folium.PolyLine(locations=polyline, weight=3, color='grey').add_to(layer_hexagon)
 
-    
+    return map_hexagon
+
+
+def render_hexagons_geojson(hexagons, layer_hexagon, properties=None):
+    """
+    Отрисовывает все гексагоны одним слоем folium.GeoJson.
+    Параметры:
+        hexagons (np.ndarray): H3 идентификаторы (uint64)
+        layer_hexagon (folium.FeatureGroup): Слой для добавления гексагонов
+        properties (dict): Дополнительные свойства ячеек для подсказки {название: массив той же длины}
+    Возвращает:
+        folium.GeoJson: Слой с гексагонами
+    """
+    import folium  # Визуализация на карте
+
+    fields = ['h3', *(properties or {})]
+    aliases = ['H3:', *[f'{name}:' for name in properties or {}]]
+
+    return folium.GeoJson(
+        hexagons_to_geojson(hexagons, properties),
+        name='Гексагоны',
+        style_function=lambda x: {
+            'color': 'grey',  # Цвет границ
+            'weight': 3,  # Толщина границ
+            'fill': False  # Без заливки, как у PolyLine
+        },
+        tooltip=folium.GeoJsonTooltip(fields=fields, aliases=aliases)
+    ).add_to(layer_hexagon)
+
+
+def render_hexagons_ids(hexagons, layer_hexagon, properties=None):
+    """
+    Отрисовывает гексагоны слоем, в который встроены только идентификаторы ячеек;
+    контуры строятся в браузере через h3-js (см. id_layer.py). Без vendor/h3-js.umd.js страница
+    подключает h3-js с CDN, о чем печатается предупреждение.
+    Параметры:
+        hexagons (np.ndarray): H3 идентификаторы (uint64)
+        layer_hexagon (folium.FeatureGroup): Слой для добавления гексагонов
+        properties (dict): Числовые свойства ячеек для подсказки {название: массив той же длины}
+    Возвращает:
+        H3IdLayer: Слой с гексагонами
+    """
+    from id_layer import H3IdLayer
+
+    return H3IdLayer(hexagons, properties).add_to(layer_hexagon)
+
+
+def visualize_hex_metric(base_map, frame, column='count', name='Метрика по гексагонам', classes=9):
+    """
+    Добавляет на карту хороплет метрики по ячейкам (например, результат aggregation.aggregate_points).
+    Значения разбиваются на квантильные классы, поэтому стилей не больше classes.
+    Параметры:
+        base_map (folium.Map): Карта из visualize_city_boundary
+        frame (pd.DataFrame): Таблица со столбцами cell (uint64) и column
+        column (str): Отображаемая метрика
+        name (str): Имя слоя
+        classes (int): Число цветовых классов (не больше 9)
+    Возвращает:
+        folium.GeoJson: Слой хороплета
+    """
+    import folium  # Визуализация на карте
+
+    palette = ['#ffffcc', '#ffeda0', '#fed976', '#feb24c', '#fd8d3c', '#fc4e2a', '#e31a1c', '#bd0026', '#800026']
+    palette = palette[len(palette) - classes:]
+
+    values = frame[column].to_numpy(dtype=np.float64)
+    edges = np.unique(np.quantile(values, np.linspace(0, 1, classes + 1)[1:-1])) if len(values) else []
+    bins = np.searchsorted(edges, values, side='right')
+
+    layer = folium.FeatureGroup(name=name, show=True).add_to(base_map)
+    folium.GeoJson(
+        hexagons_to_geojson(frame['cell'].to_numpy(), {column: values, 'bin': bins}),
+        name=name,
+        style_function=lambda x: {
+            'fillColor': palette[x['properties']['bin']],  # Цвет класса
+            'fillOpacity': 0.6,
+            'color': 'grey',
+            'weight': 1
+        },
+        tooltip=folium.GeoJsonTooltip(fields=['h3', column], aliases=['H3:', f'{column}:'])
+    ).add_to(layer)
+
+    return layer
+
+
+def visualize_heatmap(base_map, frame, column='count', name='Тепловая карта'):
+    """
+    Добавляет на карту тепловую карту по центрам ячеек.
+    Параметры:
+        base_map (folium.Map): Карта из visualize_city_boundary
+        frame (pd.DataFrame): Таблица со столбцами cell (uint64) и column
+        column (str): Вес точки
+        name (str): Имя слоя
+    Возвращает:
+        HeatMap: Слой тепловой карты
+    """
+    from folium.plugins import HeatMap
+
+    centers = np.array([h3_int.cell_to_latlng(cell) for cell in frame['cell'].tolist()]).reshape(-1, 2)
+    weights = frame[column].to_numpy(dtype=np.float64)
+    weights = weights / weights.max() if len(weights) and weights.max() > 0 else weights
+
+    return HeatMap(
+        np.column_stack((centers, weights)).tolist(),
+        name=name,
+        radius=15
+    ).add_to(base_map)
+
+
+def create_hexagons(geoJson, base_map, res=8, batched=True, workers=None, coverage='flat', cache=None, simplify=True,
+                    encoding='coords'):
+    """
+    Генерация H3-гексагона внутри заданного полигона и визуализация их на карте.
+    Параметры:
+        geoJson (dict): GeoJSON с полигоном или мультиполигоном в порядке (lat, lng)
+        base_map (folium.Map): Карта для добавления слоя гексагонов
+        res (int): Уровень детализации H3
+        batched (bool): Отрисовать все ячейки одним GeoJSON-слоем вместо PolyLine на каждую
+        workers (int): Число процессов для заполнения крупных полигонов
+        coverage (str): 'flat' - все ячейки уровня res, 'compact' - сжатое покрытие
+            смешанных уровней (уровень res только вдоль границы, развернуть - hex_index.uncompact),
+            'exact' - все ячейки, пересекающие полигон, с долей площади внутри (см. polyfill_exact)
+        cache (PolyfillCache): Кеш заполнения на диске (None - без кеша)
+        simplify (bool): Заполнять через упрощенную границу (тот же набор ячеек, см. polyfill_simplified)
+        encoding (str): 'coords' - контуры ячеек в HTML, 'ids' - только идентификаторы,
+            контуры строит h3-js в браузере (см. render_hexagons_ids); без vendor/h3-js.umd.js
+            страница загружает h3-js с CDN unpkg.com и без доступа к нему гексагоны не строятся
+    Возвращает:
+        hexagons (np.ndarray): Отсортированные H3 идентификаторы (uint64)
+        folium.GeoJson | folium.PolyLine: Слой с визуализированными гексагонами
+        fractions (np.ndarray): Только для 'exact' - доля площади каждой ячейки внутри полигона
+        edge (np.ndarray): Только для 'exact' - маска краевых ячеек
+    """
+    import folium  # Визуализация на карте
+
+    if coverage == 'exact':
+        # Краевые ячейки учитываются с долей площади вместо отбора по центру
+        hexagons, fractions, edge = polyfill_exact(geoJson, res=res, workers=workers, cache=cache)
+    elif coverage in ('flat', 'compact'):
+        # Генерация H3-гексагона (Polygon/MultiPolygon с дырами)
+        hexagons = polyfill(geoJson, res=res, workers=workers, cache=cache, simplify=simplify)
+        if coverage == 'compact':
+            # Внутренние области заменяются крупными родительскими ячейками
+            hexagons = compact(hexagons)
+    else:
+        raise ValueError(f"Unknown coverage mode: {coverage}")
+
+    # Визуализируем гексагоны
+
+    # Создаем слой гексагонов
+    layer_hexagon = folium.FeatureGroup(name=f'Гексагоны', show=True)
+    layer_hexagon.add_to(base_map)
+
+    if encoding == 'ids':
+        render = render_hexagons_ids
+    elif encoding == 'coords':
+        render = render_hexagons_geojson
+    else:
+        raise ValueError(f"Unknown encoding: {encoding}")
+
+    if coverage == 'exact':
+        map_hexagon = render(hexagons, layer_hexagon, {'fraction': np.round(fractions, 4)})
+        return hexagons, map_hexagon, fractions, edge
+
+    # PolyLine на ячейку есть только для контуров в HTML
+    if batched or encoding == 'ids':
+        map_hexagon = render(hexagons, layer_hexagon)
+    else:
+        map_hexagon = render_hexagons_polylines(hexagons, layer_hexagon)
+
     return hexagons, map_hexagon
 
 if __name__ == "__main__":
+    import folium  # Визуализация на карте
+
+    # Замеры этапов пишутся в run_report.json, профили cProfile - в папку из PROFILE_DIR (если задана)
+    profiler = RunProfiler(profile_dir=os.environ.get('PROFILE_DIR'))
     try:
-        # 1. Загружаем границы Краснодара
-        krasnodar_gdf = get_city_boundary('Краснодар')
+        # 1. Загружаем границы Краснодара (из локального хранилища, если они уже скачаны)
+        boundary_store = BoundaryStore()
+        with profiler.stage('get_city_boundary'):
+            krasnodar_gdf = get_city_boundary('Краснодар', store=boundary_store)
 
         # 2. Визуализируем границы города
-        city_map = visualize_city_boundary(krasnodar_gdf)
+        with profiler.stage('visualize_city_boundary'):
+            city_map = visualize_city_boundary(krasnodar_gdf)
 
         # 5. Генерируем гексагоны внутри полигона Краснодара
-        geoJson = json.loads(gpd.GeoSeries(krasnodar_gdf['geometry']).to_json())
-        geoJson = geoJson['features'][0]['geometry']
-        geoJson = {
-            'type': 'Polygon',
-            'coordinates': [
-                np.column_stack((
-                    np.array(geoJson['coordinates'][0])[:, 1], 
-                    np.array(geoJson['coordinates'][0])[:, 0]
-                )).tolist()
-            ]
-        } # вместо [(X1, Y1), (X2, Y2), ...], переставляем столбцы с координатами и получаем [(Y1, X1), (Y2, X2), ...]
+        geoJson = boundary_to_geojson(krasnodar_gdf)
 
         # Вызов функции для создания гексагонов
-        create_hexagons(geoJson, city_map)
+        # Повторные запуски для той же границы берут гексагоны из кеша
+        polyfill_cache = PolyfillCache()
+        with profiler.stage('create_hexagons', res=8) as stage:
+            hexagons, _ = create_hexagons(geoJson, city_map, cache=polyfill_cache)
+            stage['cells'] = len(hexagons)
+
+        # Сохраняем индекс гексагонов (отсортированный uint64, открывается через memory-map)
+        save_hex_index(hex_index_path('Краснодар', 8), hexagons)
         
         # Кнопка управления слоями
         folium.LayerControl().add_to(city_map)
         
-        city_map.save("output_map.html")
+        with profiler.stage('save', cells=len(hexagons)):
+            city_map.save("output_map.html")
 
         print("Карта успешно сохранена")
+        print(f"Хранилище границ: {boundary_store.stats()}")
+        print(f"Кеш гексагонов: {polyfill_cache.stats()}")
     except Exception as e:
         print(f"Произошла ошибка: {e}")
-
-
+    finally:
+        print(f"Отчет о запуске: {profiler.save(RUN_REPORT)}")
@@ -184,13 +184,18 @@ import geopandas as gpd  # Работа с геоданными
 import pandas as pd
 import numpy as np
 import json
+import os
 import h3  # Работа с H3-геоидами
+import h3.api.numpy_int as h3_int  # H3 с идентификаторами uint64
 import folium  # Визуализация на карте
 import osmnx as ox  # Загрузка данных OpenStreetMap
 from shapely import wkt
 from folium.plugins import HeatMap
 from shapely.geometry import Polygon  # Работа с геометрией
 
+from hex_index import cells_to_str, cells_to_uint64
+from profiling import RUN_REPORT, RunProfiler
+
 # Настройки OSMnx для кеширования запросов
 ox.settings.use_cache = True
 ox.settings.log_console = True
@@ -201,21 +206,22 @@ def visualize_hexagons(hexagons, color="grey", folium_map=None):
     Визуализирует H3-гексагоны на карте Folium.
 
     Параметры:
-        hexagons (list): Список H3-идентификаторов
+        hexagons (np.ndarray): H3-идентификаторы (uint64 или список строк)
         color (str): Цвет границ гексагонов
         folium_map (folium.Map): Существующая карта для добавления слоя
 
     Возвращает:
         folium.Map: Объект карты с отрисованными гексагонами
     """
+    hexagons = cells_to_uint64(hexagons)
     polylines = []  # Список для хранения полигонов
     lat_coords = []  # Широты для расчета центра
     lng_coords = []  # Долготы для расчета центра
 
     # Обрабатываем каждый гексагон
-    for hex_id in hexagons:
+    for hex_id in hexagons.tolist():
         # Получаем границы гексагона
-        boundary = h3.cell_to_boundary(hex_id)
+        boundary = h3_int.cell_to_boundary(hex_id)
 
         # Преобразуем кортежи в списки
         boundary_coords = [list(coord) for coord in boundary]
@@ -246,7 +252,7 @@ def visualize_hexagons(hexagons, color="grey", folium_map=None):
         )
 
     # Добавляем полигоны на карту
-    for polygon in polylines:
+    for hex_id, polygon in zip(cells_to_str(hexagons), polylines):
         folium.PolyLine(
             locations=polygon,
             weight=3,  # Толщина линии
@@ -341,7 +347,7 @@ def create_hexagons(geoJson):
 
     Возвращает:
         folium.Map: Карта с визуализированными гексагонами
-        hexagons (list): Список H3 идентификаторов
+        hexagons (np.ndarray): H3 идентификаторы (uint64)
     """
     # Проверяем, является ли geoJson корректным полигоном
     if geoJson['type'] != 'Polygon':
@@ -358,16 +364,16 @@ def create_hexagons(geoJson):
     lat_lng_poly = h3.LatLngPoly(coordinates)
 
     # Генерация H3-гексагона
-    hexagons = h3.h3shape_to_cells(lat_lng_poly, res=10)  # Уровень детализации 10
+    hexagons = h3_int.h3shape_to_cells(lat_lng_poly, res=10)  # Уровень детализации 10
 
     # Создаем карту
     m = folium.Map(location=[np.mean([coord[1] for coord in coordinates]), np.mean([coord[0] for coord in coordinates])],
                       zoom_start=13, tiles='cartodbpositron')
 
     # Визуализируем каждый гексагон
-    for hex_id in hexagons:
+    for hex_id in hexagons.tolist():
         # Получаем LatLngPoly для данного H3 идентификатора
-        polygon = h3.cells_to_h3shape([hex_id], tight=True)
+        polygon = h3_int.cells_to_h3shape([hex_id], tight=True)
 
         # Извлекаем координаты из объекта LatLngPoly
         outlines = polygon.outer if hasattr(polygon, 'outer') else []
@@ -389,12 +395,16 @@ def create_hexagons(geoJson):
 
 
 if __name__ == "__main__":
+    # Замеры этапов пишутся в run_report.json, профили cProfile - в папку из PROFILE_DIR (если задана)
+    profiler = RunProfiler(profile_dir=os.environ.get('PROFILE_DIR'))
     try:
         # 1. Загружаем границы Краснодара
-        krasnodar_gdf = get_city_boundary('Краснодар')
+        with profiler.stage('get_city_boundary'):
+            krasnodar_gdf = get_city_boundary('Краснодар')
 
         # 2. Визуализируем границы города
-        city_map = visualize_city_boundary(krasnodar_gdf)
+        with profiler.stage('visualize_city_boundary'):
+            city_map = visualize_city_boundary(krasnodar_gdf)
 
         # # 3. Генерируем H3-гексагон для центра города
         # hex_id = h3.latlng_to_cell(
@@ -423,14 +433,19 @@ if __name__ == "__main__":
         }
 
         # Вызов функции для создания гексагонов
-        m, hexagons = create_hexagons(geoJson)
-        m.save("city_map.html")
-        
-        city_map.save("output_map.html")
+        with profiler.stage('create_hexagons', res=10) as stage:
+            m, hexagons = create_hexagons(geoJson)
+            stage['cells'] = len(hexagons)
+
+        with profiler.stage('save', cells=len(hexagons)):
+            m.save("city_map.html")
+            city_map.save("output_map.html")
 
         print("Карта успешно сохранена")
     except Exception as e:
         print(f"Произошла ошибка: {e}")
+    finally:
+        print(f"Отчет о запуске: {profiler.save(RUN_REPORT)}")
 
 
 # if __name__ == "__main__":
@@ -0,0 +1,238 @@
+#!python 3.13
+# Соседства ячеек H3 в виде разреженной матрицы CSR: суммы по k-кольцу, средние с затуханием
+# по расстоянию и пространственный лаг считаются произведениями матрицы сразу на все столбцы метрик.
+# Матрица строится векторно по локальным координатам IJ (одно смещение на каждую ячейку кольца)
+# и кешируется на диске по (город, уровень детализации, k).
+
+import hashlib
+from pathlib import Path
+
+import h3  # Работа с H3-геоидами
+import h3.api.numpy_int as h3_int  # H3 с идентификаторами uint64
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from hex_index import HEX_INDEX_DIR, cells_to_uint64
+
+
+def kring_offsets(k):
+    """
+    Смещения в локальных координатах IJ для всех ячеек k-кольца.
+    Соседи ячейки: (±1, 0), (0, ±1), ±(1, 1), поэтому расстояние равно (|di| + |dj| + |di - dj|) / 2.
+    Параметры:
+        k (int): Радиус кольца
+    Возвращает:
+        np.ndarray: Смещения (M, 2)
+        np.ndarray: Расстояния по сетке (M,)
+    """
+    di, dj = np.meshgrid(np.arange(-k, k + 1), np.arange(-k, k + 1), indexing='ij')
+    di, dj = di.ravel(), dj.ravel()
+    distance = (np.abs(di) + np.abs(dj) + np.abs(di - dj)) // 2
+    inside = distance <= k
+    return np.column_stack((di[inside], dj[inside])), distance[inside]
+
+
+def kring_adjacency_grid_disk(cells, k):
+    """
+    Матрица соседства через grid_disk для каждой ячейки. Медленный запасной путь,
+    когда локальные координаты IJ не определены (пентагоны, слишком большой охват).
+    Параметры:
+        cells (np.ndarray): Отсортированные ячейки одного уровня (uint64)
+        k (int): Радиус кольца
+    Возвращает:
+        scipy.sparse.csr_matrix: Расстояния по сетке до соседей из набора
+    """
+    rows, cols, data = [], [], []
+    for row, cell in enumerate(cells.tolist()):
+        for distance, ring in enumerate(h3_int.grid_ring(cell, d) if d else [cell] for d in range(k + 1)):
+            ring = np.asarray(ring, dtype=np.uint64)
+            positions = np.searchsorted(cells, ring)
+            positions[positions == len(cells)] = 0
+            found = positions[cells[positions] == ring]
+            rows.append(np.full(len(found), row))
+            cols.append(found)
+            data.append(np.full(len(found), distance))
+
+    return sp.csr_matrix(
+        (np.concatenate(data).astype(np.int8), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(len(cells), len(cells))
+    )
+
+
+def near_pentagon(cells, k):
+    """
+    Проверяет, есть ли пентагон того же уровня ближе k + 2 ребер к какой-либо ячейке набора.
+    Параметры:
+        cells (np.ndarray): Ячейки одного уровня (uint64)
+        k (int): Радиус кольца
+    Возвращает:
+        bool: True, если рядом есть пентагон
+    """
+    res = h3_int.get_resolution(int(cells[0]))
+    pentagons = np.radians([h3_int.cell_to_latlng(cell) for cell in h3_int.get_pentagons(res).tolist()])
+    centers = np.radians([h3_int.cell_to_latlng(cell) for cell in cells.tolist()])
+
+    # Угловое расстояние по формуле гаверсинусов для всех пар (пентагон, ячейка)
+    dlat = centers[None, :, 0] - pentagons[:, None, 0]
+    dlng = centers[None, :, 1] - pentagons[:, None, 1]
+    a = np.sin(dlat / 2) ** 2 + np.cos(pentagons[:, None, 0]) * np.cos(centers[None, :, 0]) * np.sin(dlng / 2) ** 2
+    distance_km = 2 * 6371.0088 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    return bool(distance_km.min() < 2 * (k + 2) * h3.average_hexagon_edge_length(res, unit='km'))
+
+
+def kring_adjacency(cells, k=1):
+    """
+    Строит матрицу соседства: в строке ячейки - все ячейки набора в ее k-кольце (включая ее саму),
+    значение - расстояние по сетке (0 на диагонали хранится явно).
+    Параметры:
+        cells (np.ndarray): Ячейки одного уровня (uint64)
+        k (int): Радиус кольца
+    Возвращает:
+        np.ndarray: Отсортированные ячейки - порядок строк и столбцов
+        scipy.sparse.csr_matrix: Матрица (N, N) с расстояниями (int8)
+    """
+    cells = np.unique(cells_to_uint64(cells))
+    if len(cells) == 0:
+        return cells, sp.csr_matrix((0, 0), dtype=np.int8)
+
+    # Возле пентагонов координаты IJ искажены, там используем grid_disk
+    if near_pentagon(cells, k):
+        return cells, kring_adjacency_grid_disk(cells, k)
+
+    try:
+        origin = int(cells[len(cells) // 2])
+        ij = np.array([h3_int.cell_to_local_ij(origin, cell) for cell in cells.tolist()], dtype=np.int64)
+    except h3.H3BaseException:
+        return cells, kring_adjacency_grid_disk(cells, k)
+
+    # Ключ ячейки по ее координатам IJ, отсортированный для бинарного поиска
+    shift = np.int64(1 << 31)
+    keys = (ij[:, 0] + shift) << np.int64(32) | (ij[:, 1] + shift)
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+
+    offsets, distances = kring_offsets(k)
+    rows, cols, data = [], [], []
+    for (di, dj), distance in zip(offsets.tolist(), distances.tolist()):
+        neighbor_keys = (ij[:, 0] + di + shift) << np.int64(32) | (ij[:, 1] + dj + shift)
+        positions = np.searchsorted(sorted_keys, neighbor_keys)
+        positions[positions == len(cells)] = 0
+        found = np.flatnonzero(sorted_keys[positions] == neighbor_keys)
+        rows.append(found)
+        cols.append(order[positions[found]])
+        data.append(np.full(len(found), distance, dtype=np.int8))
+
+    adjacency = sp.csr_matrix(
+        (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))), shape=(len(cells), len(cells))
+    )
+    adjacency.sort_indices()
+    return cells, adjacency
+
+
+def adjacency_path(city_name, res, k, cells, root=HEX_INDEX_DIR):
+    """
+    Путь к кешу матрицы соседства. В имя входит хеш набора ячеек, поэтому
+    после изменения границ матрица строится заново.
+    Параметры:
+        city_name (str): Название города на русском языке
+        res (int): Уровень детализации H3
+        k (int): Радиус кольца
+        cells (np.ndarray): Отсортированные ячейки (uint64)
+        root (str): Папка с индексами
+    Возвращает:
+        Path: Путь к файлу .npz
+    """
+    digest = hashlib.sha1(np.ascontiguousarray(cells, dtype=np.uint64).tobytes()).hexdigest()[:12]
+    return Path(root) / f'{city_name}_{res}_k{k}_{digest}.npz'
+
+
+def load_adjacency(city_name, res, k, cells, root=HEX_INDEX_DIR):
+    """
+    Загружает матрицу соседства из кеша или строит и сохраняет ее.
+    Параметры:
+        city_name (str): Название города на русском языке
+        res (int): Уровень детализации H3
+        k (int): Радиус кольца
+        cells (np.ndarray): Ячейки покрытия (uint64), например из create_hexagons
+        root (str): Папка с индексами
+    Возвращает:
+        np.ndarray: Отсортированные ячейки - порядок строк и столбцов
+        scipy.sparse.csr_matrix: Матрица с расстояниями
+    """
+    cells = np.unique(cells_to_uint64(cells))
+    path = adjacency_path(city_name, res, k, cells, root)
+    if path.exists():
+        return cells, sp.load_npz(path).tocsr()
+
+    cells, adjacency = kring_adjacency(cells, k)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp.npz')
+    sp.save_npz(tmp_path, adjacency)
+    tmp_path.replace(path)
+
+    return cells, adjacency
+
+
+def kring_weights(adjacency, decay=None, include_self=True, normalize=False):
+    """
+    Веса соседей из матрицы расстояний.
+    Параметры:
+        adjacency (scipy.sparse.csr_matrix): Матрица расстояний из kring_adjacency
+        decay (float): Множитель веса на шаг сетки (вес decay ** расстояние), None - все веса 1
+        include_self (bool): Учитывать саму ячейку
+        normalize (bool): Нормировать строки на сумму весов
+    Возвращает:
+        scipy.sparse.csr_matrix: Матрица весов (float64)
+    """
+    weights = adjacency.astype(np.float64)
+    distances = adjacency.data
+    weights.data = np.power(decay, distances) if decay is not None else np.ones(len(distances))
+    if not include_self:
+        weights.data[distances == 0] = 0.0
+        weights.eliminate_zeros()
+
+    if normalize:
+        totals = np.asarray(weights.sum(axis=1)).ravel()
+        totals[totals == 0] = 1.0
+        weights = sp.diags(1.0 / totals) @ weights
+
+    return weights.tocsr()
+
+
+def neighborhood_features(frame, columns, adjacency_cells, adjacency, decay=0.5):
+    """
+    Добавляет к таблице метрик суммы по k-кольцу, средние с затуханием и пространственный лаг.
+    Все столбцы обрабатываются одним произведением разреженной матрицы на плотную.
+    Параметры:
+        frame (pd.DataFrame): Таблица со столбцом cell (uint64) и метриками
+        columns (list): Столбцы метрик
+        adjacency_cells (np.ndarray): Ячейки матрицы соседства (порядок строк)
+        adjacency (scipy.sparse.csr_matrix): Матрица расстояний из kring_adjacency / load_adjacency
+        decay (float): Множитель веса на шаг сетки для среднего с затуханием
+    Возвращает:
+        pd.DataFrame: Копия frame со столбцами <метрика>_ksum, <метрика>_decay и <метрика>_lag.
+            Ячейки без метрик считаются нулями, ячейки вне матрицы получают NaN
+    """
+    columns = list(columns)
+    values = np.zeros((len(adjacency_cells), len(columns)), dtype=np.float64)
+
+    cells = frame['cell'].to_numpy(dtype=np.uint64)
+    positions = np.searchsorted(adjacency_cells, cells)
+    positions[positions == len(adjacency_cells)] = 0
+    known = adjacency_cells[positions] == cells
+    values[positions[known]] = frame.loc[known, columns].to_numpy(dtype=np.float64)
+
+    products = {
+        'ksum': kring_weights(adjacency) @ values,
+        'decay': kring_weights(adjacency, decay=decay, normalize=True) @ values,
+        'lag': kring_weights(adjacency, include_self=False, normalize=True) @ values,
+    }
+
+    result = frame.copy()
+    for suffix, product in products.items():
+        for j, column in enumerate(columns):
+            result[f'{column}_{suffix}'] = np.where(known, product[positions, j], np.nan)
+
+    return result
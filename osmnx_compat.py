@@ -0,0 +1,92 @@
+#!python 3.13
+# Единственное место, где код обращается к внутренним функциям OSMnx: сборка GeoDataFrame
+# из готовых ответов Overpass (features._create_gdf) и подмена загрузки из сети в замерах
+# (_nominatim._download_nominatim_element, _overpass._download_overpass_features).
+# Они не входят в публичный API и могут измениться при обновлении OSMnx, поэтому версия и наличие
+# функций проверяются при первом обращении, а несовместимая версия дает одну понятную ошибку.
+
+from contextlib import contextmanager
+
+# Версии OSMnx (major.minor), с которыми проверены внутренние функции
+SUPPORTED_VERSIONS = ('2.0',)
+
+# Используемые внутренние функции: (модуль OSMnx, атрибут)
+PRIVATE_API = (
+    ('features', '_create_gdf'),
+    ('_errors', 'InsufficientResponseError'),
+    ('_nominatim', '_download_nominatim_element'),
+    ('_overpass', '_download_overpass_features'),
+)
+
+_checked = False
+
+
+def load_osmnx():
+    """
+    Импортирует OSMnx и проверяет, что используемые внутренние функции на месте.
+    Возвращает:
+        module: osmnx
+    """
+    global _checked
+
+    import osmnx as ox  # Загрузка данных OpenStreetMap
+
+    if _checked:
+        return ox
+
+    version = '.'.join(ox.__version__.split('.')[:2])
+    missing = [
+        f'osmnx.{module}.{name}' for module, name in PRIVATE_API
+        if not hasattr(getattr(ox, module, None), name)
+    ]
+    if version not in SUPPORTED_VERSIONS or missing:
+        raise RuntimeError(
+            f'osmnx {ox.__version__} is not supported (expected {", ".join(SUPPORTED_VERSIONS)}.x'
+            + (f'; missing {", ".join(missing)}' if missing else '')
+            + '): install the version pinned in requirements.txt or update osmnx_compat.py'
+        )
+
+    _checked = True
+    return ox
+
+
+def features_from_responses(responses, tags, polygon=None):
+    """
+    Собирает GeoDataFrame из ответов Overpass так же, как features_from_polygon.
+    Параметры:
+        responses (list): Ответы Overpass JSON
+        tags (dict): Теги OSMnx
+        polygon (Polygon | MultiPolygon): Полигон в координатах (lng, lat); None - без пространственной фильтрации
+    Возвращает:
+        GeoDataFrame: Объекты OSM (пустой, если подходящих нет)
+    """
+    import geopandas as gpd  # Работа с геоданными
+    from shapely.geometry import Polygon  # Работа с геометрией
+
+    ox = load_osmnx()
+    try:
+        # Пустой полигон отключает пространственную фильтрацию
+        return ox.features._create_gdf(responses, Polygon() if polygon is None else polygon, tags)
+    except ox._errors.InsufficientResponseError:
+        return gpd.GeoDataFrame()
+
+
+@contextmanager
+def replay_downloads(nominatim, overpass):
+    """
+    Подменяет обращения OSMnx к Nominatim и Overpass готовыми ответами.
+    Параметры:
+        nominatim (list): Ответ Nominatim для любого запроса
+        overpass (list): Ответы Overpass JSON для любого запроса
+    """
+    ox = load_osmnx()
+
+    download_nominatim = ox._nominatim._download_nominatim_element
+    download_overpass = ox._overpass._download_overpass_features
+    ox._nominatim._download_nominatim_element = lambda query, **kwargs: nominatim
+    ox._overpass._download_overpass_features = lambda polygon, tags: iter(overpass)
+    try:
+        yield
+    finally:
+        ox._nominatim._download_nominatim_element = download_nominatim
+        ox._overpass._download_overpass_features = download_overpass
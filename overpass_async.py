@@ -0,0 +1,368 @@
+#!python 3.13
+# Параллельная загрузка объектов OSM из Overpass: несколько городов и наборов тегов одновременно.
+# Один requests.Session с пулом соединений, ограничение одновременных запросов на каждый сервер,
+# ожидание свободного слота по /status, повтор при 429/504 с экспоненциальной паузой
+# и разбиение больших рамок на тайлы. Для проверки без сети - overpass_replay.py.
+#
+# Пример:
+#     client = OverpassClient(concurrency=2)
+#     layers = fetch_layers({'Краснодар': city_gdf.union_all()}, FEATURE_TAGS, client)
+
+import asyncio
+import itertools
+import random
+import re
+import weakref
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+# Сервер Overpass по умолчанию (как в OSMnx)
+OVERPASS_URL = 'https://overpass-api.de/api'
+
+# Наибольшая сторона тайла запроса в градусах
+TILE_DEGREES = 0.25
+
+# Экранирование строк Overpass QL: обратная косая черта, кавычки и управляющие символы
+QL_ESCAPES = {
+    **{code: f'\\u{code:04x}' for code in range(0x20)},
+    ord('\\'): '\\\\', ord('"'): '\\"', ord('\n'): '\\n', ord('\t'): '\\t',
+}
+
+
+def ql_string(value):
+    """
+    Строка в двойных кавычках для запроса Overpass QL.
+    Параметры:
+        value (str): Ключ или значение тега
+    Возвращает:
+        str: Строка с экранированными спецсимволами
+    """
+    return '"' + str(value).translate(QL_ESCAPES) + '"'
+
+
+def tags_filters(tags):
+    """
+    Переводит теги в формате OSMnx в фильтры Overpass QL.
+    Параметры:
+        tags (dict): {ключ: True | значение | [значения]}
+    Возвращает:
+        list: Фильтры вида ["shop"] или ["building"="house"]
+    """
+    filters = []
+    for key, value in tags.items():
+        if value is True:
+            filters.append(f'[{ql_string(key)}]')
+        else:
+            filters.extend(f'[{ql_string(key)}={ql_string(item)}]' for item in ([value] if isinstance(value, str) else value))
+
+    return filters
+
+
+def features_query(bbox, tags, timeout=180):
+    """
+    Запрос объектов по тегам в рамке (узлы, линии и отношения вместе с их узлами, как в OSMnx).
+    Параметры:
+        bbox (tuple): Рамка (юг, запад, север, восток)
+        tags (dict): Теги OSMnx
+        timeout (int): Лимит времени запроса на сервере в секундах
+    Возвращает:
+        str: Запрос Overpass QL
+    """
+    box = ','.join(f'{value:.7f}' for value in bbox)
+    components = ''.join(
+        f'({kind}{tag_filter}({box});(._;>;););'
+        for tag_filter in tags_filters(tags) for kind in ('node', 'way', 'relation')
+    )
+    return f'[out:json][timeout:{timeout}];({components});out;'
+
+
+def tile_bbox(bbox, max_side=TILE_DEGREES):
+    """
+    Делит рамку на одинаковые тайлы со стороной не больше max_side.
+    Параметры:
+        bbox (tuple): Рамка (юг, запад, север, восток)
+        max_side (float): Наибольшая сторона тайла в градусах
+    Возвращает:
+        list: Рамки тайлов
+    """
+    south, west, north, east = bbox
+    lat_edges = np.linspace(south, north, max(int(np.ceil((north - south) / max_side)), 1) + 1)
+    lng_edges = np.linspace(west, east, max(int(np.ceil((east - west) / max_side)), 1) + 1)
+
+    return [
+        (lat_edges[i], lng_edges[j], lat_edges[i + 1], lng_edges[j + 1])
+        for i in range(len(lat_edges) - 1) for j in range(len(lng_edges) - 1)
+    ]
+
+
+def parse_status(text):
+    """
+    Разбирает ответ /status сервера Overpass.
+    Параметры:
+        text (str): Текст ответа
+    Возвращает:
+        float | None: Секунды до свободного слота (0 - слот свободен), None - ответ не распознан
+    """
+    if re.search(r'^\d+ slots? available now', text, re.MULTILINE):
+        return 0.0
+
+    waits = [int(seconds) for seconds in re.findall(r'^Slot available after: \S+, in (-?\d+) seconds', text, re.MULTILINE)]
+    if waits:
+        return float(max(min(waits), 1))
+
+    return None
+
+
+def merge_responses(responses):
+    """
+    Объединяет ответы Overpass (тайлы одной рамки) без повторов элементов.
+    Параметры:
+        responses (list): Ответы Overpass JSON
+    Возвращает:
+        dict: Ответ Overpass JSON
+    """
+    if not responses:
+        return {'elements': []}
+
+    merged = {key: value for key, value in responses[0].items() if key != 'elements'}
+    seen = set()
+    elements = []
+    for response in responses:
+        for element in response.get('elements', []):
+            key = (element['type'], element['id'])
+            if key not in seen:
+                seen.add(key)
+                elements.append(element)
+    merged['elements'] = elements
+
+    return merged
+
+
+class OverpassClient:
+    """
+    Асинхронный клиент Overpass. HTTP-запросы выполняются в потоках через общий requests.Session,
+    поэтому соединения с каждым сервером переиспользуются.
+    """
+
+    def __init__(self, endpoints=(OVERPASS_URL,), concurrency=2, timeout=180, max_retries=5, backoff=2.0,
+                 max_tile=TILE_DEGREES):
+        """
+        Параметры:
+            endpoints (tuple): Адреса серверов Overpass (без /interpreter)
+            concurrency (int): Одновременные запросы к одному серверу
+            timeout (int): Таймаут запроса в секундах
+            max_retries (int): Повторы при 429/5xx и ошибках соединения
+            backoff (float): Начальная пауза между повторами, если /status не подсказал время
+            max_tile (float): Наибольшая сторона тайла запроса в градусах
+        """
+        self.endpoints = [endpoint.rstrip('/') for endpoint in endpoints]
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_tile = max_tile
+
+        self.session = requests.Session()
+        # Запас в пуле на запросы /status во время пауз между повторами
+        adapter = HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=2 * concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = 'geospatial_mts_25'
+
+        self._next_endpoint = itertools.cycle(self.endpoints)
+        # {цикл событий: {сервер: семафор}}; записи закрытых циклов удаляются сборщиком мусора
+        self._semaphores = weakref.WeakKeyDictionary()
+        self.requests = 0
+        self.retries = 0
+        self.waited = 0.0
+
+    def semaphore(self, endpoint):
+        """
+        Ограничитель одновременных запросов к серверу (создается в работающем цикле событий).
+        Параметры:
+            endpoint (str): Адрес сервера
+        Возвращает:
+            asyncio.Semaphore: Семафор сервера
+        """
+        # Семафор привязан к циклу событий, а каждый asyncio.run создает новый цикл
+        semaphores = self._semaphores.setdefault(asyncio.get_running_loop(), {})
+        if endpoint not in semaphores:
+            semaphores[endpoint] = asyncio.Semaphore(self.concurrency)
+        return semaphores[endpoint]
+
+    async def slot_pause(self, endpoint):
+        """
+        Время до свободного слота по /status.
+        Параметры:
+            endpoint (str): Адрес сервера
+        Возвращает:
+            float | None: Секунды ожидания или None, если статус недоступен
+        """
+        try:
+            response = await asyncio.to_thread(self.session.get, f'{endpoint}/status', timeout=self.timeout)
+        except requests.RequestException:
+            return None
+
+        return parse_status(response.text) if response.ok else None
+
+    async def wait(self, seconds):
+        self.waited += seconds
+        await asyncio.sleep(seconds)
+
+    async def request(self, query):
+        """
+        Выполняет запрос с ожиданием слота и повторами. Если /status отказавшего сервера подсказал
+        время, повтор ждет его и идет на тот же сервер; иначе повтор уходит на следующий сервер из списка.
+        Параметры:
+            query (str): Запрос Overpass QL
+        Возвращает:
+            dict: Ответ Overpass JSON
+        """
+        endpoint = next(self._next_endpoint)
+        tried = set()
+        for attempt in range(self.max_retries + 1):
+            tried.add(endpoint)
+            response = None
+
+            async with self.semaphore(endpoint):
+                pause = await self.slot_pause(endpoint)
+                if pause:
+                    await self.wait(pause)
+                try:
+                    self.requests += 1
+                    response = await asyncio.to_thread(
+                        self.session.post, f'{endpoint}/interpreter', data={'data': query}, timeout=self.timeout
+                    )
+                except (requests.ConnectionError, requests.Timeout):
+                    pass
+
+            if response is not None and response.status_code == 200:
+                return response.json()
+            if response is not None and response.status_code not in (429, 502, 503, 504):
+                response.raise_for_status()
+
+            if attempt < self.max_retries:
+                self.retries += 1
+                backoff = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                pause = await self.slot_pause(endpoint)
+                if pause is not None:
+                    # Сервер сам говорит, когда освободится слот, - повтор на нем же после паузы
+                    await self.wait(pause or backoff)
+                    continue
+
+                # Статус недоступен - следующий сервер; экспоненциальная пауза со случайным сдвигом
+                # нужна, только когда отказали уже все серверы
+                endpoint = next(self._next_endpoint)
+                if endpoint in tried:
+                    tried.clear()
+                    await self.wait(backoff)
+
+        raise RuntimeError(f'Overpass request failed after {self.max_retries} retries')
+
+    async def fetch_bbox(self, bbox, tags):
+        """
+        Загружает объекты в рамке, разбитой на тайлы, и объединяет ответы.
+        Параметры:
+            bbox (tuple): Рамка (юг, запад, север, восток)
+            tags (dict): Теги OSMnx
+        Возвращает:
+            dict: Ответ Overpass JSON
+        """
+        tiles = tile_bbox(bbox, self.max_tile)
+        responses = await asyncio.gather(*[self.request(features_query(tile, tags, self.timeout)) for tile in tiles])
+        return merge_responses(responses)
+
+    async def fetch_many(self, jobs):
+        """
+        Загружает несколько рамок одновременно.
+        Параметры:
+            jobs (dict): {ключ: (рамка, теги)}
+        Возвращает:
+            dict: {ключ: ответ Overpass JSON}
+        """
+        keys = list(jobs)
+        responses = await asyncio.gather(*[self.fetch_bbox(*jobs[key]) for key in keys])
+        return dict(zip(keys, responses))
+
+    def stats(self):
+        """
+        Статистика клиента.
+        Возвращает:
+            dict: Запросы, повторы и суммарное ожидание в секундах
+        """
+        return {'requests': self.requests, 'retries': self.retries, 'waited_sec': round(self.waited, 3)}
+
+    def close(self):
+        self.session.close()
+
+
+def polygon_bbox(polygon):
+    """
+    Рамка полигона в порядке Overpass.
+    Параметры:
+        polygon (Polygon | MultiPolygon): Полигон в координатах (lng, lat)
+    Возвращает:
+        tuple: (юг, запад, север, восток)
+    """
+    west, south, east, north = polygon.bounds
+    return south, west, north, east
+
+
+def response_to_gdf(response, polygon, tags):
+    """
+    Собирает GeoDataFrame из ответа так же, как OSMnx: объекты вне полигона и без тегов отбрасываются.
+    Параметры:
+        response (dict): Ответ Overpass JSON
+        polygon (Polygon | MultiPolygon): Полигон в координатах (lng, lat)
+        tags (dict): Теги OSMnx
+    Возвращает:
+        GeoDataFrame: Объекты OSM (пустой, если ничего не найдено)
+    """
+    from osmnx_compat import features_from_responses
+
+    return features_from_responses([response], tags, polygon)
+
+
+def fetch_layers(polygons, layers, client=None):
+    """
+    Загружает все наборы тегов для всех городов одновременно.
+    Параметры:
+        polygons (dict): {город: полигон границы в координатах (lng, lat)}
+        layers (dict): {слой: теги OSMnx}
+        client (OverpassClient): Клиент (по умолчанию - новый с настройками по умолчанию)
+    Возвращает:
+        dict: {(город, слой): GeoDataFrame}
+    """
+    own_client = client is None
+    client = client or OverpassClient()
+
+    jobs = {
+        (city_name, layer): (polygon_bbox(polygon), tags)
+        for city_name, polygon in polygons.items() for layer, tags in layers.items()
+    }
+    try:
+        responses = asyncio.run(client.fetch_many(jobs))
+    finally:
+        if own_client:
+            client.close()
+
+    return {
+        (city_name, layer): response_to_gdf(responses[(city_name, layer)], polygons[city_name], layers[layer])
+        for city_name, layer in jobs
+    }
+
+
+def fetch_features(polygon, tags, client=None):
+    """
+    Загружает объекты по тегам внутри полигона.
+    Параметры:
+        polygon (Polygon | MultiPolygon): Полигон в координатах (lng, lat)
+        tags (dict): Теги OSMnx
+        client (OverpassClient): Клиент (по умолчанию - новый с настройками по умолчанию)
+    Возвращает:
+        GeoDataFrame: Объекты OSM
+    """
+    return fetch_layers({None: polygon}, {None: tags}, client)[(None, None)]
+
@@ -0,0 +1,237 @@
+#!python 3.13
+# Локальная замена Overpass и Nominatim, которая отвечает сохраненными ответами из cache/.
+# Overpass отдает элементы в рамке запроса (узлы внутри рамки, линии и отношения с ними и все
+# узлы найденных линий), /status и ответ 429 имитируют ограничение по слотам.
+#
+# Пример:
+#     python overpass_replay.py --port 8765 --slots 2
+#     ox.settings.overpass_url = 'http://127.0.0.1:8765/api'
+#     ox.settings.nominatim_url = 'http://127.0.0.1:8765/'
+
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from overpass_async import merge_responses
+
+# Рамка (юг, запад, север, восток) или полигон poly:"lat lng lat lng ..." в запросе
+BBOX_PATTERN = re.compile(r'\((-?[\d.]+),(-?[\d.]+),(-?[\d.]+),(-?[\d.]+)\)')
+POLY_PATTERN = re.compile(r'poly:[\'"]([-\d. ]+)[\'"]')
+
+
+def status_text(slots_free, wait_seconds=1, rate_limit=2):
+    """
+    Текст ответа /status в формате сервера Overpass.
+    Параметры:
+        slots_free (int): Свободные слоты
+        wait_seconds (int): Время до свободного слота, если свободных нет
+        rate_limit (int): Число слотов
+    Возвращает:
+        str: Текст ответа
+    """
+    now = datetime.now(timezone.utc)
+    lines = [
+        'Connected as: 0',
+        f'Current time: {now:%Y-%m-%dT%H:%M:%SZ}',
+        'Announced endpoint: none',
+        f'Rate limit: {rate_limit}',
+    ]
+    if slots_free > 0:
+        lines.append(f'{slots_free} slots available now.')
+    else:
+        free_at = datetime.fromtimestamp(now.timestamp() + wait_seconds, timezone.utc)
+        lines.append(f'Slot available after: {free_at:%Y-%m-%dT%H:%M:%SZ}, in {wait_seconds} seconds.')
+    lines.append('Currently running queries (pid, space limit, time limit, start time):')
+
+    return '\n'.join(lines) + '\n'
+
+
+class ReplayData:
+    """
+    Ответы из cache/, разобранные для отбора по рамке.
+    """
+
+    def __init__(self, cache_dir='cache'):
+        """
+        Параметры:
+            cache_dir (str): Папка с кешем OSMnx
+        """
+        overpass, self.nominatim = [], []
+        for path in sorted(Path(cache_dir).glob('*.json')):
+            response = json.loads(path.read_text(encoding='utf-8'))
+            if isinstance(response, dict) and 'elements' in response:
+                overpass.append(response)
+            elif isinstance(response, list):
+                self.nominatim = response
+
+        self.response = merge_responses(overpass)
+        self.nodes = {e['id']: e for e in self.response['elements'] if e['type'] == 'node'}
+        self.ways = {e['id']: e for e in self.response['elements'] if e['type'] == 'way'}
+        self.relations = [e for e in self.response['elements'] if e['type'] == 'relation']
+
+    def select(self, bbox):
+        """
+        Элементы в рамке, как их вернул бы Overpass на запрос с рекурсией (._;>;).
+        Параметры:
+            bbox (tuple): Рамка (юг, запад, север, восток) или None - все элементы
+        Возвращает:
+            dict: Ответ Overpass JSON
+        """
+        if bbox is None:
+            return self.response
+
+        south, west, north, east = bbox
+        inside = {
+            node_id for node_id, node in self.nodes.items()
+            if south <= node['lat'] <= north and west <= node['lon'] <= east
+        }
+        ways = {way_id for way_id, way in self.ways.items() if inside.intersection(way['nodes'])}
+        relations = [
+            relation for relation in self.relations
+            if any(
+                (member['type'] == 'way' and member['ref'] in ways) or (member['type'] == 'node' and member['ref'] in inside)
+                for member in relation['members']
+            )
+        ]
+
+        # Линии отношений и узлы линий подтягиваются целиком
+        for relation in relations:
+            ways.update(member['ref'] for member in relation['members'] if member['type'] == 'way' and member['ref'] in self.ways)
+        nodes = inside | {node_id for way_id in ways for node_id in self.ways[way_id]['nodes']}
+
+        elements = [self.nodes[node_id] for node_id in sorted(nodes) if node_id in self.nodes]
+        elements += [self.ways[way_id] for way_id in sorted(ways)]
+        elements += relations
+
+        return {**{key: value for key, value in self.response.items() if key != 'elements'}, 'elements': elements}
+
+
+def query_bbox(query):
+    """
+    Достает рамку из запроса Overpass QL (первую рамку или рамку полигона).
+    Параметры:
+        query (str): Запрос
+    Возвращает:
+        tuple | None: (юг, запад, север, восток)
+    """
+    match = BBOX_PATTERN.search(query)
+    if match:
+        return tuple(float(value) for value in match.groups())
+
+    match = POLY_PATTERN.search(query)
+    if match:
+        values = [float(value) for value in match.group(1).split()]
+        lats, lngs = values[0::2], values[1::2]
+        return min(lats), min(lngs), max(lats), max(lngs)
+
+    return None
+
+
+def make_handler(data, slots, delay):
+    """
+    Класс обработчика запросов с общими данными и счетчиком занятых слотов.
+    Параметры:
+        data (ReplayData): Сохраненные ответы
+        slots (int): Одновременные запросы, сверх которых сервер отвечает 429
+        delay (float): Искусственная задержка ответа в секундах
+    Возвращает:
+        type: Подкласс BaseHTTPRequestHandler
+    """
+    state = {'busy': 0, 'requests': 0, 'rejected': 0}
+    lock = threading.Lock()
+
+    class ReplayHandler(BaseHTTPRequestHandler):
+        stats = state
+
+        def log_message(self, format, *args):
+            pass  # Без строки в консоли на каждый запрос
+
+        def send_body(self, code, body, content_type='application/json'):
+            body = body.encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path.endswith('/status'):
+                with lock:
+                    free = slots - state['busy']
+                self.send_body(200, status_text(free, rate_limit=slots), 'text/plain')
+            elif url.path.endswith('/search') or url.path.endswith('/lookup'):
+                self.send_body(200, json.dumps(data.nominatim, ensure_ascii=False))
+            elif url.path.endswith('/interpreter'):
+                self.interpreter(parse_qs(url.query).get('data', [''])[0])
+            else:
+                self.send_body(404, json.dumps({'error': 'not found'}))
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            form = parse_qs(self.rfile.read(length).decode('utf-8'))
+            self.interpreter(form.get('data', [''])[0])
+
+        def interpreter(self, query):
+            with lock:
+                state['requests'] += 1
+                if state['busy'] >= slots:
+                    state['rejected'] += 1
+                    rejected = True
+                else:
+                    state['busy'] += 1
+                    rejected = False
+
+            if rejected:
+                self.send_body(429, 'Too Many Requests', 'text/plain')
+                return
+
+            try:
+                time.sleep(delay)
+                self.send_body(200, json.dumps(data.select(query_bbox(query))))
+            finally:
+                with lock:
+                    state['busy'] -= 1
+
+    return ReplayHandler
+
+
+def serve(port=8765, cache_dir='cache', slots=2, delay=0.0, host='127.0.0.1'):
+    """
+    Создает сервер (запуск - serve_forever, в тестах - в отдельном потоке).
+    Параметры:
+        port (int): Порт (0 - любой свободный)
+        cache_dir (str): Папка с кешем OSMnx
+        slots (int): Одновременные запросы Overpass, сверх которых сервер отвечает 429
+        delay (float): Искусственная задержка ответа в секундах
+        host (str): Адрес
+    Возвращает:
+        ThreadingHTTPServer: Сервер; адрес Overpass - http://host:port/api
+    """
+    return ThreadingHTTPServer((host, port), make_handler(ReplayData(cache_dir), slots, delay))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальная замена Overpass/Nominatim по ответам из cache/')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--cache-dir', default='cache')
+    parser.add_argument('--slots', type=int, default=2, help='Одновременные запросы до ответа 429')
+    parser.add_argument('--delay', type=float, default=0.0, help='Задержка ответа в секундах')
+    args = parser.parse_args()
+
+    server = serve(args.port, args.cache_dir, args.slots, args.delay)
+    print(f'Overpass: http://127.0.0.1:{server.server_port}/api, Nominatim: http://127.0.0.1:{server.server_port}/')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
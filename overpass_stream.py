@@ -0,0 +1,238 @@
+#!python 3.13
+# Потоковый разбор ответов Overpass JSON без загрузки всего файла в память.
+# Массив elements читается по одному элементу (JSONDecoder.raw_decode по буферу поверх файла),
+# фильтр по тегам применяется сразу, и в памяти остаются только подходящие элементы
+# и то, из чего строится их геометрия. Узлы в ответе Overpass идут раньше линий, а линии -
+# раньше отношений, поэтому нужные линии и узлы добираются повторными проходами по файлу.
+# Геометрии строит OSMnx (osmnx_compat.features_from_responses) только по оставшимся элементам.
+#
+# Пример:
+#     response = stream_response('cache/<хеш>.json', boundary_matcher('Краснодар'))
+#     len(response['elements'])
+
+import json
+import re
+
+# Размер порции чтения файла в символах
+READ_SIZE = 1 << 16
+
+# Пробельные символы между значениями JSON
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# Символы, которые могут идти сразу после значения JSON
+DELIMITERS = ',:]} \t\n\r'
+
+
+class JsonStream:
+    """
+    Буфер поверх текстового файла для разбора JSON по одному значению.
+    """
+
+    def __init__(self, file, read_size=READ_SIZE):
+        """
+        Параметры:
+            file: Текстовый файл, открытый на чтение
+            read_size (int): Размер порции чтения в символах
+        """
+        self.file = file
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size=None):
+        """
+        Дочитывает порцию файла, отбрасывая уже разобранное начало буфера.
+        Параметры:
+            size (int): Размер порции (по умолчанию read_size)
+        Возвращает:
+            bool: False, если файл закончился
+        """
+        if self.eof:
+            return False
+
+        chunk = self.file.read(size or self.read_size)
+        if not chunk:
+            self.eof = True
+            return False
+
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Следующий значимый символ (пробелы пропускаются).
+        Возвращает:
+            str: Символ или пустая строка в конце файла
+        """
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def take(self, char):
+        """
+        Пропускает ожидаемый символ.
+        Параметры:
+            char (str): Символ
+        """
+        if self.peek() != char:
+            raise json.JSONDecodeError(f'Expecting {char!r}', self.buffer, self.pos)
+        self.pos += 1
+
+    def decode(self):
+        """
+        Разбирает следующее значение JSON.
+        Возвращает:
+            Значение
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Значение не поместилось в буфер: порция удваивается, чтобы длинные
+                # отношения не разбирались заново на каждой маленькой дочитке
+                if self.fill(max(self.read_size, len(self.buffer) - self.pos)):
+                    continue
+                raise
+
+            # Число на границе порции могло оборваться (0. из 0.6), поэтому после значения
+            # должен быть разделитель
+            if (end == len(self.buffer) or self.buffer[end] not in DELIMITERS) and self.fill():
+                continue
+
+            self.pos = end
+            return value
+
+
+def iter_elements(file, header=None, read_size=READ_SIZE):
+    """
+    Перебирает элементы ответа Overpass по одному.
+    Параметры:
+        file: Текстовый файл с ответом Overpass JSON
+        header (dict): Словарь, в который записываются остальные ключи ответа (osm3s и т.п.)
+        read_size (int): Размер порции чтения в символах
+    Возвращает:
+        generator: Элементы (dict); для файлов, которые не являются объектом JSON
+            (например, ответы Nominatim), - ничего
+    """
+    stream = JsonStream(file, read_size)
+    if stream.peek() != '{':
+        return
+
+    stream.take('{')
+    while stream.peek() not in ('}', ''):
+        key = stream.decode()
+        stream.take(':')
+
+        if key == 'elements':
+            stream.take('[')
+            while stream.peek() != ']':
+                yield stream.decode()
+                if stream.peek() == ',':
+                    stream.take(',')
+            stream.take(']')
+        else:
+            value = stream.decode()
+            if header is not None:
+                header[key] = value
+
+        if stream.peek() == ',':
+            stream.take(',')
+
+
+def tags_matcher(tags):
+    """
+    Проверка тегов элемента по набору тегов OSMnx (логическое ИЛИ по ключам, как в match_tags).
+    Параметры:
+        tags (dict): Теги OSMnx {ключ: True | значение | [значения]}
+    Возвращает:
+        callable: Функция тегов элемента -> bool
+    """
+    rules = {
+        key: True if value is True else {value} if isinstance(value, str) else set(value)
+        for key, value in tags.items()
+    }
+
+    def match(element_tags):
+        return any(
+            key in element_tags and (values is True or element_tags[key] in values)
+            for key, values in rules.items()
+        )
+
+    return match
+
+
+def boundary_matcher(city_name, admin_level='6'):
+    """
+    Проверка тегов элемента по условиям filter_city_boundary: административная граница
+    нужного уровня с названием, содержащим название города.
+    Параметры:
+        city_name (str): Название города на русском языке
+        admin_level (str): Уровень административного деления OSM
+    Возвращает:
+        callable: Функция тегов элемента -> bool
+    """
+    def match(element_tags):
+        return (
+            element_tags.get('boundary') == 'administrative'
+            and element_tags.get('admin_level') == admin_level
+            and city_name in element_tags.get('name', '')
+        )
+
+    return match
+
+
+def stream_response(path, match, read_size=READ_SIZE):
+    """
+    Читает из файла Overpass только элементы с подходящими тегами и все, что нужно для их геометрии.
+    Первый проход отбирает элементы по тегам и запоминает их линии и узлы, следующие
+    (только если нужно) - дочитывают линии участников отношений и узлы линий.
+    Параметры:
+        path (str | Path): Файл с ответом Overpass JSON
+        match (callable): Функция тегов элемента -> bool (tags_matcher, boundary_matcher)
+        read_size (int): Размер порции чтения в символах
+    Возвращает:
+        dict: Ответ Overpass JSON с остальными ключами исходного ответа и отобранными элементами
+            (пустой словарь, если файл - не ответ Overpass)
+    """
+    header = {}
+    kept = {}
+    ways, nodes = set(), set()
+
+    def keep(element):
+        kept[(element['type'], element['id'])] = element
+        if element['type'] == 'way':
+            nodes.update(element.get('nodes', []))
+        elif element['type'] == 'relation':
+            for member in element.get('members', []):
+                if member['type'] == 'way':
+                    ways.add(member['ref'])
+                elif member['type'] == 'node':
+                    nodes.add(member['ref'])
+
+    with open(path, encoding='utf-8') as file:
+        found = False
+        for element in iter_elements(file, header, read_size):
+            found = True
+            if match(element.get('tags', {})):
+                keep(element)
+
+    if not found and not header:
+        return {}
+
+    # Линии участников отношений, затем узлы всех отобранных линий
+    for kind, ids in (('way', ways), ('node', nodes)):
+        if all((kind, element_id) in kept for element_id in ids):
+            continue
+        with open(path, encoding='utf-8') as file:
+            for element in iter_elements(file, None, read_size):
+                if element['type'] == kind and element['id'] in ids and (kind, element['id']) not in kept:
+                    keep(element)
+
+    return {**header, 'elements': list(kept.values())}
@@ -0,0 +1,253 @@
+#!python 3.13
+# Геомаркетинговые признаки по ячейкам H3 из объектов OSM (магазины, остановки, офисы, жилые дома).
+# Точки переводятся в ячейки одним вызовом latlng_to_cells, полигоны распределяются по ячейкам
+# пропорционально площади пересечения: кандидаты ищутся через STRtree, пересечения считаются
+# векторно в shapely 2, а полигоны, целиком лежащие в одной ячейке, пересечение не считают.
+#
+# Пример:
+#     python poi_features.py Краснодар --res 9 --out features.parquet
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from hex_index import cells_resolution, cells_to_str, cells_to_uint64, hex_index_contains, latlng_to_cells
+
+# Наборы тегов OSM (в формате tags OSMnx) для признаков по умолчанию
+FEATURE_TAGS = {
+    'shops': {'shop': True},
+    'transit': {
+        'highway': 'bus_stop',
+        'public_transport': ['platform', 'stop_position', 'station'],
+        'railway': ['station', 'halt', 'tram_stop'],
+    },
+    'offices': {'office': True},
+    'residential': {'building': ['residential', 'apartments', 'house', 'detached', 'semidetached_house', 'terrace']},
+}
+
+
+def merge_tags(tag_sets):
+    """
+    Объединяет наборы тегов в один запрос Overpass.
+    Параметры:
+        tag_sets (dict): {признак: теги OSMnx}
+    Возвращает:
+        dict: Теги OSMnx для features_from_polygon
+    """
+    merged = {}
+    for tags in tag_sets.values():
+        for key, value in tags.items():
+            if value is True or merged.get(key) is True:
+                merged[key] = True
+                continue
+            values = merged.get(key, [])
+            merged[key] = sorted(set(values) | set([value] if isinstance(value, str) else value))
+
+    return merged
+
+
+def match_tags(gdf, tags):
+    """
+    Векторно отбирает объекты, подходящие под набор тегов (логическое ИЛИ по ключам, как в OSMnx).
+    Параметры:
+        gdf (GeoDataFrame): Объекты OSM со столбцами тегов
+        tags (dict): Теги OSMnx
+    Возвращает:
+        np.ndarray: Маска bool
+    """
+    mask = np.zeros(len(gdf), dtype=bool)
+    for key, value in tags.items():
+        if key not in gdf:
+            continue
+        column = gdf[key]
+        if value is True:
+            mask |= column.notna().to_numpy()
+        else:
+            mask |= column.isin([value] if isinstance(value, str) else value).to_numpy()
+
+    return mask
+
+
+def fetch_features(city_gdf, tag_sets=FEATURE_TAGS, client=None):
+    """
+    Загружает объекты OSM для всех наборов тегов одним запросом в границах города
+    (рамка режется на тайлы, которые загружаются параллельно, см. overpass_async.py).
+    Параметры:
+        city_gdf (GeoDataFrame): Границы города
+        tag_sets (dict): {признак: теги OSMnx}
+        client (OverpassClient): Клиент Overpass (None - новый с настройками по умолчанию)
+    Возвращает:
+        GeoDataFrame: Объекты OSM
+    """
+    from overpass_async import fetch_features as fetch_overpass_features
+
+    return fetch_overpass_features(city_gdf.union_all(), merge_tags(tag_sets), client)
+
+
+def load_cached_features(tag_sets=FEATURE_TAGS, cache_dir='cache'):
+    """
+    Собирает объекты OSM из сохраненных ответов Overpass без обращения к сети.
+    Параметры:
+        tag_sets (dict): {признак: теги OSMnx}
+        cache_dir (str): Папка с кешем OSMnx
+    Возвращает:
+        GeoDataFrame: Объекты OSM (пустой, если в кеше их нет)
+    """
+    from pathlib import Path
+
+    from osmnx_compat import features_from_responses
+    from overpass_stream import stream_response, tags_matcher
+
+    # Ответы разбираются потоком: в памяти остаются только объекты с нужными тегами и их линии и узлы
+    tags = merge_tags(tag_sets)
+    responses = []
+    for path in sorted(Path(cache_dir).glob('*.json')):
+        response = stream_response(path, tags_matcher(tags))
+        if response.get('elements'):
+            responses.append(response)
+
+    return features_from_responses(responses, tags)
+
+
+def overlay_polygons(geometries, hexagons, hex_polygons=None):
+    """
+    Распределяет полигоны по ячейкам пропорционально площади пересечения.
+    Параметры:
+        geometries (np.ndarray): Полигоны shapely в координатах (lng, lat)
+        hexagons (np.ndarray): Отсортированные ячейки покрытия (uint64)
+        hex_polygons (np.ndarray): Полигоны ячеек (если уже построены)
+    Возвращает:
+        np.ndarray: Номера полигонов
+        np.ndarray: Ячейки (uint64)
+        np.ndarray: Доля площади полигона в ячейке
+    """
+    import shapely
+
+    from main import hexagons_to_polygons
+
+    if hex_polygons is None:
+        hex_polygons = hexagons_to_polygons(hexagons)
+
+    # Самопересечения в разметке OSM ломают расчет пересечений
+    invalid = ~shapely.is_valid(geometries)
+    if invalid.any():
+        geometries = geometries.copy()
+        geometries[invalid] = shapely.make_valid(geometries[invalid])
+
+    tree = shapely.STRtree(hex_polygons)
+    poly_idx, hex_idx = tree.query(geometries, predicate='intersects')
+
+    # Полигон с одним кандидатом, целиком лежащий в ячейке, получает долю 1 без расчета пересечения
+    candidates = np.bincount(poly_idx, minlength=len(geometries))
+    fractions = np.ones(len(poly_idx), dtype=np.float64)
+    single = candidates[poly_idx] == 1
+    single[single] = shapely.contains(hex_polygons[hex_idx[single]], geometries[poly_idx[single]])
+
+    exact = ~single
+    areas = shapely.area(geometries)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fractions[exact] = shapely.area(
+            shapely.intersection(hex_polygons[hex_idx[exact]], geometries[poly_idx[exact]])
+        ) / areas[poly_idx[exact]]
+
+    keep = fractions > 0
+    return poly_idx[keep], hexagons[hex_idx[keep]], fractions[keep]
+
+
+def extract_features(features, hexagons, tag_sets=FEATURE_TAGS):
+    """
+    Строит широкую таблицу признаков по ячейкам.
+    Для каждого набора тегов: <признак>_count - число объектов (полигоны - долями по площади)
+    и <признак>_area_m2 - площадь полигонов в ячейке.
+    Параметры:
+        features (GeoDataFrame): Объекты OSM (fetch_features / load_cached_features)
+        hexagons (np.ndarray): Ячейки покрытия города (uint64), объекты вне покрытия отбрасываются
+        tag_sets (dict): {признак: теги OSMnx}
+    Возвращает:
+        pd.DataFrame: Строка на каждую ячейку покрытия: cell, h3 и признаки (нули, если объектов нет)
+    """
+    import shapely
+
+    hexagons = np.unique(cells_to_uint64(hexagons))
+    resolutions = np.unique(cells_resolution(hexagons))
+    if len(resolutions) > 1:
+        raise ValueError('Hexagons must have a single resolution (uncompact the coverage first)')
+    res = int(resolutions[0]) if len(resolutions) else 0
+
+    frame = pd.DataFrame({'cell': hexagons, 'h3': cells_to_str(hexagons)})
+    for name in tag_sets:
+        frame[f'{name}_count'] = 0.0
+        frame[f'{name}_area_m2'] = 0.0
+
+    if len(features) == 0 or len(hexagons) == 0:
+        return frame
+
+    geometries = features.geometry.to_numpy()
+    is_polygon = np.isin(shapely.get_type_id(geometries), [3, 6])  # Polygon, MultiPolygon
+
+    # Точки, линии и прочее - по репрезентативной точке
+    points = shapely.get_coordinates(shapely.point_on_surface(geometries[~is_polygon]))
+    point_cells = latlng_to_cells(points[:, 1], points[:, 0], res)
+    point_inside = hex_index_contains(hexagons, point_cells)
+    point_rows = np.flatnonzero(~is_polygon)
+
+    # Полигоны - наложением на ячейки, площадь в м² через локальную проекцию UTM
+    polygon_rows = np.flatnonzero(is_polygon)
+    poly_idx, poly_cells, fractions = overlay_polygons(geometries[polygon_rows], hexagons)
+    polygon_areas = np.zeros(len(polygon_rows))
+    if len(polygon_rows):
+        polygons = features.iloc[polygon_rows].geometry
+        polygon_areas = polygons.to_crs(polygons.estimate_utm_crs()).area.to_numpy()
+
+    for name, tags in tag_sets.items():
+        mask = match_tags(features, tags)
+
+        selected = mask[point_rows] & point_inside
+        positions = np.searchsorted(hexagons, point_cells[selected])
+        counts = np.bincount(positions, minlength=len(hexagons)).astype(np.float64)
+
+        selected = mask[polygon_rows][poly_idx]
+        positions = np.searchsorted(hexagons, poly_cells[selected])
+        counts += np.bincount(positions, weights=fractions[selected], minlength=len(hexagons))
+        areas = np.bincount(
+            positions, weights=fractions[selected] * polygon_areas[poly_idx[selected]], minlength=len(hexagons)
+        )
+
+        frame[f'{name}_count'] = counts
+        frame[f'{name}_area_m2'] = areas
+
+    return frame
+
+
+def main():
+    from boundary_store import BoundaryStore
+    from main import boundary_to_geojson, get_city_boundary, polyfill
+    from polyfill_cache import PolyfillCache
+
+    parser = argparse.ArgumentParser(description='Признаки OSM по ячейкам H3 для города')
+    parser.add_argument('city', help='Название города на русском языке')
+    parser.add_argument('--res', type=int, default=9, help='Уровень детализации H3')
+    parser.add_argument('--out', default='features.parquet', help='Файл результата .parquet или .csv')
+    parser.add_argument('--offline', action='store_true', help='Брать границы и объекты из хранилища и cache/')
+    args = parser.parse_args()
+
+    city_gdf = get_city_boundary(args.city, store=BoundaryStore(), offline=args.offline)
+    if city_gdf.empty:
+        print(f'{args.city}: границы не найдены')
+        return
+
+    hexagons = polyfill(boundary_to_geojson(city_gdf), res=args.res, cache=PolyfillCache())
+    features = load_cached_features() if args.offline else fetch_features(city_gdf)
+    frame = extract_features(features, hexagons)
+
+    if args.out.endswith('.csv'):
+        frame.to_csv(args.out, index=False)
+    else:
+        frame.to_parquet(args.out, index=False)
+
+    print(f'{args.city}, res={args.res}: {len(features)} объектов, {len(frame)} ячеек -> {args.out}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!python 3.13
+# Кеш заполнения полигонов ячейками H3 на диске.
+# Ключ - канонический хеш колец полигона и уровень детализации, старые записи вытесняются по LRU
+# при превышении лимита размера. Более грубые уровни выводятся из более мелких через cells_to_parent.
+
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+
+from hex_index import cells_to_center_child, cells_to_parent, hex_index_contains
+
+# Папка кеша и лимит его размера по умолчанию
+POLYFILL_CACHE_DIR = '.polyfill_cache'
+POLYFILL_CACHE_BYTES = 512 * 1024 ** 2
+
+
+def canonical_ring(ring):
+    """
+    Приводит кольцо к каноническому виду: без замыкающей точки, с округлением до 1e-7 градуса,
+    обход против часовой стрелки, начало - в лексикографически наименьшей вершине.
+    Параметры:
+        ring (list): Кольцо [(lat, lng), ...]
+    Возвращает:
+        np.ndarray: Массив (N, 2)
+    """
+    points = np.round(np.asarray(ring, dtype=np.float64), 7)
+    if len(points) > 1 and np.array_equal(points[0], points[-1]):
+        points = points[:-1]
+
+    # Знак удвоенной площади (формула шнурования) задает направление обхода
+    x, y = points[:, 0], points[:, 1]
+    if np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)) < 0:
+        points = points[::-1]
+
+    start = np.lexsort((points[:, 1], points[:, 0]))[0]
+    return np.roll(points, -start, axis=0)
+
+
+def geometry_hash(polygons):
+    """
+    Канонический хеш набора полигонов, не зависящий от порядка частей, дыр и начальной вершины.
+    Параметры:
+        polygons (list): Полигоны в виде [внешнее кольцо, *внутренние кольца]
+    Возвращает:
+        str: SHA-1 в шестнадцатеричном виде
+    """
+    parts = []
+    for rings in polygons:
+        outer = canonical_ring(rings[0]).tobytes()
+        holes = sorted(canonical_ring(ring).tobytes() for ring in rings[1:])
+        parts.append(b'|'.join([outer, *holes]))
+
+    digest = hashlib.sha1()
+    for part in sorted(parts):
+        digest.update(part)
+        digest.update(b'#')
+
+    return digest.hexdigest()
+
+
+class PolyfillCache:
+    """
+    Кеш результатов polyfill в файлах <хеш>_<уровень>.npy.
+    Время последнего обращения хранится в mtime файла и используется для вытеснения по LRU.
+    """
+
+    def __init__(self, root=POLYFILL_CACHE_DIR, max_bytes=POLYFILL_CACHE_BYTES, derive_coarser=True):
+        """
+        Параметры:
+            root (str): Папка кеша
+            max_bytes (int): Лимит суммарного размера файлов
+            derive_coarser (bool): Выводить грубые уровни из закешированных мелких через cells_to_parent.
+                Центр ячейки совпадает с центром ее центрального потомка, поэтому родитель остается,
+                только если его центральный потомок есть в мелком покрытии - результат тот же,
+                что у прямого заполнения по центрам
+        """
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.derive_coarser = derive_coarser
+        self.hits = 0
+        self.derived = 0
+        self.misses = 0
+
+    def path(self, geom_hash, res):
+        """
+        Путь к файлу записи.
+        Параметры:
+            geom_hash (str): Хеш геометрии
+            res (int): Уровень детализации H3
+        Возвращает:
+            Path: Путь к файлу .npy
+        """
+        return self.root / f'{geom_hash}_{res}.npy'
+
+    def get(self, geom_hash, res):
+        """
+        Ищет покрытие в кеше: сначала точное совпадение, затем вывод из ближайшего более мелкого уровня.
+        Параметры:
+            geom_hash (str): Хеш геометрии
+            res (int): Уровень детализации H3
+        Возвращает:
+            np.ndarray | None: Отсортированные ячейки (uint64) или None при промахе
+        """
+        cells = self._load(self.path(geom_hash, res))
+        if cells is not None:
+            self.hits += 1
+            return cells
+
+        if self.derive_coarser:
+            for finer in range(res + 1, 16):
+                finer_cells = self._load(self.path(geom_hash, finer))
+                if finer_cells is not None:
+                    self.derived += 1
+                    # Родители всех мелких ячеек шире покрытия по центрам: лишние - те,
+                    # чей центр (он же центр центрального потомка) лежит вне полигона
+                    parents = np.unique(cells_to_parent(finer_cells, res))
+                    cells = parents[hex_index_contains(finer_cells, cells_to_center_child(parents, finer))]
+                    self.put(geom_hash, res, cells)
+                    return cells
+
+        self.misses += 1
+        return None
+
+    def put(self, geom_hash, res, cells):
+        """
+        Сохраняет покрытие и вытесняет давно не использованные записи сверх лимита.
+        Параметры:
+            geom_hash (str): Хеш геометрии
+            res (int): Уровень детализации H3
+            cells (np.ndarray): Ячейки (uint64)
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.path(geom_hash, res)
+
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as file:
+            np.save(file, np.asarray(cells, dtype=np.uint64))
+        tmp_path.replace(path)
+
+        self.evict()
+
+    def evict(self):
+        """
+        Удаляет самые старые по времени обращения записи, пока кеш больше max_bytes.
+        """
+        entries = []
+        for path in self.root.glob('*.npy'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # Файл удалил другой процесс
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def stats(self):
+        """
+        Статистика обращений к кешу.
+        Возвращает:
+            dict: Попадания, выведенные из мелких уровней покрытия и промахи
+        """
+        return {'hits': self.hits, 'derived': self.derived, 'misses': self.misses}
+
+    @staticmethod
+    def _load(path):
+        """
+        Читает запись и отмечает обращение для LRU.
+        Параметры:
+            path (Path): Путь к файлу .npy
+        Возвращает:
+            np.ndarray | None: Ячейки или None, если записи нет
+        """
+        try:
+            cells = np.load(path)
+            os.utime(path)  # Обновляем mtime - время последнего обращения
+        except (ValueError, OSError):
+            return None  # Записи нет или ее удалил другой процесс
+
+        return cells
@@ -0,0 +1,261 @@
+#!python 3.13
+# Замеры этапов запуска: время, процессорное время, пиковая память, трафик и число ячеек.
+# Отчет сохраняется в JSON; при заданной папке для каждого этапа пишется профиль cProfile (.prof),
+# который открывается через python -m pstats или snakeviz.
+#
+# Пример:
+#     profiler = RunProfiler(profile_dir='profiles')
+#     with profiler.stage('create_hexagons', res=8) as stage:
+#         hexagons, _ = create_hexagons(geoJson, city_map)
+#         stage['cells'] = len(hexagons)
+#     profiler.save('run_report.json')
+
+import cProfile
+import json
+import os
+import platform
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Файл отчета о запуске по умолчанию
+RUN_REPORT = 'run_report.json'
+
+
+class PeakRSS:
+    """
+    Фоновый замер пикового RSS процесса (Linux, /proc/self/statm) во время выполнения блока with.
+    В отличие от tracemalloc учитывает память NumPy, h3 и GEOS и почти не замедляет код.
+    """
+
+    def __init__(self, interval=0.005):
+        """
+        Параметры:
+            interval (float): Период опроса в секундах
+        """
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    @staticmethod
+    def current():
+        """
+        Текущий RSS процесса.
+        Возвращает:
+            int: Байты (0, если /proc недоступен)
+        """
+        try:
+            with open('/proc/self/statm') as file:
+                return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            return 0
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.current()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+class NetworkCounter:
+    """
+    Счетчик HTTP-трафика через requests (им пользуется OSMnx для Nominatim и Overpass).
+    На время блока with подменяет requests.Session.send и восстанавливает его при выходе из
+    последнего вложенного блока. Ответы с stream=True счетчик не читает (размер - из Content-Length),
+    поэтому потоковое чтение у вызывающего кода не ломается.
+    Счетчики общие для всех потоков.
+    """
+
+    _lock = threading.Lock()
+    _depth = 0
+    _restore = None
+    requests = 0
+    bytes_sent = 0
+    bytes_received = 0
+
+    @staticmethod
+    def received(response, stream=False):
+        """
+        Размер тела ответа без дополнительного чтения из сети.
+        Параметры:
+            response (requests.Response): Ответ
+            stream (bool): Ответ запрошен с stream=True (тело еще не прочитано)
+        Возвращает:
+            int: Байты тела; для stream=True - из Content-Length (0, если его нет)
+        """
+        if not stream:
+            return len(response.content)  # Без stream=True тело уже прочитано в send
+
+        length = response.headers.get('Content-Length', '')
+        return int(length) if length.isdigit() else 0
+
+    @classmethod
+    def _install(cls):
+        try:
+            import requests
+        except ImportError:
+            return None
+
+        send = requests.Session.send
+
+        def counting_send(session, request, **kwargs):
+            response = send(session, request, **kwargs)
+            body = request.body or b''
+            received = cls.received(response, kwargs.get('stream'))
+            with cls._lock:
+                cls.requests += 1
+                cls.bytes_sent += len(body.encode() if isinstance(body, str) else body)
+                cls.bytes_received += received
+            return response
+
+        requests.Session.send = counting_send
+
+        def restore():
+            requests.Session.send = send
+
+        return restore
+
+    def __enter__(self):
+        cls = type(self)
+        with cls._lock:
+            if cls._depth == 0:
+                cls._restore = cls._install()
+            cls._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        cls = type(self)
+        with cls._lock:
+            cls._depth -= 1
+            if cls._depth == 0 and cls._restore is not None:
+                cls._restore()
+                cls._restore = None
+
+    @classmethod
+    def snapshot(cls):
+        """
+        Текущие значения счетчиков.
+        Возвращает:
+            tuple: (запросы, отправлено байт, получено байт)
+        """
+        with cls._lock:
+            return cls.requests, cls.bytes_sent, cls.bytes_received
+
+
+class RunProfiler:
+    """
+    Сборщик замеров по этапам одного запуска.
+    """
+
+    def __init__(self, profile_dir=None, verbose=True):
+        """
+        Параметры:
+            profile_dir (str): Папка для профилей cProfile по этапам (None - без профилирования)
+            verbose (bool): Печатать строку с замером после каждого этапа
+        """
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.verbose = verbose
+        self.stages = []
+        self.started = datetime.now(timezone.utc)
+
+    @contextmanager
+    def stage(self, name, **info):
+        """
+        Замеряет блок with как этап. В выданный словарь можно дописать свои поля (например, cells).
+        Параметры:
+            name (str): Название этапа
+            info: Дополнительные поля записи (например, res)
+        Возвращает:
+            dict: Запись этапа
+        """
+        record = {'stage': name, **info}
+        profile = cProfile.Profile() if self.profile_dir else None
+        requests_before, sent_before, received_before = NetworkCounter.snapshot()
+
+        rss = PeakRSS()
+        try:
+            # Счетчик трафика подключен только на время этапа
+            with NetworkCounter(), rss:
+                wall, cpu = time.perf_counter(), time.process_time()
+                if profile is not None:
+                    profile.enable()
+                try:
+                    yield record
+                except BaseException as e:
+                    record['error'] = repr(e)
+                    raise
+                finally:
+                    if profile is not None:
+                        profile.disable()
+                    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        finally:
+            # Этап записывается и при ошибке, чтобы в отчете было видно, где остановился запуск
+            requests_after, sent_after, received_after = NetworkCounter.snapshot()
+            record.update({
+                'wall_sec': round(wall, 6),
+                'cpu_sec': round(cpu, 6),
+                # Время без процессора: сеть, диск и дочерние процессы пула
+                'wait_sec': round(max(wall - cpu, 0.0), 6),
+                'net_requests': requests_after - requests_before,
+                'net_bytes_sent': sent_after - sent_before,
+                'net_bytes_received': received_after - received_before,
+                'peak_rss_mb': round(rss.peak / 1024 ** 2, 1),
+            })
+
+            if profile is not None:
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                record['profile'] = str(self.profile_dir / f'{len(self.stages):02d}_{name}.prof')
+                profile.dump_stats(record['profile'])
+
+            self.stages.append(record)
+            if self.verbose:
+                print(
+                    f"[{name}] {record['wall_sec']:.3f} s (CPU {record['cpu_sec']:.3f} s), "
+                    f"{record['peak_rss_mb']:.1f} MB, сеть {record['net_bytes_received']} байт"
+                    + (f", ячеек {record['cells']}" if 'cells' in record else '')
+                )
+
+    def report(self):
+        """
+        Отчет о запуске.
+        Возвращает:
+            dict: Окружение, этапы и итоги
+        """
+        return {
+            'started': self.started.isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'stages': self.stages,
+            'total': {
+                'wall_sec': round(sum(stage['wall_sec'] for stage in self.stages), 6),
+                'cpu_sec': round(sum(stage['cpu_sec'] for stage in self.stages), 6),
+                'net_bytes_received': sum(stage['net_bytes_received'] for stage in self.stages),
+                'peak_rss_mb': max((stage['peak_rss_mb'] for stage in self.stages), default=0.0),
+            },
+        }
+
+    def save(self, path=RUN_REPORT):
+        """
+        Сохраняет отчет в JSON.
+        Параметры:
+            path (str): Путь к файлу отчета
+        Возвращает:
+            Path: Путь к сохраненному файлу
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.report(), ensure_ascii=False, indent=2), encoding='utf-8')
+        return path
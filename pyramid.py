@@ -0,0 +1,210 @@
+#!python 3.13
+# Пирамида уровней детализации: метрики самого мелкого покрытия сводятся к родительским ячейкам
+# всех более крупных уровней. У отсортированных ячеек родители тоже идут по возрастанию,
+# поэтому группировка на каждом уровне - это границы серий и np.*.reduceat без сортировки
+# и без повторного заполнения полигона. Все уровни хранятся в одном Parquet.
+#
+# Пример:
+#     pyramid = build_pyramid(hexagons, {'events': counts}, min_res=6)
+#     pyramid.save(pyramid_path('Краснодар', 10))
+#     pyramid.level(7).top_k('events', 10)
+
+from pathlib import Path
+
+import numpy as np
+
+from hex_index import cells_resolution, cells_to_parent, cells_to_uint64
+from hex_table import HEX_TABLE_DIR, HexTable
+
+# Способы свертки метрик к родителю
+ROLLUPS = ('sum', 'mean', 'min', 'max')
+
+# Служебные столбцы пирамиды: число мелких ячеек и уровень в общем Parquet
+PYRAMID_COLUMNS = ('cells', 'res')
+
+
+def pyramid_path(city_name, res, root=HEX_TABLE_DIR):
+    """
+    Путь к пирамиде города.
+    Параметры:
+        city_name (str): Название города на русском языке
+        res (int): Самый мелкий уровень пирамиды
+        root (str): Папка с таблицами
+    Возвращает:
+        Path: Путь к файлу .parquet
+    """
+    return Path(root) / f'{city_name}_{res}_pyramid.parquet'
+
+
+def rollup(cells, columns, res, how):
+    """
+    Сводит отсортированные ячейки к родителям уровня res за один проход.
+    Параметры:
+        cells (np.ndarray): Отсортированные ячейки одного уровня (uint64)
+        columns (dict): {название: массив той же длины}
+        res (int): Уровень родителей
+        how (dict): {название: 'sum' | 'min' | 'max'}
+    Возвращает:
+        np.ndarray: Родительские ячейки (uint64, отсортированы)
+        dict: Свернутые столбцы
+    """
+    parents = cells_to_parent(cells, res)
+    if len(parents) == 0:
+        return parents, {name: values[:0] for name, values in columns.items()}
+
+    # Начала серий одинаковых родителей
+    starts = np.flatnonzero(np.concatenate([[True], parents[1:] != parents[:-1]]))
+
+    reducers = {'sum': np.add, 'min': np.minimum, 'max': np.maximum}
+    rolled = {name: reducers[how[name]].reduceat(values, starts) for name, values in columns.items()}
+    return parents[starts], rolled
+
+
+class HexPyramid:
+    """
+    Таблицы атрибутов одного покрытия на нескольких уровнях детализации.
+    Столбец cells - число ячеек самого мелкого уровня внутри ячейки (доля покрытия у границы
+    равна cells / 7^(разница уровней)).
+    """
+
+    def __init__(self, levels):
+        """
+        Параметры:
+            levels (dict): {уровень детализации: HexTable}
+        """
+        self.levels = dict(sorted(levels.items()))
+
+    @property
+    def resolutions(self):
+        return list(self.levels)
+
+    def level(self, res):
+        """
+        Таблица уровня res.
+        Параметры:
+            res (int): Уровень детализации
+        Возвращает:
+            HexTable: Таблица уровня
+        """
+        if res not in self.levels:
+            raise ValueError(f'Resolution {res} is not in the pyramid ({self.resolutions[0]}-{self.resolutions[-1]})')
+        return self.levels[res]
+
+    def lookup(self, cells, name):
+        """
+        Значения столбца для ячеек любых уровней пирамиды.
+        Параметры:
+            cells (np.ndarray): H3 идентификаторы (uint64), уровни могут быть разными
+            name (str): Название столбца
+        Возвращает:
+            np.ndarray: Значения (NaN для ячеек вне пирамиды)
+        """
+        cells = cells_to_uint64(cells)
+        resolutions = cells_resolution(cells)
+        values = np.full(len(cells), np.nan)
+
+        for res, table in self.levels.items():
+            rows = np.flatnonzero(resolutions == res)
+            if len(rows) == 0 or len(table) == 0:
+                continue
+            positions = np.searchsorted(table.cells, cells[rows])
+            positions[positions == len(table)] = 0
+            found = table.cells[positions] == cells[rows]
+            values[rows[found]] = table[name][positions[found]]
+
+        return values
+
+    def to_table(self):
+        """
+        Все уровни одной таблицей (ячейки разных уровней не совпадают) со столбцом res.
+        Возвращает:
+            HexTable: Таблица
+        """
+        cells = np.concatenate([table.cells for table in self.levels.values()])
+        names = self.levels[self.resolutions[-1]].names if self.levels else []
+        columns = {name: np.concatenate([table[name] for table in self.levels.values()]) for name in names}
+        columns['res'] = cells_resolution(cells)
+        return HexTable(cells, columns)
+
+    def save(self, path):
+        """
+        Сохраняет все уровни в один Parquet.
+        Параметры:
+            path (str | Path): Путь к файлу .parquet
+        Возвращает:
+            Path: Путь к сохраненному файлу
+        """
+        return self.to_table().save(path)
+
+    @classmethod
+    def load(cls, path, columns=None):
+        """
+        Читает пирамиду из Parquet.
+        Параметры:
+            path (str | Path): Путь к файлу .parquet
+            columns (list): Нужные столбцы (None - все)
+        Возвращает:
+            HexPyramid: Пирамида
+        """
+        table = HexTable.load(path, None if columns is None else ['res', *columns])
+        resolutions = table['res']
+        table.drop('res')
+        return cls({
+            int(res): table.filter(resolutions == res) for res in np.unique(resolutions)
+        })
+
+
+def build_pyramid(hexagons, columns=None, min_res=0, how=None):
+    """
+    Строит пирамиду от самого мелкого покрытия (create_hexagons/polyfill) до уровня min_res.
+    Каждый уровень получается из предыдущего одним проходом cells_to_parent + reduceat.
+    Параметры:
+        hexagons (np.ndarray): Ячейки одного уровня (uint64)
+        columns (dict): Метрики ячеек {название: числовой массив той же длины}; названия cells и res
+            заняты служебными столбцами
+        min_res (int): Самый крупный уровень пирамиды
+        how (dict): Свертка метрик {название: 'sum' | 'mean' | 'min' | 'max'} (по умолчанию 'sum');
+            'mean' - среднее по ячейкам самого мелкого уровня
+    Возвращает:
+        HexPyramid: Пирамида уровней от min_res до уровня покрытия
+    """
+    table = HexTable(hexagons, columns)
+    for name in PYRAMID_COLUMNS:
+        if name in table:
+            raise ValueError(f'Column name {name!r} is reserved in the pyramid')
+
+    max_res = table.resolution()
+    if max_res is None:
+        if len(table):
+            raise ValueError('Hexagons must have a single resolution (uncompact the coverage first)')
+        return HexPyramid({})
+
+    how = {name: (how or {}).get(name, 'sum') for name in table.names}
+    for name, method in how.items():
+        if method not in ROLLUPS:
+            raise ValueError(f'Unknown rollup for {name}: {method}')
+
+    # Среднее сворачивается как сумма и делится на число мелких ячеек в конце
+    reduce_how = {name: 'sum' if method == 'mean' else method for name, method in how.items()}
+    reduce_how['cells'] = 'sum'
+    columns = {
+        name: values.astype(np.float64) if how[name] == 'mean' else values for name, values in table.columns.items()
+    }
+    columns['cells'] = np.ones(len(table), dtype=np.int64)
+
+    cells = table.cells
+    levels = {max_res: columns}
+    cell_levels = {max_res: cells}
+    for res in range(max_res - 1, min_res - 1, -1):
+        cells, columns = rollup(cells, columns, res, reduce_how)
+        levels[res], cell_levels[res] = columns, cells
+
+    tables = {}
+    for res, columns in levels.items():
+        columns = dict(columns)
+        for name, method in how.items():
+            if method == 'mean':
+                columns[name] = columns[name] / columns['cells']
+        tables[res] = HexTable(cell_levels[res], columns)
+
+    return HexPyramid(tables)
@@ -0,0 +1,426 @@
+#!python 3.13
+# Локальный HTTP-сервис аналитики по гексагонам: граница города, набор ячеек и метрики по ячейкам
+# в GeoJSON или двоичном виде. Готовые ответы лежат в LRU-кеше с ограничением по байтам,
+# построение идет в пуле процессов, а одинаковые запросы во время построения ждут один расчет.
+#
+#     python service.py --port 8000 --offline
+#     curl http://127.0.0.1:8000/cities/Краснодар/9/hexagons?format=bin
+#
+# Маршруты:
+#     /cities/<город>/boundary                                  GeoJSON границы
+#     /cities/<город>/<res>/hexagons?format=geojson|bin|ids     ячейки (bin - uint64 little-endian,
+#                                                               ids - hex_index.encode_cells)
+#     /cities/<город>/<res>/metrics?format=geojson|parquet      таблица hex_tables/<город>_<res>.parquet
+#     /stats                                                    счетчики кеша и пула
+
+import argparse
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+# Ограничение кеша ответов по умолчанию
+CACHE_BYTES = 256 * 1024 ** 2
+
+# Форматы ответов по маршрутам (первый - по умолчанию)
+FORMATS = {
+    'boundary': ('geojson',),
+    'hexagons': ('geojson', 'bin', 'ids'),
+    'metrics': ('geojson', 'parquet'),
+}
+
+CONTENT_TYPES = {
+    'geojson': 'application/geo+json',
+    'bin': 'application/octet-stream',
+    'ids': 'application/octet-stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class ResponseCache:
+    """
+    LRU-кеш готовых ответов с ограничением суммарного размера в байтах. Потокобезопасен.
+    """
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        """
+        Параметры:
+            max_bytes (int): Наибольший суммарный размер ответов
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Параметры:
+            key (tuple): Ключ запроса
+        Возвращает:
+            tuple | None: (тело, тип содержимого) или None
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key, item):
+        """
+        Кладет ответ; самые давние ответы вытесняются, пока размер не войдет в предел.
+        Ответ больше всего кеша не сохраняется.
+        Параметры:
+            key (tuple): Ключ запроса
+            item (tuple): (тело bytes, тип содержимого)
+        """
+        body_size = len(item[0])
+        if body_size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._items:
+                self.size -= len(self._items.pop(key)[0])
+            self._items[key] = item
+            self.size += body_size
+            while self.size > self.max_bytes:
+                _, (body, _) = self._items.popitem(last=False)
+                self.size -= len(body)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'items': len(self._items), 'bytes': self.size, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+            }
+
+
+def build_boundary(city_name, admin_level='6', offline=False):
+    """
+    GeoJSON границы города. Выполняется в процессе пула.
+    Параметры:
+        city_name (str): Название города на русском языке
+        admin_level (str): Уровень административного деления OSM
+        offline (bool): Брать границы только из хранилища и cache/
+    Возвращает:
+        tuple: (тело bytes, тип содержимого)
+    """
+    from boundary_store import BoundaryStore
+    from main import get_city_boundary
+
+    city_gdf = get_city_boundary(city_name, admin_level, store=BoundaryStore(), offline=offline)
+    if city_gdf.empty:
+        raise LookupError(f'{city_name}: boundary not found')
+
+    return city_gdf.to_json(ensure_ascii=False).encode('utf-8'), CONTENT_TYPES['geojson']
+
+
+def build_hexagons(city_name, res, fmt='geojson', admin_level='6', offline=False):
+    """
+    Ячейки покрытия города по границе из хранилища. Выполняется в процессе пула.
+    Параметры:
+        city_name (str): Название города на русском языке
+        res (int): Уровень детализации H3
+        fmt (str): 'geojson', 'bin' (uint64 little-endian) или 'ids' (encode_cells)
+        admin_level (str): Уровень административного деления OSM
+        offline (bool): Брать границы только из хранилища и cache/
+    Возвращает:
+        tuple: (тело bytes, тип содержимого)
+    """
+    from boundary_store import BoundaryStore, boundary_to_geojson
+    from hex_index import encode_cells
+    from main import get_city_boundary, hexagons_to_geojson, polyfill
+    from polyfill_cache import PolyfillCache
+
+    store = BoundaryStore()
+    geoJson = store.get_geojson(city_name, admin_level)
+    if geoJson is None:
+        # Границы еще нет в хранилище - загружаем так же, как для /boundary (с сохранением в хранилище)
+        city_gdf = get_city_boundary(city_name, admin_level, store=store, offline=offline)
+        if city_gdf.empty:
+            raise LookupError(f'{city_name}: boundary not found')
+        geoJson = boundary_to_geojson(city_gdf)
+
+    hexagons = polyfill(geoJson, res=res, workers=1, cache=PolyfillCache())
+    if fmt == 'bin':
+        body = hexagons.astype('<u8').tobytes()
+    elif fmt == 'ids':
+        body = encode_cells(hexagons)
+    else:
+        body = json.dumps(hexagons_to_geojson(hexagons), separators=(',', ':')).encode('utf-8')
+
+    return body, CONTENT_TYPES[fmt]
+
+
+def build_metrics(city_name, res, fmt='geojson'):
+    """
+    Метрики по ячейкам из таблицы атрибутов города. Выполняется в процессе пула.
+    Параметры:
+        city_name (str): Название города на русском языке
+        res (int): Уровень детализации H3
+        fmt (str): 'geojson' (ячейки со свойствами) или 'parquet' (файл таблицы)
+    Возвращает:
+        tuple: (тело bytes, тип содержимого)
+    """
+    import numpy as np
+
+    from hex_table import HexTable, hex_table_path
+    from main import hexagons_to_geojson
+
+    path = hex_table_path(city_name, res)
+    if not path.exists():
+        raise LookupError(f'{path} not found')
+
+    if fmt == 'parquet':
+        return path.read_bytes(), CONTENT_TYPES['parquet']
+
+    table = HexTable.load(path)
+    # NaN нет в JSON, отсутствующие значения отдаются как null
+    properties = {
+        name: np.where(np.isnan(values), None, values) if values.dtype.kind == 'f' else values
+        for name, values in table.columns.items()
+    }
+    body = json.dumps(hexagons_to_geojson(table.cells, properties), separators=(',', ':'))
+    return body.encode('utf-8'), CONTENT_TYPES['geojson']
+
+
+def boundary_version(city_name, admin_level='6'):
+    """
+    Версия границы города в хранилище для ключа кеша.
+    Параметры:
+        city_name (str): Название города на русском языке
+        admin_level (str): Уровень административного деления OSM
+    Возвращает:
+        str | None: Хеш содержимого записи или None, если границы нет в хранилище
+    """
+    from boundary_store import BoundaryStore
+
+    return BoundaryStore().index.get(BoundaryStore.key(city_name, admin_level))
+
+
+def table_version(city_name, res):
+    """
+    Версия таблицы атрибутов города для ключа кеша.
+    Параметры:
+        city_name (str): Название города на русском языке
+        res (int): Уровень детализации H3
+    Возвращает:
+        int | None: Время изменения файла в наносекундах или None, если таблицы нет
+    """
+    from hex_table import hex_table_path
+
+    try:
+        return hex_table_path(city_name, res).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class HexService:
+    """
+    Кеш ответов и пул построения с объединением одинаковых запросов.
+    """
+
+    def __init__(self, workers=2, cache_bytes=CACHE_BYTES, offline=False):
+        """
+        Параметры:
+            workers (int): Процессы для построения ответов
+            cache_bytes (int): Предел кеша ответов в байтах
+            offline (bool): Не обращаться к сети за границами
+        """
+        self.offline = offline
+        self.cache = ResponseCache(cache_bytes)
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.builds = 0
+        self.coalesced = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def respond(self, kind, city_name, res=None, fmt=None):
+        """
+        Ответ на запрос: из кеша или после построения в пуле.
+        Параметры:
+            kind (str): 'boundary', 'hexagons' или 'metrics'
+            city_name (str): Название города на русском языке
+            res (int): Уровень детализации H3 (кроме boundary)
+            fmt (str): Формат ответа (None - по умолчанию для маршрута)
+        Возвращает:
+            tuple: (тело bytes, тип содержимого)
+        """
+        fmt = fmt or FORMATS[kind][0]
+        if fmt not in FORMATS[kind]:
+            raise ValueError(f'Unknown format for {kind}: {fmt}')
+
+        key = (kind, city_name, res, fmt)
+        if kind == 'metrics':
+            # Таблицу перезаписывают incremental.py и HexTable.save: время изменения файла
+            # в ключе не дает отдавать ответ по старой версии
+            key += (table_version(city_name, res),)
+        else:
+            # После повторного импорта границы в хранилище ее хеш меняется, и ответ строится заново
+            key += (boundary_version(city_name),)
+        item = self.cache.get(key)
+        if item is not None:
+            return item
+
+        started = False
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                if kind == 'boundary':
+                    future = self.pool.submit(build_boundary, city_name, offline=self.offline)
+                elif kind == 'hexagons':
+                    future = self.pool.submit(build_hexagons, city_name, res, fmt, offline=self.offline)
+                else:
+                    future = self.pool.submit(build_metrics, city_name, res, fmt)
+                self.builds += 1
+                self._inflight[key] = future
+                started = True
+            else:
+                self.coalesced += 1
+
+        # Вне блокировки: у готового future обработчик выполняется сразу в этом потоке,
+        # а _finish берет ту же блокировку
+        if started:
+            future.add_done_callback(lambda done: self._finish(key, done))
+
+        return future.result()
+
+    def _finish(self, key, future):
+        # Ответ попадает в кеш до снятия с построения, чтобы следующий запрос не запустил его снова.
+        # Без версии (граница только что импортирована в хранилище) ключ следующего запроса будет другим
+        if future.exception() is None and key[-1] is not None:
+            self.cache.put(key, future.result())
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {'cache': self.cache.stats(), 'builds': self.builds, 'coalesced': self.coalesced,
+                    'inflight': len(self._inflight)}
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+def parse_route(path):
+    """
+    Разбирает путь запроса.
+    Параметры:
+        path (str): Путь вида /cities/<город>/<res>/<ресурс>
+    Возвращает:
+        tuple | None: (ресурс, город, уровень детализации или None), None - неизвестный маршрут
+    """
+    parts = [unquote(part) for part in path.strip('/').split('/')]
+    if len(parts) == 3 and parts[0] == 'cities' and parts[2] == 'boundary':
+        return 'boundary', parts[1], None
+    if len(parts) == 4 and parts[0] == 'cities' and parts[3] in ('hexagons', 'metrics') and parts[2].isdigit():
+        res = int(parts[2])
+        if 0 <= res <= 15:
+            return parts[3], parts[1], res
+    return None
+
+
+def make_handler(service):
+    """
+    Класс обработчика запросов к сервису.
+    Параметры:
+        service (HexService): Сервис
+    Возвращает:
+        type: Подкласс BaseHTTPRequestHandler
+    """
+
+    class HexHandler(BaseHTTPRequestHandler):
+        # Соединение остается открытым между запросами (Content-Length задан всегда)
+        protocol_version = 'HTTP/1.1'
+        # Заголовки и тело уходят разными записями; с алгоритмом Нейгла ответ ждал бы ACK (~40 ms)
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass  # Без строки в консоли на каждый запрос
+
+        def send_body(self, code, body, content_type='application/json'):
+            if isinstance(body, str):
+                body = body.encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_error_json(self, code, message):
+            self.send_body(code, json.dumps({'error': message}, ensure_ascii=False))
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/stats':
+                self.send_body(200, json.dumps(service.stats()))
+                return
+
+            route = parse_route(url.path)
+            if route is None:
+                self.send_error_json(404, 'not found')
+                return
+
+            kind, city_name, res = route
+            fmt = parse_qs(url.query).get('format', [None])[0]
+            try:
+                body, content_type = service.respond(kind, city_name, res, fmt)
+            except ValueError as e:
+                self.send_error_json(400, str(e))
+            except LookupError as e:
+                self.send_error_json(404, str(e))
+            except Exception as e:
+                self.send_error_json(500, repr(e))
+            else:
+                self.send_body(200, body, content_type)
+
+    return HexHandler
+
+
+def serve(port=8000, workers=2, cache_bytes=CACHE_BYTES, offline=False, host='127.0.0.1'):
+    """
+    Создает сервер (запуск - serve_forever, в замерах - в отдельном потоке).
+    Параметры:
+        port (int): Порт (0 - любой свободный)
+        workers (int): Процессы для построения ответов
+        cache_bytes (int): Предел кеша ответов в байтах
+        offline (bool): Не обращаться к сети за границами
+        host (str): Адрес
+    Возвращает:
+        ThreadingHTTPServer: Сервер; сервис доступен как server.service
+    """
+    service = HexService(workers, cache_bytes, offline)
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.service = service
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP-сервис аналитики по гексагонам')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--workers', type=int, default=2, help='Процессы для построения ответов')
+    parser.add_argument('--cache-mb', type=int, default=CACHE_BYTES // 1024 ** 2, help='Предел кеша ответов, MB')
+    parser.add_argument('--offline', action='store_true', help='Брать границы только из хранилища и cache/')
+    args = parser.parse_args()
+
+    server = serve(args.port, args.workers, args.cache_mb * 1024 ** 2, args.offline, args.host)
+    print(f'http://{args.host}:{server.server_port}/cities/<город>/<res>/hexagons')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.service.close()
+
+
+if __name__ == "__main__":
+    main()
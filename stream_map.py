@@ -0,0 +1,207 @@
+#!python 3.13
+# Сохранение больших карт без сборки всего HTML в памяти.
+# folium рендерит страницу целиком в одну строку, и для сотен тысяч ячеек пик памяти в разы больше файла.
+# Здесь данные слоев GeoJson заменяются одним объектом-заглушкой, folium рендерит короткую страницу
+# (тот же шаблон, стили, подсказки и панель слоев), а объекты пишутся в файл на место заглушки
+# порциями из генераторов. Память ограничена размером порции и не растет с числом ячеек.
+#
+# Пример:
+#     save_streaming_map(city_gdf, hexagons, 'output_map.html')
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from hex_index import cells_to_uint64
+
+# Объектов в одной порции записи
+CHUNK_SIZE = 10_000
+
+# Замена символов, как в фильтре tojson Jinja: данные безопасно встраиваются в <script>
+HTML_SAFE = str.maketrans({'<': '\\u003c', '>': '\\u003e', '&': '\\u0026', "'": '\\u0027'})
+
+
+def hexagon_features(hexagons, properties=None, chunk_size=CHUNK_SIZE):
+    """
+    Генератор объектов GeoJSON для ячеек: контуры считаются порциями, а не для всего покрытия сразу.
+    Параметры:
+        hexagons (np.ndarray): H3 идентификаторы (uint64)
+        properties (dict): Дополнительные свойства ячеек {название: массив той же длины}
+        chunk_size (int): Ячеек в порции
+    Возвращает:
+        generator: Объекты Feature в формате hexagons_to_geojson
+    """
+    from main import hexagons_to_geojson
+
+    hexagons = cells_to_uint64(hexagons)
+    properties = {name: np.asarray(values) for name, values in (properties or {}).items()}
+
+    for start in range(0, len(hexagons), chunk_size):
+        stop = start + chunk_size
+        chunk = hexagons_to_geojson(
+            hexagons[start:stop], {name: values[start:stop] for name, values in properties.items()}
+        )
+        yield from chunk['features']
+
+
+class StreamingMap:
+    """
+    Карта folium, у которой данные выбранных слоев GeoJson пишутся в файл потоком.
+    Стиль слоя (style_function) вычисляется один раз по заглушке, поэтому он должен быть
+    одинаковым для всех объектов слоя.
+    """
+
+    def __init__(self, base_map):
+        """
+        Параметры:
+            base_map (folium.Map): Карта со всеми слоями и элементами управления
+        """
+        self.base_map = base_map
+        self.streams = {}
+
+    def attach(self, layer, features):
+        """
+        Заменяет данные слоя заглушкой; при сохранении на ее место будут записаны объекты из features.
+        Параметры:
+            layer (folium.GeoJson): Слой с данными FeatureCollection (достаточно одного объекта-образца)
+            features (iterable): Объекты Feature (генератор читается один раз при сохранении)
+        Возвращает:
+            folium.GeoJson: Тот же слой
+        """
+        key = f'__stream_{len(self.streams)}__'
+        sample = layer.data['features'][0] if layer.data.get('features') else {}
+
+        # Заглушка без скобок внутри: ее границы в HTML - ближайшие [ и ] вокруг ключа.
+        # Свойства нужны для проверки полей подсказки, значения - нет
+        layer.data = {
+            **{name: value for name, value in layer.data.items() if name != 'features'},
+            'features': [{
+                'type': 'Feature',
+                'id': key,
+                'geometry': None,
+                'properties': {name: None for name in sample.get('properties', {})},
+            }],
+        }
+        self.streams[key] = features
+        return layer
+
+    def save(self, path, chunk_size=CHUNK_SIZE):
+        """
+        Сохраняет карту: страница без данных рендерится folium, объекты слоев дописываются порциями.
+        Параметры:
+            path (str | Path): Путь к HTML-файлу
+            chunk_size (int): Объектов в одной порции записи
+        Возвращает:
+            Path: Путь к сохраненному файлу
+        """
+        html = self.base_map.get_root().render()
+
+        # Разрезаем страницу по заглушкам в порядке их появления
+        parts = []
+        for key in sorted(self.streams, key=lambda key: html.index(f'"{key}"')):
+            position = html.index(f'"{key}"')
+            start = html.rindex('[', 0, position) + 1
+            end = html.index(']', position)
+            parts.append((start, end, key))
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp.html')
+
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            written = 0
+            for start, end, key in parts:
+                file.write(html[written:start])
+                self.write_features(file, self.streams[key], chunk_size)
+                written = end
+            file.write(html[written:])
+
+        os.replace(tmp_path, path)
+        return path
+
+    @staticmethod
+    def write_features(file, features, chunk_size=CHUNK_SIZE):
+        """
+        Пишет объекты через запятую порциями (один вызов json.dumps на порцию) в том же виде, что и tojson.
+        Параметры:
+            file (TextIO): Открытый файл
+            features (iterable): Объекты Feature
+            chunk_size (int): Объектов в порции
+        Возвращает:
+            int: Количество записанных объектов
+        """
+        count = 0
+        chunk = []
+        for feature in features:
+            chunk.append(feature)
+            if len(chunk) == chunk_size:
+                file.write((',' if count else '') + json.dumps(chunk, sort_keys=True)[1:-1].translate(HTML_SAFE))
+                count += len(chunk)
+                chunk = []
+
+        if chunk:
+            file.write((',' if count else '') + json.dumps(chunk, sort_keys=True)[1:-1].translate(HTML_SAFE))
+            count += len(chunk)
+
+        return count
+
+
+def find_geojson_layer(element, name):
+    """
+    Ищет слой folium.GeoJson по имени среди потомков элемента.
+    Параметры:
+        element (branca.element.Element): Карта или группа слоев
+        name (str): Имя слоя
+    Возвращает:
+        folium.GeoJson | None: Найденный слой
+    """
+    import folium  # Визуализация на карте
+
+    for child in element._children.values():
+        if isinstance(child, folium.GeoJson) and child.layer_name == name:
+            return child
+        found = find_geojson_layer(child, name)
+        if found is not None:
+            return found
+
+    return None
+
+
+def save_streaming_map(city_gdf, hexagons, path, properties=None, chunk_size=CHUNK_SIZE):
+    """
+    Сохраняет карту границ города с гексагонами (как main.py), не собирая HTML целиком в памяти.
+    Параметры:
+        city_gdf (GeoDataFrame): Границы города
+        hexagons (np.ndarray): H3 идентификаторы (uint64)
+        path (str | Path): Путь к HTML-файлу
+        properties (dict): Дополнительные свойства ячеек для подсказки {название: массив той же длины}
+        chunk_size (int): Объектов в одной порции записи
+    Возвращает:
+        Path: Путь к сохраненному файлу
+    """
+    import folium  # Визуализация на карте
+
+    from main import render_hexagons_geojson, visualize_city_boundary
+
+    hexagons = cells_to_uint64(hexagons)
+    properties = {name: np.asarray(values) for name, values in (properties or {}).items()}
+
+    city_map = visualize_city_boundary(city_gdf)
+
+    # Слой гексагонов строится по одной ячейке-образцу, остальные пишутся потоком
+    layer_hexagon = folium.FeatureGroup(name='Гексагоны', show=True)
+    layer_hexagon.add_to(city_map)
+    hexagon_layer = render_hexagons_geojson(
+        hexagons[:1], layer_hexagon, {name: values[:1] for name, values in properties.items()}
+    )
+    folium.LayerControl().add_to(city_map)
+
+    stream = StreamingMap(city_map)
+    boundary_layer = find_geojson_layer(city_map, 'Границы города')
+    if boundary_layer is not None and not city_gdf.empty:
+        stream.attach(boundary_layer, city_gdf.iterfeatures(na='null', show_bbox=True))
+    stream.attach(hexagon_layer, hexagon_features(hexagons, properties, chunk_size))
+
+    return stream.save(path, chunk_size)
@@ -0,0 +1,113 @@
+# Проверки битовых операций и кодирования наборов ячеек из hex_index
+
+import h3.api.numpy_int as h3_int
+import numpy as np
+import pytest
+
+from hex_index import (
+    cells_resolution, cells_to_center_child, cells_to_parent, compact, decode_cells, encode_cells,
+    hex_index_contains, latlng_to_cells, uncompact,
+)
+
+# Центр Краснодара
+LAT, LNG = 45.035, 38.975
+
+
+def sample_cells(res, count=500, seed=0):
+    rng = np.random.default_rng(seed)
+    lat = LAT + rng.uniform(-0.2, 0.2, count)
+    lng = LNG + rng.uniform(-0.2, 0.2, count)
+    return np.unique(latlng_to_cells(lat, lng, res))
+
+
+def disk(res, k=6):
+    return np.sort(h3_int.grid_disk(h3_int.latlng_to_cell(LAT, LNG, res), k))
+
+
+def test_latlng_to_cells_matches_h3():
+    lat = np.array([LAT, -33.9, 0.0])
+    lng = np.array([LNG, 151.2, 0.0])
+    expected = [h3_int.latlng_to_cell(y, x, 9) for y, x in zip(lat, lng)]
+
+    cells = latlng_to_cells(lat, lng, 9)
+    assert cells.dtype == np.uint64
+    assert cells.tolist() == expected
+
+
+@pytest.mark.parametrize('res', [0, 5, 9, 15])
+def test_encode_decode_round_trip(res):
+    cells = sample_cells(res)
+    data = encode_cells(cells)
+
+    assert isinstance(data, bytes)
+    np.testing.assert_array_equal(decode_cells(data), cells)
+
+
+def test_encode_decode_empty():
+    assert encode_cells(np.empty(0, dtype=np.uint64)) == b''
+    decoded = decode_cells(b'')
+    assert decoded.dtype == np.uint64 and len(decoded) == 0
+
+
+def test_encode_is_compact_for_neighbours():
+    cells = disk(10)
+    assert len(encode_cells(cells)) < 8 * len(cells) / 2
+
+
+@pytest.mark.parametrize('res, parent_res', [(10, 10), (10, 9), (10, 6), (15, 0), (5, 1)])
+def test_cells_to_parent_matches_h3(res, parent_res):
+    cells = sample_cells(res)
+    expected = [h3_int.cell_to_parent(cell, parent_res) for cell in cells]
+
+    parents = cells_to_parent(cells, parent_res)
+    assert parents.tolist() == expected
+    assert (cells_resolution(parents) == parent_res).all()
+
+
+def test_cells_to_parent_rejects_coarser_cells():
+    with pytest.raises(ValueError):
+        cells_to_parent(sample_cells(5), 6)
+
+
+@pytest.mark.parametrize('res, child_res', [(6, 6), (6, 7), (6, 11), (0, 15), (9, 10)])
+def test_cells_to_center_child_matches_h3(res, child_res):
+    cells = sample_cells(res)
+    expected = [h3_int.cell_to_center_child(cell, child_res) for cell in cells]
+
+    assert cells_to_center_child(cells, child_res).tolist() == expected
+
+
+def test_cells_to_center_child_mixed_resolutions():
+    cells = np.concatenate([sample_cells(5, 50), sample_cells(8, 50)])
+    expected = [h3_int.cell_to_center_child(cell, 10) for cell in cells]
+
+    assert cells_to_center_child(cells, 10).tolist() == expected
+
+
+def test_cells_to_center_child_rejects_finer_cells():
+    with pytest.raises(ValueError):
+        cells_to_center_child(sample_cells(9), 8)
+
+
+def test_compact_uncompact_round_trip():
+    cells = disk(9, k=20)
+    compacted = compact(cells)
+
+    assert len(compacted) < len(cells)
+    assert cells_resolution(compacted).min() < 9
+    np.testing.assert_array_equal(uncompact(compacted, 9), cells)
+
+
+def test_uncompact_empty():
+    assert len(uncompact(np.empty(0, dtype=np.uint64), 9)) == 0
+
+
+def test_hex_index_contains():
+    index = disk(9)
+    outside = disk(9, k=8)
+    outside = outside[~np.isin(outside, index)]
+    cells = np.concatenate([index[::7], outside, [np.uint64(0xFFFFFFFFFFFFFFFF)]])
+
+    mask = hex_index_contains(index, cells)
+    np.testing.assert_array_equal(mask, np.isin(cells, index))
+    assert not hex_index_contains(np.empty(0, dtype=np.uint64), cells).any()
@@ -0,0 +1,103 @@
+# Проверки таблицы атрибутов ячеек: соединения, зарезервированные названия и Parquet
+
+import h3.api.numpy_int as h3_int
+import numpy as np
+import pandas as pd
+import pytest
+
+from hex_table import HexTable
+
+CELLS = np.sort(h3_int.grid_disk(h3_int.latlng_to_cell(45.035, 38.975, 9), 3))
+
+
+def tables():
+    left = HexTable(CELLS[:20], {'shops': np.arange(20, dtype=np.float64), 'name': np.arange(20)})
+    right = HexTable(CELLS[10:30], {'events': np.arange(100, 120, dtype=np.float64), 'name': np.arange(20) * 10})
+    return left, right
+
+
+def expected_join(left, right, how):
+    frame = pd.merge(
+        left.to_frame().drop(columns='h3'), right.to_frame().drop(columns='h3'),
+        on='cell', how=how, suffixes=('', '_right'), sort=True
+    )
+    return frame.reset_index(drop=True)
+
+
+@pytest.mark.parametrize('how', ['left', 'inner', 'outer'])
+def test_join_matches_pandas_merge(how):
+    left, right = tables()
+    joined = left.join(right, how=how)
+    expected = expected_join(left, right, how)
+
+    np.testing.assert_array_equal(joined.cells, expected['cell'].to_numpy(dtype=np.uint64))
+    assert joined.names == ['shops', 'name', 'events', 'name_right']
+    for name in joined.names:
+        np.testing.assert_array_equal(joined[name].astype(np.float64), expected[name].to_numpy(dtype=np.float64))
+
+
+def test_join_left_keeps_left_cells():
+    left, right = tables()
+    joined = left.join(right, fill=0)
+
+    np.testing.assert_array_equal(joined.cells, left.cells)
+    assert (joined['events'][:10] == 0).all()
+
+
+def test_join_rejects_duplicate_columns():
+    left, right = tables()
+    with pytest.raises(ValueError):
+        left.join(right, suffix=None)
+
+    # Переименованный суффиксом столбец совпадает с уже существующим
+    left.add_column('name_right', np.zeros(len(left)))
+    with pytest.raises(ValueError):
+        left.join(right)
+
+
+def test_join_unknown_type():
+    left, right = tables()
+    with pytest.raises(ValueError):
+        left.join(right, how='cross')
+
+
+@pytest.mark.parametrize('name', ['cell', 'h3'])
+def test_reserved_column_names(name):
+    with pytest.raises(ValueError):
+        HexTable(CELLS, {name: np.zeros(len(CELLS))})
+    with pytest.raises(ValueError):
+        HexTable(CELLS).add_column(name, np.zeros(len(CELLS)))
+
+
+def test_from_frame_skips_key_columns():
+    left, _ = tables()
+    table = HexTable.from_frame(left.to_frame())
+
+    np.testing.assert_array_equal(table.cells, left.cells)
+    assert table.names == left.names
+
+
+def test_constructor_sorts_and_rejects_repeats():
+    order = np.arange(len(CELLS))[::-1]
+    table = HexTable(CELLS[order], {'value': order})
+    np.testing.assert_array_equal(table.cells, CELLS)
+    np.testing.assert_array_equal(table['value'], np.arange(len(CELLS)))
+
+    with pytest.raises(ValueError):
+        HexTable(np.concatenate([CELLS, CELLS[:1]]))
+
+
+def test_parquet_round_trip(tmp_path):
+    left, right = tables()
+    table = left.join(right, how='outer')
+    path = table.save(tmp_path / 'city_9.parquet')
+
+    loaded = HexTable.load(path)
+    np.testing.assert_array_equal(loaded.cells, table.cells)
+    assert loaded.cells.dtype == np.uint64
+    assert loaded.names == table.names
+    for name in table.names:
+        np.testing.assert_array_equal(loaded[name], table[name])
+
+    partial = HexTable.load(path, columns=['events'])
+    assert partial.names == ['events']
@@ -0,0 +1,37 @@
+# Проверки обращений к внутренним функциям OSMnx
+
+import osmnx as ox
+import pytest
+
+import osmnx_compat
+from osmnx_compat import features_from_responses, load_osmnx
+
+def response():
+    # _create_gdf изменяет элементы ответа, поэтому ответ каждый раз новый
+    return {
+        'elements': [
+            {'type': 'node', 'id': 1, 'lat': 45.0, 'lon': 39.0, 'tags': {'shop': 'bakery'}},
+            {'type': 'node', 'id': 2, 'lat': 45.1, 'lon': 39.1, 'tags': {'amenity': 'bench'}},
+        ]
+    }
+
+
+def test_features_from_responses():
+    gdf = features_from_responses([response()], {'shop': True})
+    assert list(gdf.index) == [('node', 1)]
+    assert features_from_responses([{'elements': []}], {'shop': True}).empty
+
+
+@pytest.mark.parametrize('version', ['1.9.4', '3.0.0'])
+def test_unsupported_version(monkeypatch, version):
+    monkeypatch.setattr(osmnx_compat, '_checked', False)
+    monkeypatch.setattr(ox, '__version__', version)
+    with pytest.raises(RuntimeError, match=version):
+        load_osmnx()
+
+
+def test_missing_private_function(monkeypatch):
+    monkeypatch.setattr(osmnx_compat, '_checked', False)
+    monkeypatch.delattr(ox.features, '_create_gdf')
+    with pytest.raises(RuntimeError, match='_create_gdf'):
+        load_osmnx()
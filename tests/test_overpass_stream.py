@@ -0,0 +1,60 @@
+# Проверки потокового разбора ответов Overpass и согласованности фильтров границ
+
+import io
+import json
+
+import geopandas as gpd
+import pytest
+from shapely.geometry import Point
+
+from boundary_store import filter_city_boundary
+from overpass_stream import boundary_matcher, iter_elements, tags_matcher
+
+NAMES = ['Краснодар', 'городской округ Краснодар', 'Сочи (городской округ)', 'г. Сочи', 'Сочи', 'Анапа']
+
+
+@pytest.mark.parametrize('city_name', ['Краснодар', 'Сочи (городской округ)', 'г. Сочи', 'С.чи', '(Сочи'])
+def test_boundary_matcher_agrees_with_filter(city_name):
+    tags = [{'boundary': 'administrative', 'admin_level': '6', 'name': name} for name in NAMES]
+    gdf = gpd.GeoDataFrame(tags, geometry=[Point(0, 0)] * len(tags), crs='EPSG:4326')
+
+    match = boundary_matcher(city_name)
+    streamed = [element_tags['name'] for element_tags in tags if match(element_tags)]
+    assert streamed == filter_city_boundary(gdf, city_name)['name'].tolist()
+
+
+def test_boundary_matcher_checks_level_and_type():
+    match = boundary_matcher('Сочи')
+    assert match({'boundary': 'administrative', 'admin_level': '6', 'name': 'Сочи'})
+    assert not match({'boundary': 'administrative', 'admin_level': '8', 'name': 'Сочи'})
+    assert not match({'boundary': 'postal_code', 'admin_level': '6', 'name': 'Сочи'})
+    assert not match({'boundary': 'administrative', 'admin_level': '6'})
+
+
+def test_tags_matcher():
+    match = tags_matcher({'shop': True, 'amenity': ['cafe', 'bank'], 'building': 'house'})
+    assert match({'shop': 'bakery'})
+    assert match({'amenity': 'bank'})
+    assert not match({'amenity': 'school', 'building': 'yes'})
+    assert match({'building': 'house'})
+
+
+@pytest.mark.parametrize('read_size', [1, 7, 64, 1 << 16])
+def test_iter_elements_across_chunk_boundaries(read_size):
+    response = {
+        'version': 0.6,
+        'osm3s': {'timestamp_osm_base': '2025-01-01T00:00:00Z'},
+        'elements': [
+            {'type': 'node', 'id': 1, 'lat': 45.0612345, 'lon': 38.9654321, 'tags': {'name': 'a "b" ] }'}},
+            {'type': 'way', 'id': 2, 'nodes': [1, 1]},
+        ],
+    }
+    header = {}
+    elements = list(iter_elements(io.StringIO(json.dumps(response, ensure_ascii=False)), header, read_size))
+
+    assert elements == response['elements']
+    assert header == {'version': 0.6, 'osm3s': response['osm3s']}
+
+
+def test_iter_elements_skips_non_objects():
+    assert list(iter_elements(io.StringIO('[{"place_id": 1}]'))) == []
@@ -0,0 +1,65 @@
+# Проверки счетчика трафика: подмена requests только на время этапа и потоковые ответы
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from profiling import RunProfiler
+
+BODY = b'x' * 5000
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        if self.path == '/chunked':
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self.wfile.write(b'%x\r\n' % len(BODY) + BODY + b'\r\n0\r\n\r\n')
+        else:
+            self.send_header('Content-Length', str(len(BODY)))
+            self.end_headers()
+            self.wfile.write(BODY)
+
+
+@pytest.fixture(scope='module')
+def url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+
+
+def test_stage_counts_traffic_and_restores_send(url):
+    send = requests.Session.send
+    profiler = RunProfiler(verbose=False)
+
+    with profiler.stage('net'):
+        assert requests.Session.send is not send
+        streamed = requests.get(f'{url}/', stream=True)
+        assert not streamed._content_consumed  # Счетчик не дочитывает потоковый ответ
+        requests.get(f'{url}/chunked')
+        streamed.close()
+
+    assert requests.Session.send is send
+    assert profiler.stages[0]['net_requests'] == 2
+    assert profiler.stages[0]['net_bytes_received'] == 2 * len(BODY)
+
+
+def test_send_restored_after_error(url):
+    send = requests.Session.send
+    profiler = RunProfiler(verbose=False)
+
+    with pytest.raises(KeyError):
+        with profiler.stage('error'):
+            raise KeyError('stage')
+
+    assert requests.Session.send is send
+    assert profiler.stages[0]['error'] == "KeyError('stage')"
+    requests.get(url)
+    assert profiler.stages[0]['net_requests'] == 0
@@ -0,0 +1,84 @@
+# Проверки пирамиды уровней: свертки совпадают с группировкой по cells_to_parent
+
+import h3.api.numpy_int as h3_int
+import numpy as np
+import pandas as pd
+import pytest
+
+from hex_index import cells_to_parent
+from pyramid import HexPyramid, build_pyramid
+
+RES = 10
+HEXAGONS = np.sort(h3_int.grid_disk(h3_int.latlng_to_cell(45.035, 38.975, RES), 15))
+HOW = {'events': 'sum', 'speed': 'mean', 'low': 'min', 'high': 'max'}
+
+
+def metrics(seed=0):
+    rng = np.random.default_rng(seed)
+    n = len(HEXAGONS)
+    return {
+        'events': rng.integers(0, 100, n),
+        'speed': rng.uniform(0, 60, n),
+        'low': rng.normal(size=n),
+        'high': rng.normal(size=n),
+    }
+
+
+@pytest.mark.parametrize('res', [RES, RES - 1, RES - 2, 6])
+def test_rollups_match_groupby(res):
+    columns = metrics()
+    pyramid = build_pyramid(HEXAGONS, columns, min_res=6, how=HOW)
+
+    frame = pd.DataFrame({'parent': cells_to_parent(HEXAGONS, res), **columns})
+    expected = frame.groupby('parent').agg(
+        events=('events', 'sum'), speed=('speed', 'mean'), low=('low', 'min'), high=('high', 'max'),
+        cells=('events', 'size'),
+    )
+
+    table = pyramid.level(res)
+    np.testing.assert_array_equal(table.cells, expected.index.to_numpy(dtype=np.uint64))
+    for name in [*HOW, 'cells']:
+        np.testing.assert_allclose(table[name], expected[name].to_numpy())
+
+
+def test_levels_and_default_rollup():
+    pyramid = build_pyramid(HEXAGONS, {'events': metrics()['events']}, min_res=7)
+
+    assert pyramid.resolutions == [7, 8, 9, 10]
+    for res in pyramid.resolutions:
+        assert pyramid.level(res)['events'].sum() == metrics()['events'].sum()
+        assert pyramid.level(res)['cells'].sum() == len(HEXAGONS)
+    with pytest.raises(ValueError):
+        pyramid.level(5)
+
+
+@pytest.mark.parametrize('name', ['cells', 'res'])
+def test_reserved_column_names(name):
+    with pytest.raises(ValueError):
+        build_pyramid(HEXAGONS, {name: np.ones(len(HEXAGONS))}, min_res=8)
+
+
+def test_unknown_rollup():
+    with pytest.raises(ValueError):
+        build_pyramid(HEXAGONS, metrics(), min_res=8, how={'events': 'median'})
+
+
+def test_lookup_across_levels():
+    pyramid = build_pyramid(HEXAGONS, metrics(), min_res=8, how=HOW)
+    cells = np.concatenate([pyramid.level(8).cells[:3], pyramid.level(10).cells[:3], [np.uint64(0)]])
+
+    values = pyramid.lookup(cells, 'events')
+    np.testing.assert_array_equal(values[:3], pyramid.level(8)['events'][:3])
+    np.testing.assert_array_equal(values[3:6], pyramid.level(10)['events'][:3])
+    assert np.isnan(values[6])
+
+
+def test_parquet_round_trip(tmp_path):
+    pyramid = build_pyramid(HEXAGONS, metrics(), min_res=6, how=HOW)
+    loaded = HexPyramid.load(pyramid.save(tmp_path / 'city_10_pyramid.parquet'))
+
+    assert loaded.resolutions == pyramid.resolutions
+    for res in pyramid.resolutions:
+        np.testing.assert_array_equal(loaded.level(res).cells, pyramid.level(res).cells)
+        for name in pyramid.level(res).names:
+            np.testing.assert_array_equal(loaded.level(res)[name], pyramid.level(res)[name])
@@ -0,0 +1,250 @@
+#!python 3.13
+# Выгрузка слоя гексагонов статическими тайлами вместо одного большого HTML.
+# Для каждого диапазона масштабов ячейки сводятся к своему уровню детализации и раскладываются
+# по файлам GeoJSON, сгруппированным по родительской ячейке H3. Страница подгружает только тайлы в окне.
+# Страницу нужно открывать через HTTP-сервер (например, python -m http.server), а не как file://.
+
+import json
+from pathlib import Path
+
+import folium  # Визуализация на карте
+import numpy as np
+from branca.element import MacroElement
+from jinja2 import Template
+
+from hex_index import cells_resolution, cells_to_parent, cells_to_str, cells_to_uint64, hex_index_contains
+from main import cells_to_boundary_array, hexagons_to_geojson
+
+# (минимальный масштаб Leaflet, уровень детализации H3): при каждом масштабе ребро ячейки - 10-30 пикселей
+ZOOM_LEVELS = [(0, 5), (10, 6), (11, 7), (13, 8), (14, 9), (15, 10), (17, 11)]
+
+# Родитель тайла на столько уровней крупнее ячеек: до 7^3 = 343 ячеек в тайле
+BUCKET_DEPTH = 3
+
+
+def parents_clamped(cells, res):
+    """
+    Сводит ячейки к уровню res; ячейки, которые уже крупнее (в сжатом покрытии), остаются как есть.
+    Параметры:
+        cells (np.ndarray): H3 идентификаторы (uint64)
+        res (int): Уровень детализации
+    Возвращает:
+        np.ndarray: Ячейки (uint64) той же длины
+    """
+    cells = cells_to_uint64(cells).copy()
+    finer = cells_resolution(cells) > res
+    cells[finer] = cells_to_parent(cells[finer], res)
+    return cells
+
+
+def tile_ranges(max_res, zoom_levels=ZOOM_LEVELS):
+    """
+    Диапазоны масштабов с уровнями детализации не мельче самого покрытия.
+    Параметры:
+        max_res (int): Уровень детализации покрытия
+        zoom_levels (list): Пары (минимальный масштаб, уровень детализации)
+    Возвращает:
+        list: Пары (минимальный масштаб, уровень детализации)
+    """
+    # Уровни мельче самого покрытия сливаются с последним доступным
+    ranges = []
+    for min_zoom, res in zoom_levels:
+        res = min(res, max_res)
+        if not ranges or ranges[-1][1] != res:
+            ranges.append((min_zoom, res))
+
+    return ranges
+
+
+def write_tiles(cells, res, out_dir):
+    """
+    Записывает ячейки одного уровня в файлы тайлов по родительским ячейкам.
+    Параметры:
+        cells (np.ndarray): Ячейки уровня res (uint64, без повторов)
+        res (int): Уровень детализации тайлов
+        out_dir (Path): Папка с тайлами
+    Возвращает:
+        dict: {родитель тайла: рамка [юг, запад, север, восток]}
+    """
+    if len(cells) == 0:
+        return {}
+    buckets = parents_clamped(cells, max(res - BUCKET_DEPTH, 0))
+
+    # Тайлы и их рамки [юг, запад, север, восток] для отбора по окну карты
+    boundaries, _ = cells_to_boundary_array(cells)
+    order = np.argsort(buckets, kind='stable')
+    keys, starts = np.unique(buckets[order], return_index=True)
+
+    tiles = {}
+    (out_dir / str(res)).mkdir(parents=True, exist_ok=True)
+    for key, part in zip(cells_to_str(keys), np.split(order, starts[1:])):
+        points = boundaries[part].reshape(-1, 2)
+        tiles[key] = np.round([*points.min(axis=0), *points.max(axis=0)], 6).tolist()
+        with open(out_dir / str(res) / f'{key}.geojson', 'w', encoding='utf-8') as file:
+            # json.dumps использует C-кодировщик, json.dump в файл - медленный итеративный
+            file.write(json.dumps(hexagons_to_geojson(cells[part]), separators=(',', ':')))
+
+    return tiles
+
+
+def export_tiles(hexagons, out_dir, zoom_levels=ZOOM_LEVELS):
+    """
+    Записывает тайлы GeoJSON и индекс tiles/index.json.
+    Параметры:
+        hexagons (np.ndarray): H3 идентификаторы покрытия (uint64)
+        out_dir (str | Path): Папка для тайлов
+        zoom_levels (list): Пары (минимальный масштаб, уровень детализации)
+    Возвращает:
+        dict: Индекс тайлов
+    """
+    out_dir = Path(out_dir)
+    hexagons = cells_to_uint64(hexagons)
+    max_res = int(cells_resolution(hexagons).max()) if len(hexagons) else 0
+    ranges = tile_ranges(max_res, zoom_levels)
+
+    levels = []
+    for i, (min_zoom, res) in enumerate(ranges):
+        levels.append({
+            'res': res,
+            'minzoom': min_zoom,
+            'maxzoom': ranges[i + 1][0] - 1 if i + 1 < len(ranges) else 24,
+            'tiles': write_tiles(np.unique(parents_clamped(hexagons, res)), res, out_dir),
+        })
+
+    index = {'levels': levels}
+    with open(out_dir / 'index.json', 'w', encoding='utf-8') as file:
+        file.write(json.dumps(index, separators=(',', ':')))
+
+    return index
+
+
+def update_tiles(hexagons, changed, out_dir, zoom_levels=ZOOM_LEVELS):
+    """
+    Перезаписывает только тайлы, в которые попали изменившиеся ячейки покрытия.
+    Если индекса нет или изменился набор уровней, тайлы выгружаются заново целиком.
+    Параметры:
+        hexagons (np.ndarray): H3 идентификаторы нового покрытия (uint64)
+        changed (np.ndarray): Добавленные и удаленные ячейки (uint64)
+        out_dir (str | Path): Папка для тайлов
+        zoom_levels (list): Пары (минимальный масштаб, уровень детализации)
+    Возвращает:
+        dict: Индекс тайлов
+    """
+    out_dir = Path(out_dir)
+    hexagons = cells_to_uint64(hexagons)
+    changed = cells_to_uint64(changed)
+    max_res = int(cells_resolution(hexagons).max()) if len(hexagons) else 0
+    ranges = tile_ranges(max_res, zoom_levels)
+
+    index_path = out_dir / 'index.json'
+    index = json.loads(index_path.read_text(encoding='utf-8')) if index_path.exists() else None
+    if index is None or [level['res'] for level in index['levels']] != [res for _, res in ranges]:
+        return export_tiles(hexagons, out_dir, zoom_levels)
+    if len(changed) == 0:
+        return index
+
+    for level in index['levels']:
+        res = level['res']
+        bucket_res = max(res - BUCKET_DEPTH, 0)
+        stale = np.unique(parents_clamped(parents_clamped(changed, res), bucket_res))
+
+        # Ячейки уровня из затронутых тайлов; тайлы, оставшиеся без ячеек, удаляются
+        cells = np.unique(parents_clamped(hexagons, res))
+        cells = cells[hex_index_contains(stale, parents_clamped(cells, bucket_res))]
+        for key in cells_to_str(stale):
+            level['tiles'].pop(key, None)
+            (out_dir / str(res) / f'{key}.geojson').unlink(missing_ok=True)
+        level['tiles'].update(write_tiles(cells, res, out_dir))
+
+    with open(index_path, 'w', encoding='utf-8') as file:
+        file.write(json.dumps(index, separators=(',', ':')))
+
+    return index
+
+
+class TileLoader(MacroElement):
+    """
+    Скрипт Leaflet, который по событию moveend подгружает тайлы текущего масштаба в окне карты.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var layer = {{ this.layer.get_name() }};
+            var base = {{ this.tiles_url|tojson }};
+            var style = {{ this.style|tojson }};
+            var loaded = {};
+            var current = null;
+
+            fetch(base + 'index.json').then(function(response) { return response.json(); }).then(function(index) {
+                function levelFor(zoom) {
+                    for (var i = 0; i < index.levels.length; i++) {
+                        var level = index.levels[i];
+                        if (zoom >= level.minzoom && zoom <= level.maxzoom) { return level; }
+                    }
+                    return index.levels[index.levels.length - 1];
+                }
+
+                function update() {
+                    var level = levelFor(map.getZoom());
+                    var view = map.getBounds();
+                    if (current !== level.res) {
+                        layer.clearLayers();
+                        loaded = {};
+                        current = level.res;
+                    }
+                    Object.keys(level.tiles).forEach(function(key) {
+                        var box = level.tiles[key];
+                        if (loaded[key] || box[0] > view.getNorth() || box[2] < view.getSouth()
+                                || box[1] > view.getEast() || box[3] < view.getWest()) { return; }
+                        loaded[key] = true;
+                        fetch(base + level.res + '/' + key + '.geojson')
+                            .then(function(response) { return response.json(); })
+                            .then(function(data) {
+                                if (current === level.res) { L.geoJSON(data, {style: style}).addTo(layer); }
+                            });
+                    });
+                }
+
+                map.on('moveend', update);
+                update();
+            });
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, layer, tiles_url='tiles/', style=None):
+        """
+        Параметры:
+            layer (folium.FeatureGroup): Слой, в который добавляются тайлы
+            tiles_url (str): Адрес папки с тайлами относительно страницы
+            style (dict): Стиль гексагонов Leaflet
+        """
+        super().__init__()
+        self._name = 'TileLoader'
+        self.layer = layer
+        self.tiles_url = tiles_url
+        self.style = style or {'color': 'grey', 'weight': 1, 'fill': False}
+
+
+def save_tiled_map(base_map, hexagons, out_dir, html_name='index.html'):
+    """
+    Сохраняет карту с гексагонами в виде страницы и папки тайлов рядом с ней.
+    Параметры:
+        base_map (folium.Map): Карта из visualize_city_boundary (без слоя гексагонов)
+        hexagons (np.ndarray): H3 идентификаторы покрытия (uint64)
+        out_dir (str | Path): Папка для страницы и тайлов
+        html_name (str): Имя HTML-файла
+    Возвращает:
+        Path: Путь к странице
+    """
+    out_dir = Path(out_dir)
+    export_tiles(hexagons, out_dir / 'tiles')
+
+    layer_hexagon = folium.FeatureGroup(name='Гексагоны', show=True).add_to(base_map)
+    TileLoader(layer_hexagon).add_to(base_map)
+    folium.LayerControl().add_to(base_map)
+
+    base_map.save(str(out_dir / html_name))
+    return out_dir / html_name